@@ -0,0 +1,362 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import numpy as np  # noqa: E402
+import pygame as pg  # noqa: E402
+
+from fields.board import Board  # noqa: E402
+from fields.camera import Camera  # noqa: E402
+from fields.controller import replay  # noqa: E402
+from fields.profiler import FrameProfiler  # noqa: E402
+from fields.recording import Recording  # noqa: E402
+from fields.render import NodesRenderer, PolylinesRenderer  # noqa: E402
+from fields.simulation import Integrator  # noqa: E402
+
+NODE_SPACING = 60
+STROKE_FRAMES = 2000
+ZOOM = 4.0
+
+
+class SyntheticBoard(Board):
+
+    def __init__(
+        self,
+        nodes: int,
+        polylines: int,
+        vertices: int,
+        seed: int,
+        simplify_tolerance: Optional[float] = None
+    ) -> None:
+        columns = max(2, int(np.ceil(np.sqrt(nodes))))
+        rows = max(1, int(np.ceil(nodes / columns)))
+        super().__init__(
+            ((columns + 1) * NODE_SPACING, (rows + 1) * NODE_SPACING),
+            simplify_tolerance
+        )
+        self.rng = np.random.default_rng(seed)
+
+        jitter = self.rng.uniform(-10, 10, (nodes, 2))
+        for number in range(nodes):
+            row, column = divmod(number, columns)
+            self.nodes_field.push_node(
+                (column + 1) * NODE_SPACING + jitter[number][0],
+                (row + 1) * NODE_SPACING + jitter[number][1]
+            )
+
+        pairs = [
+            (number, number + 1)
+            for number in range(nodes - 1)
+            if (number + 1) % columns
+        ] + [
+            (number, number + columns)
+            for number in range(nodes - columns)
+        ]
+        self.rng.shuffle(pairs)
+
+        degree = self.nodes_field.get_degree
+        placed = 0
+        for start, end in pairs:
+            if placed == polylines:
+                break
+            if degree(start) < 3 and degree(end) < 3:
+                self.push_polyline(start, end, vertices)
+                placed += 1
+
+    def push_polyline(self, start: int, end: int, vertices: int) -> None:
+        nodes_field = self.nodes_field
+        vertex_field = self.vertex_field
+        a = np.array(vertex_field.get_vertex(nodes_field.get_index(start)))
+        b = np.array(vertex_field.get_vertex(nodes_field.get_index(end)))
+
+        normal = np.array([a[1] - b[1], b[0] - a[0]])
+        normal /= max(np.linalg.norm(normal), 1e-9)
+        bend = self.rng.uniform(-8, 8)
+
+        self.begin_move(start)
+        for t in np.linspace(0, 1, max(vertices, 3))[1:-1]:
+            point = a + (b - a) * t + normal * bend * np.sin(np.pi * t)
+            self.extend_move((point[0], point[1]), 0)
+        self.commit_move(end)
+
+    def random_positions(self, count: int) -> np.ndarray:
+        return self.rng.uniform((0, 0), self.size, (count, 2))
+
+
+def incident_moves() -> Tuple[Board, List[Tuple[np.ndarray, int, int]]]:
+    board = Board((4 * NODE_SPACING, 4 * NODE_SPACING))
+    for x, y in ((1, 1), (3, 1), (1, 3)):
+        board.nodes_field.push_node(x * NODE_SPACING, y * NODE_SPACING)
+    board.faces.rebuild()
+    board.play_move(
+        np.array([(1.5, 0.7), (2.5, 0.7)]) * NODE_SPACING, 0, 1
+    )
+
+    moves = [
+        (np.array([(1.3, 1.5), (1.2, 2.5)]) * NODE_SPACING, 0, 2),
+        (np.array([(1.5, 1.4), (2.6, 1.4)]) * NODE_SPACING, 0, 1),
+    ]
+    return board, moves
+
+
+def measure(
+    function: Callable[[], Any],
+    repeat: int,
+    warmup: int
+) -> Dict[str, Any]:
+    for _ in range(warmup):
+        function()
+
+    samples: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+
+    return {
+        'repeat': repeat,
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'mean': statistics.fmean(samples),
+        'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'samples': samples,
+    }
+
+
+def hot_paths(
+    board: SyntheticBoard,
+    queries: int,
+    cutoff: float
+) -> Dict[str, Callable[[], Any]]:
+    vertex_field = board.vertex_field
+    nodes_field = board.nodes_field
+    polyline_field = board.polyline_field
+
+    screen = pg.display.set_mode(board.size)
+    polylines_renderer = PolylinesRenderer(
+        screen, vertex_field, polyline_field
+    )
+    nodes_renderer = NodesRenderer(screen, vertex_field, nodes_field)
+    camera = Camera(board.size, zoom=ZOOM)
+    zoomed_polylines_renderer = PolylinesRenderer(
+        screen, vertex_field, polyline_field, camera
+    )
+    zoomed_nodes_renderer = NodesRenderer(
+        screen, vertex_field, nodes_field, camera
+    )
+
+    positions = board.random_positions(queries)
+    segments = positions[:, None] + board.rng.normal(0, 5, (queries, 1, 2))
+    cursor = [tuple(point) for point in positions.tolist()]
+    strokes = [
+        (tuple(a), tuple(b)) for a, b in segments.reshape(-1, 2, 2).tolist()
+    ]
+
+    def check_intersection() -> None:
+        for a, b in strokes:
+            start = vertex_field.push_vertex(*a)
+            polyline_field.start_polyline(start)
+            middle = ((a[0] + b[0]) / 2, (a[1] + b[1]) / 2)
+            polyline_field.push_vertex(middle, 0)
+            polyline_field.check_intersection(b)
+            polyline_field.pop()
+            vertex_field.delete_vertexes([start])
+
+    walk = np.cumsum(board.rng.normal(0, 3, (STROKE_FRAMES, 2)), axis=0)
+    stroke = [
+        tuple(point) for point in (positions[0] + walk).tolist()
+    ]
+
+    def draw_stroke() -> None:
+        start = vertex_field.push_vertex(*stroke[0])
+        polyline_field.start_polyline(start)
+        for position in stroke[1:]:
+            polyline_field.check_intersection(position)
+            polyline_field.push_vertex(position, 0)
+        polyline_field.pop()
+        vertex_field.delete_vertexes([start])
+
+    incident_board, moves = incident_moves()
+
+    def validate_move() -> None:
+        for points, start, end in moves:
+            incident_board.validate_move(points, start, end)
+
+    def build_tree() -> None:
+        for index in range(len(polyline_field._polylines)):
+            polyline_field.build_tree(index)
+
+    def over_node() -> None:
+        for position in cursor:
+            nodes_field.over_node(position)
+
+    integrator = Integrator(1)
+
+    def integrate() -> None:
+        integrator.wake()
+        integrator.step(
+            vertex_field._vertexes,
+            *polyline_field.relaxation_inputs(),
+            nodes_field.vertexes_indexes
+        )
+        polyline_field.moved()
+
+    def render(renderer: PolylinesRenderer) -> Callable[[], Any]:
+        def run() -> None:
+            polyline_field.invalidate()
+            renderer.draw()
+        return run
+
+    def frozen(function: Callable[[], Any]) -> Callable[[], Any]:
+        def run() -> None:
+            vertexes = vertex_field._vertexes.copy()
+            function()
+            vertex_field._vertexes[:] = vertexes
+            polyline_field.refit_trees()
+        return run
+
+    return {
+        'check_intersection': check_intersection,
+        'draw_stroke': draw_stroke,
+        'validate_move': validate_move,
+        'build_tree': build_tree,
+        'rebuild_trees': polyline_field.rebuild_trees,
+        'refit_trees': polyline_field.refit_trees,
+        'force_update': frozen(lambda: polyline_field.force_update(1, 1)),
+        'force_update_cutoff': frozen(
+            lambda: polyline_field.force_update(1, 1, cutoff)
+        ),
+        'integrate': frozen(integrate),
+        'over_node': over_node,
+        'polylines_draw': polylines_renderer.draw,
+        'nodes_draw': lambda: nodes_renderer.draw(-1),
+        'polylines_render': render(polylines_renderer),
+        'polylines_render_zoomed': render(zoomed_polylines_renderer),
+        'nodes_draw_zoomed': lambda: zoomed_nodes_renderer.draw(-1),
+    }
+
+
+def replay_recording(path: str) -> Dict[str, Any]:
+    recording = Recording.load(path)
+    profiler = FrameProfiler(True, window=max(1, len(recording)))
+
+    start = time.perf_counter()
+    board = replay(recording, profiler)
+    elapsed = time.perf_counter() - start
+
+    for name, value in profiler.averages().items():
+        print(f'{name:>22}: mean {value * 1e3:9.3f} ms', file=sys.stderr)
+
+    return {
+        'recording': path,
+        'seed': recording.header.seed,
+        'frames': len(recording),
+        'relaxation_steps': sum(
+            frame.relax_steps for frame in recording.frames
+        ),
+        'elapsed': elapsed,
+        'phases': profiler.averages(),
+        'board': {
+            'polylines': len(board.polyline_field.polylines),
+            'vertices': len(board.vertex_field),
+        },
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Headless benchmarks for the Epic Sprouts hot paths.'
+    )
+    parser.add_argument('--nodes', type=int, default=100)
+    parser.add_argument('--polylines', type=int, default=150)
+    parser.add_argument('--vertices', type=int, default=40)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--cutoff', type=float, default=50.0)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--simplify', type=float, default=None,
+        help='simplify each synthetic polyline with this tolerance'
+    )
+    parser.add_argument('--only', nargs='*', default=None)
+    parser.add_argument('--output', default='-')
+    parser.add_argument(
+        '--replay', default=None,
+        help='time a headless replay of a recorded session instead'
+    )
+    return parser.parse_args(argv)
+
+
+def write_report(report: Dict[str, Any], path: str) -> None:
+    if path == '-':
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    else:
+        with open(path, 'w') as output:
+            json.dump(report, output, indent=2)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+
+    if args.replay:
+        write_report(replay_recording(args.replay), args.output)
+        return 0
+
+    pg.init()
+    board = SyntheticBoard(
+        args.nodes, args.polylines, args.vertices, args.seed, args.simplify
+    )
+    paths = hot_paths(board, args.queries, args.cutoff)
+
+    results: Dict[str, Any] = {}
+    for name, function in paths.items():
+        if args.only and name not in args.only:
+            continue
+        results[name] = measure(function, args.repeat, args.warmup)
+        print(
+            f'{name:>22}: median {results[name]["median"] * 1e3:9.3f} ms',
+            file=sys.stderr
+        )
+
+    report = {
+        'board': {
+            'nodes': args.nodes,
+            'polylines': len(board.polyline_field._polylines),
+            'vertices': len(board.vertex_field),
+            'size': list(board.size),
+        },
+        'settings': {
+            'queries': args.queries,
+            'cutoff': args.cutoff,
+            'repeat': args.repeat,
+            'warmup': args.warmup,
+            'seed': args.seed,
+            'simplify': args.simplify,
+        },
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pygame': pg.version.ver,
+            'machine': platform.machine(),
+        },
+        'timestamp': time.time(),
+        'results': results,
+    }
+
+    write_report(report, args.output)
+    pg.quit()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,628 @@
+from __future__ import annotations
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+from .board import Board
+from .bvh import segment_boxes
+from .geometry import any_segments_intersect, segments_from_vertexes
+from .nodes import DOTS_RADIUS
+from .position import (
+    AbstractMove, Position, abstract_moves, canonical, is_terminal,
+    move_nodes, play, position_from_board
+)
+
+TABLE_SIZE = 1 << 16
+SEARCH_DEPTH = 2
+PROVEN = 1 << 30
+
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+PLANNING_PASSES = ((4, 16), (4, 6), (2, 3))
+FALLBACK_PASSES = ((2, 2), (1, 1), (1, 0))
+LOOP_RADII = (2, 3, 5)
+LOOP_SPREADS = (0.3, 0.6)
+PORT_RADIUS = 3 * DOTS_RADIUS
+INNER_RADIUS = DOTS_RADIUS / 2
+PORT_DIRECTIONS = 24
+
+Candidate = Tuple[int, npt.NDArray]
+
+
+@dataclass
+class TableEntry:
+    value: int
+    depth: int
+    flag: int
+
+
+class TranspositionTable:
+
+    def __init__(self, size: int = TABLE_SIZE) -> None:
+        self.size: int = size
+        self.hits: int = 0
+        self.misses: int = 0
+        self._entries: OrderedDict[Position, TableEntry] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, position: Position) -> Optional[TableEntry]:
+        entry = self._entries.get(position)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(position)
+        return entry
+
+    def put(self, position: Position, entry: TableEntry) -> None:
+        self._entries[position] = entry
+        self._entries.move_to_end(position)
+        if len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+def children(position: Position) -> List[Position]:
+    seen: Dict[Position, None] = {}
+    for move in abstract_moves(position):
+        seen.setdefault(play(position, move))
+    return list(seen)
+
+
+def negamax(
+    position: Position,
+    depth: int,
+    table: TranspositionTable,
+    alpha: int = -1,
+    beta: int = 1
+) -> int:
+    if is_terminal(position):
+        return -1
+    if depth <= 0:
+        return 0
+
+    entry = table.get(position)
+    if entry is not None and entry.depth >= depth:
+        if entry.flag == EXACT:
+            return entry.value
+        if entry.flag == LOWER:
+            alpha = max(alpha, entry.value)
+        else:
+            beta = min(beta, entry.value)
+        if alpha >= beta:
+            return entry.value
+
+    original = alpha
+    best = -1
+    for child in children(position):
+        best = max(best, -negamax(child, depth - 1, table, -beta, -alpha))
+        alpha = max(alpha, best)
+        if alpha >= beta:
+            break
+
+    flag = EXACT
+    if best <= original:
+        flag = UPPER
+    elif best >= beta:
+        flag = LOWER
+    table.put(
+        position,
+        TableEntry(best, PROVEN if best and flag == EXACT else depth, flag)
+    )
+    return best
+
+
+_table: Optional[TranspositionTable] = None
+
+
+def _start_worker(size: int) -> None:
+    global _table
+    _table = TranspositionTable(size)
+
+
+def _search(position: Position, depth: int) -> int:
+    if _table is None:
+        _start_worker(TABLE_SIZE)
+    assert _table is not None
+    return negamax(position, depth, _table)
+
+
+def _board_segments(board: Board) -> npt.NDArray:
+    polylines = board.polyline_field.polylines
+    if not polylines:
+        return np.empty((0, 2, 2), float)
+    return np.concatenate([
+        segments_from_vertexes(
+            board.vertex_field.get_vertexes_by_mask(polyline.indexes)
+        )
+        for polyline in polylines
+    ])
+
+
+def _blocked_by_segments(
+    segments: npt.NDArray,
+    shape: Tuple[int, int],
+    cell: float,
+    clearance: float
+) -> npt.NDArray:
+    blocked = np.zeros(shape, bool)
+    if not segments.shape[0]:
+        return blocked
+
+    lengths = np.hypot(*(segments[:, 1] - segments[:, 0]).T)
+    samples = np.maximum(np.ceil(2 * lengths / cell), 1).astype(int)
+    owners = np.repeat(np.arange(segments.shape[0]), samples)
+    starts = np.cumsum(samples) - samples
+    steps = (np.arange(owners.shape[0]) - starts[owners]) / samples[owners]
+    points = segments[owners, 0] + (
+        segments[owners, 1] - segments[owners, 0]
+    ) * steps[:, None]
+
+    cells = np.floor(points / cell).astype(int)
+    inside = np.all((cells >= 0) & (cells < shape[::-1]), axis=1)
+    blocked[cells[inside, 1], cells[inside, 0]] = True
+    return _dilate(blocked, int(np.ceil(clearance / cell)))
+
+
+def _blocked_by_boxes(
+    segments: npt.NDArray,
+    shape: Tuple[int, int],
+    cell: float,
+    clearance: float
+) -> npt.NDArray:
+    if not segments.shape[0]:
+        return np.zeros(shape, bool)
+
+    vmin, vmax = segment_boxes(segments)
+    limit = np.array(shape[::-1]) - 1
+    low = np.clip(np.floor((vmin - clearance) / cell), 0, limit).astype(int)
+    high = np.clip(np.floor((vmax + clearance) / cell), 0, limit).astype(int)
+
+    counts = np.zeros((shape[0] + 1, shape[1] + 1), np.int32)
+    np.add.at(counts, (low[:, 1], low[:, 0]), 1)
+    np.add.at(counts, (low[:, 1], high[:, 0] + 1), -1)
+    np.add.at(counts, (high[:, 1] + 1, low[:, 0]), -1)
+    np.add.at(counts, (high[:, 1] + 1, high[:, 0] + 1), 1)
+    return np.cumsum(np.cumsum(counts, axis=0), axis=1)[:-1, :-1] > 0
+
+
+def _dilate(mask: npt.NDArray, cells: int) -> npt.NDArray:
+    grown = mask.copy()
+    for _ in range(cells):
+        grown[1:] |= grown[:-1].copy()
+        grown[:-1] |= grown[1:].copy()
+        grown[:, 1:] |= grown[:, :-1].copy()
+        grown[:, :-1] |= grown[:, 1:].copy()
+    return grown
+
+
+def _ports(
+    board: Board,
+    node: int,
+    segments: npt.NDArray,
+    free: npt.NDArray,
+    cell: float
+) -> List[Tuple[npt.NDArray, npt.NDArray, Tuple[int, int]]]:
+    center = np.asarray(
+        board.vertex_field.get_vertex(board.nodes_field.get_index(node)),
+        dtype=float
+    )
+    near = np.all(
+        (segments.min(axis=1) <= center + PORT_RADIUS) &
+        (segments.max(axis=1) >= center - PORT_RADIUS),
+        axis=1
+    )
+    incident = np.any(np.all(segments == center, axis=2), axis=1)
+    others = segments[near & ~incident]
+    segments = segments[near & incident]
+
+    ports = []
+    angles = np.linspace(0, 2 * np.pi, PORT_DIRECTIONS, endpoint=False)
+    for angle in angles.tolist():
+        direction = np.array([np.cos(angle), np.sin(angle)])
+        inner = center + direction * INNER_RADIUS
+        port = center + direction * PORT_RADIUS
+        x, y = np.floor(port / cell).astype(int).tolist()
+        if not (0 <= y < free.shape[0] and 0 <= x < free.shape[1]):
+            continue
+        if (
+            not free[y, x] or
+            any_segments_intersect((center, port), others) or
+            any_segments_intersect((inner, port), segments)
+        ):
+            continue
+        ports.append((inner, port, (y, x)))
+    return ports
+
+
+def _component(free: npt.NDArray, cell: Tuple[int, int]) -> npt.NDArray:
+    reached = np.zeros(free.shape, bool)
+    reached[cell] = True
+    while True:
+        grown = reached.copy()
+        grown[1:] |= reached[:-1]
+        grown[:-1] |= reached[1:]
+        grown[:, 1:] |= reached[:, :-1]
+        grown[:, :-1] |= reached[:, 1:]
+        grown &= free
+        if np.array_equal(grown, reached):
+            return reached
+        reached = grown
+
+
+def _grid_path(
+    free: npt.NDArray,
+    sources: List[Tuple[int, int]],
+    targets: List[Tuple[int, int]]
+) -> Optional[List[Tuple[int, int]]]:
+    distance = np.full(free.shape, -1, dtype=np.int32)
+    frontier = np.zeros(free.shape, bool)
+    for cell in sources:
+        frontier[cell] = True
+    distance[frontier] = 0
+    goal = np.zeros(free.shape, bool)
+    for cell in targets:
+        goal[cell] = True
+
+    step = 0
+    while frontier.any() and not (frontier & goal).any():
+        step += 1
+        grown = np.zeros_like(frontier)
+        grown[1:] |= frontier[:-1]
+        grown[:-1] |= frontier[1:]
+        grown[:, 1:] |= frontier[:, :-1]
+        grown[:, :-1] |= frontier[:, 1:]
+        frontier = grown & free & (distance < 0)
+        distance[frontier] = step
+
+    reached = np.argwhere(frontier & goal)
+    if not reached.size:
+        return None
+
+    y, x = reached[0].tolist()
+    path = [(y, x)]
+    while distance[y, x]:
+        for dy, dx in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            ny, nx = y + dy, x + dx
+            if (
+                0 <= ny < free.shape[0] and 0 <= nx < free.shape[1] and
+                distance[ny, nx] == distance[y, x] - 1
+            ):
+                y, x = ny, nx
+                break
+        path.append((y, x))
+    return path[::-1]
+
+
+def planning_grid(
+    board: Board,
+    cell: float,
+    clearance: float
+) -> Tuple[npt.NDArray, npt.NDArray]:
+    width, height = board.size
+    shape = (int(np.ceil(height / cell)), int(np.ceil(width / cell)))
+    segments = _board_segments(board)
+    blocked = _blocked_by_segments(segments, shape, cell, clearance)
+
+    rows, columns = np.indices(shape)
+    centers = np.stack((columns, rows), axis=-1) * cell + cell / 2
+    positions = board.vertex_field.get_vertexes_by_mask(
+        board.nodes_field.vertexes_indexes
+    )
+    for x, y in positions.tolist():
+        blocked |= np.hypot(
+            centers[..., 0] - x, centers[..., 1] - y
+        ) < PORT_RADIUS - cell
+    return segments, ~blocked
+
+
+def plan_paths(
+    board: Board,
+    start: int,
+    end: int,
+    cell: float = PLANNING_PASSES[0][0],
+    clearance: float = PLANNING_PASSES[0][1],
+    grid: Optional[Tuple[npt.NDArray, npt.NDArray]] = None
+) -> Iterator[npt.NDArray]:
+    if grid is None:
+        grid = planning_grid(board, cell, clearance)
+    segments, free = grid
+
+    starts = _ports(board, start, segments, free, cell)
+    ends = starts if start == end else _ports(board, end, segments, free, cell)
+    covered = np.zeros(free.shape, bool)
+    for first in starts:
+        if covered[first[2]]:
+            continue
+        targets = [
+            port for port in ends
+            if start != end or
+            np.hypot(*(port[1] - first[1])) > PORT_RADIUS
+        ]
+        if not targets:
+            continue
+
+        cells = _grid_path(free, [first[2]], [port[2] for port in targets])
+        if cells is None:
+            covered |= _component(free, first[2])
+            continue
+        last = next(port for port in targets if port[2] == cells[-1])
+        middle = [
+            (x * cell + cell / 2, y * cell + cell / 2) for y, x in cells[1:-1]
+        ]
+        points = np.array(
+            [first[0], first[1]] + middle + [last[1], last[0]], dtype=float
+        )
+        if board.validate_move(points, start, end) is None:
+            covered |= _component(free, first[2])
+            yield points
+
+
+def plan_path(
+    board: Board,
+    start: int,
+    end: int,
+    cell: float = PLANNING_PASSES[0][0],
+    clearance: float = PLANNING_PASSES[0][1],
+    grid: Optional[Tuple[npt.NDArray, npt.NDArray]] = None
+) -> Optional[npt.NDArray]:
+    return next(plan_paths(board, start, end, cell, clearance, grid), None)
+
+
+def realized(
+    board: Board,
+    start: int,
+    end: int,
+    points: npt.NDArray
+) -> Optional[Position]:
+    if board.play_move(points, start, end) is not None:
+        return None
+    position = canonical(*position_from_board(board))
+    board.undo_move()
+    return position
+
+
+def _loop_path(board: Board, node: int) -> Optional[npt.NDArray]:
+    center = np.asarray(
+        board.vertex_field.get_vertex(board.nodes_field.get_index(node)),
+        dtype=float
+    )
+    angles = np.linspace(0, 2 * np.pi, PORT_DIRECTIONS, endpoint=False)
+    for radius in LOOP_RADII:
+        for spread in LOOP_SPREADS:
+            for angle in angles.tolist():
+                turns = np.array([angle - spread, angle + spread])
+                points = center + radius * DOTS_RADIUS * np.stack(
+                    (np.cos(turns), np.sin(turns)), axis=1
+                )
+                if board.validate_move(points, node, node) is None:
+                    return points
+    return None
+
+
+def _cells(mask: npt.NDArray) -> List[Tuple[int, int]]:
+    return [(y, x) for y, x in np.argwhere(mask).tolist()]
+
+
+def _loop_attempts(
+    free: npt.NDArray,
+    centers: npt.NDArray,
+    center: npt.NDArray,
+    disc: npt.NDArray,
+    cell: float
+) -> Iterator[Tuple[npt.NDArray, npt.NDArray, npt.NDArray]]:
+    offsets = centers - center
+    turns = np.arctan2(offsets[..., 1], offsets[..., 0])
+    steps = np.arange(0, LOOP_RADII[-1] * DOTS_RADIUS, cell / 2)
+    for angle in np.linspace(
+        0, 2 * np.pi, PORT_DIRECTIONS, endpoint=False
+    ).tolist():
+        relative = np.angle(np.exp(1j * (turns - angle)))
+        ray = center + steps[:, None] * np.array(
+            [np.cos(angle), np.sin(angle)]
+        )
+        cut = np.zeros(free.shape, bool)
+        indexes = np.floor(ray / cell).astype(int)
+        inside = (
+            (indexes >= 0).all(axis=1) &
+            (indexes[:, 0] < free.shape[1]) & (indexes[:, 1] < free.shape[0])
+        )
+        cut[indexes[inside, 1], indexes[inside, 0]] = True
+        cut[1:] |= cut[:-1].copy()
+        cut[:, 1:] |= cut[:, :-1].copy()
+
+        passable = free & ~cut & ~(disc & (np.abs(relative) > np.pi / 2))
+        yield (
+            passable,
+            passable & disc & (relative > 0),
+            passable & disc & (relative < 0)
+        )
+
+
+def direct_path(
+    board: Board,
+    start: int,
+    end: int,
+    cell: float,
+    clearance: float
+) -> Optional[npt.NDArray]:
+    if start == end:
+        points = _loop_path(board, start)
+        if points is not None:
+            return points
+
+    width, height = board.size
+    shape = (int(np.ceil(height / cell)), int(np.ceil(width / cell)))
+    blocked = _blocked_by_boxes(
+        _board_segments(board), shape, cell, clearance
+    )
+
+    rows, columns = np.indices(shape)
+    centers = np.stack((columns, rows), axis=-1) * cell + cell / 2
+    positions = board.vertex_field.get_vertexes_by_mask(
+        board.nodes_field.vertexes_indexes
+    )
+    discs = {}
+    for node, (x, y) in enumerate(positions.tolist()):
+        distance = np.hypot(centers[..., 0] - x, centers[..., 1] - y)
+        if node in (start, end):
+            discs[node] = distance < DOTS_RADIUS
+        else:
+            blocked |= distance < DOTS_RADIUS + cell
+
+    free = ~blocked
+    if start != end:
+        attempts = [(free, discs[start] & free, discs[end] & free)]
+    else:
+        attempts = _loop_attempts(
+            free, centers, positions[start], discs[start], cell
+        )
+
+    for passable, sources, targets in attempts:
+        cells = _grid_path(passable, _cells(sources), _cells(targets))
+        if cells is None:
+            continue
+        points = np.array(
+            [(x * cell + cell / 2, y * cell + cell / 2) for y, x in cells],
+            dtype=float
+        )
+        if board.validate_move(points, start, end) is None:
+            return points
+    return None
+
+
+class AIPlayer:
+
+    def __init__(
+        self,
+        depth: int = SEARCH_DEPTH,
+        workers: int = 0,
+        table_size: int = TABLE_SIZE,
+        seed: Optional[int] = None
+    ) -> None:
+        self.depth: int = depth
+        self.table: TranspositionTable = TranspositionTable(table_size)
+        self.rng: np.random.Generator = np.random.default_rng(seed)
+        self._pool: Optional[Executor] = None
+        if workers > 1:
+            self._pool = ProcessPoolExecutor(
+                workers, initializer=_start_worker, initargs=(table_size,)
+            )
+
+    def rank(self, position: Position) -> List[Tuple[int, AbstractMove]]:
+        moves = abstract_moves(position)
+        results = [play(position, move) for move in moves]
+        unique = list(dict.fromkeys(results))
+
+        if self._pool is not None:
+            values = list(self._pool.map(
+                _search, unique, [self.depth - 1] * len(unique)
+            ))
+        else:
+            values = [
+                negamax(child, self.depth - 1, self.table) for child in unique
+            ]
+        scores = dict(zip(unique, values))
+
+        order = self.rng.permutation(len(moves)).tolist()
+        ranked = [
+            (-scores[results[number]], moves[number]) for number in order
+        ]
+        ranked.sort(key=lambda item: -item[0])
+        return ranked
+
+    def choose(
+        self,
+        board: Board
+    ) -> Optional[Tuple[int, int, npt.NDArray]]:
+        if board.moving:
+            return None
+
+        position = position_from_board(board)
+        ranked = self.rank(position)
+        for cell, clearance in PLANNING_PASSES:
+            grid = planning_grid(board, cell, clearance)
+            planned: Dict[Tuple[int, int], List[Candidate]] = {}
+            for score, move in ranked:
+                start, end = move_nodes(position, move)
+                for pair in dict.fromkeys(((start, end), (end, start))):
+                    if pair not in planned:
+                        planned[pair] = self._realize(
+                            board, pair[0], pair[1], cell, clearance, grid
+                        )
+                    for value, points in planned[pair]:
+                        if value >= score:
+                            return pair[0], pair[1], points
+
+        pairs = list(dict.fromkeys(
+            (start, end) for _, start, end in board.faces.moves()
+        ))
+        best = ranked[0][0] if ranked else 0
+        for cell, clearance in FALLBACK_PASSES:
+            found: List[Tuple[int, int, int, npt.NDArray]] = []
+            for start, end in pairs:
+                points = direct_path(board, start, end, cell, clearance)
+                if points is None:
+                    continue
+                for value, points in self._evaluate(
+                    board, start, end, [points]
+                ):
+                    if value >= best:
+                        return start, end, points
+                    found.append((value, start, end, points))
+            if found:
+                _, start, end, points = max(found, key=lambda item: item[0])
+                return start, end, points
+        return None
+
+    def _realize(
+        self,
+        board: Board,
+        start: int,
+        end: int,
+        cell: float,
+        clearance: float,
+        grid: Tuple[npt.NDArray, npt.NDArray]
+    ) -> List[Candidate]:
+        return self._evaluate(
+            board, start, end,
+            plan_paths(board, start, end, cell, clearance, grid)
+        )
+
+    def _evaluate(
+        self,
+        board: Board,
+        start: int,
+        end: int,
+        paths: Iterable[npt.NDArray]
+    ) -> List[Candidate]:
+        candidates: Dict[Position, npt.NDArray] = {}
+        for points in paths:
+            child = realized(board, start, end, points)
+            if child is not None:
+                candidates.setdefault(child, points)
+        return [
+            (-negamax(child, self.depth - 1, self.table), points)
+            for child, points in candidates.items()
+        ]
+
+    def play(self, board: Board) -> bool:
+        choice = self.choose(board)
+        if choice is None:
+            return False
+        return board.play_move(choice[2], choice[0], choice[1]) is None
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
@@ -0,0 +1,162 @@
+from __future__ import annotations
+import numpy.typing as npt
+from typing import Optional, Tuple
+
+from .faces import FaceTracker
+from .nodes import NodesField
+from .polylines import PolylinesField
+from .validation import (
+    NO_SHARED_FACE, Rejection, move_path, validate_move
+)
+from .vertexes import VertexField
+
+SEGMENT_STEP = 5
+SIMPLIFY_TOLERANCE = 1.0
+RESAMPLE_STEP = 4 * SEGMENT_STEP
+
+
+class Board:
+
+    def __init__(
+        self,
+        size: Tuple[float, float],
+        simplify_tolerance: Optional[float] = None
+    ) -> None:
+        self.size: Tuple[float, float] = size
+        self.simplify_tolerance: Optional[float] = simplify_tolerance
+        self.vertex_field: VertexField = VertexField()
+        self.nodes_field: NodesField = NodesField(self.vertex_field, size)
+        self.polyline_field: PolylinesField = PolylinesField(
+            self.vertex_field, self.nodes_field
+        )
+        self.faces: FaceTracker = FaceTracker(
+            self.vertex_field, self.nodes_field, self.polyline_field
+        )
+        self.start_node: int = -1
+
+    def generate(
+        self,
+        number_of_nodes: int = 10,
+        radius: int = 50,
+        seed: Optional[int] = None
+    ) -> None:
+        self.nodes_field.generate_field(number_of_nodes, radius, seed)
+        self.faces.rebuild()
+
+    @property
+    def moving(self) -> bool:
+        return self.start_node > -1
+
+    @property
+    def game_over(self) -> bool:
+        return not self.moving and self.faces.game_over
+
+    def can_start(self, node: int) -> bool:
+        return (
+            not self.moving and
+            0 <= node < len(self.nodes_field) and
+            self.nodes_field.get_degree(node) < 3
+        )
+
+    def begin_move(self, node: int) -> bool:
+        if not self.can_start(node):
+            return False
+
+        self.polyline_field.start_polyline(self.nodes_field.get_index(node))
+        self.nodes_field.rise_degree(node)
+        self.start_node = node
+        return True
+
+    def extend_move(self, pos: Tuple[float, float], distance: float) -> None:
+        if self.moving:
+            self.polyline_field.push_vertex(pos, distance)
+
+    def cancel_move(self) -> None:
+        if not self.moving:
+            return
+
+        self.polyline_field.pop()
+        self.nodes_field.lower_degree(self.start_node)
+        self.start_node = -1
+
+    def commit_move(self, node: int) -> bool:
+        if not self.moving:
+            return False
+
+        if node < 0 or self.nodes_field.get_degree(node) > 2:
+            self.cancel_move()
+            return False
+
+        polyline_field = self.polyline_field
+        polyline_field.end_polyline(self.nodes_field.get_index(node))
+        if self.simplify_tolerance is not None:
+            polyline_field.simplify_polyline(
+                -1, self.simplify_tolerance, RESAMPLE_STEP
+            )
+        polyline_field.build_tree(-1)
+        self.nodes_field.rise_degree(node)
+        self.nodes_field.push_node_by_index(
+            polyline_field.get_polyline(-1).middle_point
+        )
+        try:
+            self.faces.sync()
+        except ValueError:
+            self.nodes_field.pop_node()
+            self.nodes_field.lower_degree(node)
+            self.cancel_move()
+            return False
+        self.start_node = -1
+        return True
+
+    def undo_move(self) -> bool:
+        polylines = self.polyline_field.polylines
+        if self.moving or not polylines:
+            return False
+
+        indexes = polylines[-1].indexes
+        nodes = self.nodes_field.vertexes_indexes.tolist()
+        self.nodes_field.pop_node()
+        for vertex in (indexes[0], indexes[-1]):
+            self.nodes_field.lower_degree(nodes.index(vertex))
+        self.polyline_field.pop()
+        self.faces.sync()
+        return True
+
+    def validate_move(
+        self,
+        points: npt.ArrayLike,
+        start_node: int,
+        end_node: int
+    ) -> Optional[Rejection]:
+        return validate_move(
+            self.vertex_field,
+            self.nodes_field,
+            self.polyline_field,
+            points,
+            start_node,
+            end_node
+        )
+
+    def play_move(
+        self,
+        points: npt.ArrayLike,
+        start_node: int,
+        end_node: int
+    ) -> Optional[Rejection]:
+        rejection = self.validate_move(points, start_node, end_node)
+        if rejection is not None:
+            return rejection
+
+        path = move_path(
+            self.vertex_field, self.nodes_field, points, start_node, end_node
+        )
+        self.begin_move(start_node)
+        for x, y in path[1:-1].tolist():
+            self.extend_move((x, y), 0)
+        if not self.commit_move(end_node):
+            return Rejection(
+                NO_SHARED_FACE,
+                f'nodes {start_node} and {end_node} do not share a face',
+                other=end_node
+            )
+        return None
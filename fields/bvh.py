@@ -0,0 +1,278 @@
+from __future__ import annotations
+import numpy as np
+import numpy.typing as npt
+from typing import Counter, List, Optional, Tuple
+
+CODE_INSIDE = 0
+CODE_LEFT = 1
+CODE_RIGHT = 2
+CODE_BOTTOM = 4
+CODE_TOP = 8
+
+LEAF_MIN_EXTENT = 5
+
+
+def segment_boxes(
+    segments: npt.NDArray
+) -> Tuple[npt.NDArray, npt.NDArray]:
+    vmin = np.min(segments, axis=1)
+    vmax = np.max(segments, axis=1)
+
+    thin = (vmax - vmin) < LEAF_MIN_EXTENT
+    vmin = np.where(thin, vmin - LEAF_MIN_EXTENT / 2, vmin)
+    vmax = np.where(thin, vmax + LEAF_MIN_EXTENT / 2, vmax)
+
+    return vmin, vmax
+
+
+def cohen_sutherland_codes(
+    vmin: npt.NDArray,
+    vmax: npt.NDArray,
+    v: npt.NDArray
+) -> npt.NDArray:
+    v = np.asarray(v, dtype=float)
+    return (
+        np.where(v[..., 0:1] < vmin[..., 0:1], CODE_LEFT, CODE_INSIDE) |
+        np.where(v[..., 0:1] > vmax[..., 0:1], CODE_RIGHT, CODE_INSIDE) |
+        np.where(v[..., 1:2] < vmin[..., 1:2], CODE_BOTTOM, CODE_INSIDE) |
+        np.where(v[..., 1:2] > vmax[..., 1:2], CODE_TOP, CODE_INSIDE)
+    )[..., 0]
+
+
+def morton_codes(points: npt.NDArray, bits: int = 16) -> npt.NDArray:
+    if not points.shape[0]:
+        return np.empty(0, dtype=np.uint64)
+
+    low = np.min(points, axis=0)
+    extent = np.maximum(np.max(points, axis=0) - low, 1e-9)
+    cells = ((points - low) / extent * ((1 << bits) - 1)).astype(np.uint64)
+
+    codes = np.zeros(points.shape[0], dtype=np.uint64)
+    for bit in range(bits):
+        for axis in range(2):
+            codes |= (
+                ((cells[:, axis] >> np.uint64(bit)) & np.uint64(1)) <<
+                np.uint64(2 * bit + axis)
+            )
+    return codes
+
+
+class BVH:
+
+    def __init__(
+        self,
+        vmin: npt.NDArray,
+        vmax: npt.NDArray,
+        left: npt.NDArray,
+        right: npt.NDArray,
+        level_offsets: npt.NDArray
+    ) -> None:
+        self.vmin: npt.NDArray = vmin
+        self.vmax: npt.NDArray = vmax
+        self.left: npt.NDArray = left
+        self.right: npt.NDArray = right
+        self.level_offsets: npt.NDArray = level_offsets
+
+    @staticmethod
+    def _level_sizes(leaves: int) -> List[int]:
+        sizes: List[int] = [leaves]
+        while sizes[-1] > 1:
+            sizes.append((sizes[-1] + 1) // 2)
+        return sizes
+
+    @classmethod
+    def from_boxes(cls, vmin: npt.NDArray, vmax: npt.NDArray) -> BVH:
+        leaves = vmin.shape[0]
+        sizes = cls._level_sizes(leaves)
+        level_offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+        level_offsets[1:] = np.cumsum(sizes)
+        total = int(level_offsets[-1])
+
+        tree = cls(
+            np.empty((total, 2), float),
+            np.empty((total, 2), float),
+            np.full(total, -1, dtype=np.int32),
+            np.full(total, -1, dtype=np.int32),
+            level_offsets
+        )
+        tree.vmin[:leaves] = vmin
+        tree.vmax[:leaves] = vmax
+
+        for level in range(1, len(sizes)):
+            start, stop = level_offsets[level - 1], level_offsets[level]
+            children = np.arange(start, stop, dtype=np.int32)
+            tree.left[stop:level_offsets[level + 1]] = children[0::2]
+            right = children[1::2]
+            tree.right[stop:stop + right.shape[0]] = right
+
+        tree.refit_parents()
+        return tree
+
+    @classmethod
+    def from_segments(cls, segments: npt.NDArray) -> BVH:
+        return cls.from_boxes(*segment_boxes(segments))
+
+    @property
+    def root(self) -> int:
+        return self.vmin.shape[0] - 1
+
+    @property
+    def leaves(self) -> int:
+        return int(self.level_offsets[1])
+
+    @property
+    def levels(self) -> int:
+        return self.level_offsets.shape[0] - 1
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            self.vmin.nbytes + self.vmax.nbytes +
+            self.left.nbytes + self.right.nbytes +
+            self.level_offsets.nbytes
+        )
+
+    def refit_parents(self) -> None:
+        for level in range(1, self.levels):
+            start = self.level_offsets[level]
+            stop = self.level_offsets[level + 1]
+            left = self.left[start:stop]
+            right = np.where(
+                self.right[start:stop] < 0, left, self.right[start:stop]
+            )
+            self.vmin[start:stop] = np.minimum(
+                self.vmin[left], self.vmin[right]
+            )
+            self.vmax[start:stop] = np.maximum(
+                self.vmax[left], self.vmax[right]
+            )
+
+    def refit_leaf(
+        self,
+        leaf: int,
+        vmin: npt.NDArray,
+        vmax: npt.NDArray
+    ) -> None:
+        self.vmin[leaf] = vmin
+        self.vmax[leaf] = vmax
+        for level in range(1, self.levels):
+            leaf >>= 1
+            node = int(self.level_offsets[level]) + leaf
+            left = self.left[node]
+            right = left if self.right[node] < 0 else self.right[node]
+            self.vmin[node] = np.minimum(self.vmin[left], self.vmin[right])
+            self.vmax[node] = np.maximum(self.vmax[left], self.vmax[right])
+
+    def refit(self, vmin: npt.NDArray, vmax: npt.NDArray) -> None:
+        self.vmin[:self.leaves] = vmin
+        self.vmax[:self.leaves] = vmax
+        self.refit_parents()
+
+    def refit_segments(self, segments: npt.NDArray) -> None:
+        self.refit(*segment_boxes(segments))
+
+    def query_segment(
+        self,
+        v1: Tuple[float, float],
+        v2: Tuple[float, float],
+        visited: Optional[List[npt.NDArray]] = None,
+        counters: Optional[Counter[str]] = None
+    ) -> npt.NDArray:
+        active = np.array([self.root], dtype=np.int32)
+
+        while active.size:
+            if counters is not None:
+                counters['bvh_nodes_visited'] += active.size
+
+            vmin = self.vmin[active]
+            vmax = self.vmax[active]
+            hit = (
+                cohen_sutherland_codes(vmin, vmax, v1) &
+                cohen_sutherland_codes(vmin, vmax, v2)
+            ) == CODE_INSIDE
+            active = active[hit]
+
+            if visited is not None:
+                visited.append(active)
+
+            if not active.size or active[0] < self.leaves:
+                break
+
+            children = np.concatenate(
+                (self.left[active], self.right[active])
+            )
+            active = children[children >= 0]
+
+        return active
+
+    def query_rect(
+        self,
+        vmin: Tuple[float, float],
+        vmax: Tuple[float, float],
+        counters: Optional[Counter[str]] = None
+    ) -> npt.NDArray:
+        active = np.array([self.root], dtype=np.int32)
+
+        while active.size:
+            if counters is not None:
+                counters['bvh_nodes_visited'] += active.size
+
+            hit = np.all(
+                (self.vmin[active] <= vmax) & (self.vmax[active] >= vmin),
+                axis=1
+            )
+            active = active[hit]
+
+            if not active.size or active[0] < self.leaves:
+                break
+
+            children = np.concatenate(
+                (self.left[active], self.right[active])
+            )
+            active = children[children >= 0]
+
+        return active
+
+    def query_segments(
+        self,
+        v1: npt.ArrayLike,
+        v2: npt.ArrayLike,
+        counters: Optional[Counter[str]] = None
+    ) -> Tuple[npt.NDArray, npt.NDArray]:
+        v1 = np.asarray(v1, dtype=float).reshape(-1, 2)
+        v2 = np.asarray(v2, dtype=float).reshape(-1, 2)
+        queries = np.arange(v1.shape[0], dtype=np.intp)
+        active = np.full(v1.shape[0], self.root, dtype=np.int32)
+
+        while active.size:
+            if counters is not None:
+                counters['bvh_nodes_visited'] += active.size
+
+            vmin = self.vmin[active]
+            vmax = self.vmax[active]
+            hit = (
+                cohen_sutherland_codes(vmin, vmax, v1[queries]) &
+                cohen_sutherland_codes(vmin, vmax, v2[queries])
+            ) == CODE_INSIDE
+            queries = queries[hit]
+            active = active[hit]
+
+            if not active.size or active[0] < self.leaves:
+                break
+
+            children = np.concatenate(
+                (self.left[active], self.right[active])
+            )
+            queries = np.concatenate((queries, queries))[children >= 0]
+            active = children[children >= 0]
+
+        return queries, active
+
+    def intersects_segment(
+        self,
+        v1: Tuple[float, float],
+        v2: Tuple[float, float],
+        visited: Optional[List[npt.NDArray]] = None,
+        counters: Optional[Counter[str]] = None
+    ) -> bool:
+        return bool(self.query_segment(v1, v2, visited, counters).size)
@@ -0,0 +1,73 @@
+import numpy as np
+import numpy.typing as npt
+from typing import Optional, Tuple
+
+MIN_ZOOM = 0.05
+MAX_ZOOM = 8.0
+ZOOM_STEP = 1.1
+FIT_MARGIN = 0.95
+
+
+class Camera:
+
+    def __init__(
+        self,
+        size: Tuple[int, int],
+        center: Optional[Tuple[float, float]] = None,
+        zoom: float = 1.0
+    ) -> None:
+        self.size: Tuple[int, int] = size
+        if center is None:
+            center = (size[0] / 2, size[1] / 2)
+        self.center: npt.NDArray = np.array(center, dtype=float)
+        self.zoom: float = zoom
+        self.version: int = 0
+
+    @property
+    def _half(self) -> npt.NDArray:
+        return np.array(self.size, dtype=float) / 2
+
+    def to_screen(self, points: npt.ArrayLike) -> npt.NDArray:
+        points = np.asarray(points, dtype=float)
+        return (points - self.center) * self.zoom + self._half
+
+    def to_world(self, pos: Tuple[float, float]) -> Tuple[float, float]:
+        x, y = (np.asarray(pos, dtype=float) - self._half) / self.zoom
+        return (float(x + self.center[0]), float(y + self.center[1]))
+
+    def visible(
+        self,
+        margin: float = 0.0
+    ) -> Tuple[Tuple[float, float], Tuple[float, float]]:
+        half = self._half / self.zoom + margin
+        vmin = self.center - half
+        vmax = self.center + half
+        return (
+            (float(vmin[0]), float(vmin[1])),
+            (float(vmax[0]), float(vmax[1]))
+        )
+
+    def pan(self, dx: float, dy: float) -> None:
+        if not dx and not dy:
+            return
+        self.center -= np.array((dx, dy), dtype=float) / self.zoom
+        self.version += 1
+
+    def zoom_at(self, pos: Tuple[float, float], factor: float) -> None:
+        zoom = min(max(self.zoom * factor, MIN_ZOOM), MAX_ZOOM)
+        if zoom == self.zoom:
+            return
+        anchor = np.array(self.to_world(pos))
+        self.zoom = zoom
+        self.center += anchor - np.array(self.to_world(pos))
+        self.version += 1
+
+    def fit(self, board_size: Tuple[float, float]) -> None:
+        zoom = min(
+            self.size[0] / board_size[0], self.size[1] / board_size[1]
+        )
+        if zoom < 1.0:
+            zoom = max(zoom * FIT_MARGIN, MIN_ZOOM)
+        self.zoom = min(zoom, 1.0)
+        self.center = np.array(board_size, dtype=float) / 2
+        self.version += 1
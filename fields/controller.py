@@ -0,0 +1,136 @@
+from __future__ import annotations
+from typing import Optional, Tuple
+
+from .board import SEGMENT_STEP, Board
+from .profiler import FrameProfiler
+from .recording import (
+    EVENT_BUTTON_DOWN, EVENT_BUTTON_UP, EVENT_QUIT, FrameInput, Recording
+)
+from .simulation import RelaxationWorker
+
+
+class GameController:
+
+    def __init__(
+        self,
+        board: Board,
+        worker: RelaxationWorker,
+        live: bool = True,
+        profiler: Optional[FrameProfiler] = None
+    ) -> None:
+        self.board: Board = board
+        self.worker: RelaxationWorker = worker
+        self.live: bool = live
+        self.profiler: FrameProfiler = profiler or FrameProfiler()
+        self.running: bool = True
+        self.over_node: int = -1
+        self.left_starting_node: bool = False
+        self.intersection: bool = False
+
+    def hover(self, pos: Tuple[float, float]) -> int:
+        with self.profiler.phase('over_node'):
+            self.over_node = self.board.nodes_field.over_node(pos)
+        return self.over_node
+
+    def _relax(self, frame: FrameInput) -> None:
+        worker = self.worker
+        if not self.live:
+            worker.advance(frame.relax_steps)
+        else:
+            steps = 0
+            if frame.buttons[2] or (
+                worker.adaptive and not self.board.moving
+            ):
+                worker.start()
+            else:
+                steps = worker.stop()
+            frame.relax_steps = steps + worker.publish()
+
+        if frame.buttons[2]:
+            worker.wake()
+
+    def update(self, frame: FrameInput) -> None:
+        board = self.board
+        profiler = self.profiler
+        over_node = self.over_node
+
+        with profiler.phase('relaxation.publish'):
+            self._relax(frame)
+
+        with profiler.phase('events'):
+            for kind, _ in frame.events:
+                if kind == EVENT_QUIT:
+                    self.running = False
+                elif (
+                    (kind == EVENT_BUTTON_DOWN) and
+                    board.begin_move(over_node)
+                ):
+                    self.intersection = False
+                    self.left_starting_node = False
+                elif (
+                    self.intersection or
+                    (self.left_starting_node and over_node > -1) or
+                    (kind == EVENT_BUTTON_UP)
+                ) and board.moving:
+                    if self.intersection or not self.left_starting_node:
+                        board.cancel_move()
+                    else:
+                        board.commit_move(over_node)
+                    self.intersection = False
+
+        if not self.left_starting_node and (over_node < 0):
+            self.left_starting_node = True
+
+        if board.moving:
+            if self.left_starting_node:
+                with profiler.phase('check_intersection'):
+                    self.intersection = (
+                        board.polyline_field.check_intersection(frame.pos)
+                    )
+            with profiler.phase('push_vertex'):
+                board.extend_move(frame.pos, SEGMENT_STEP)
+
+    def step(self, frame: FrameInput) -> None:
+        self.hover(frame.pos)
+        self.update(frame)
+
+    def count(self) -> None:
+        profiler = self.profiler
+        polyline_field = self.board.polyline_field
+        profiler.count('vertices', len(self.board.vertex_field))
+        profiler.count('relaxation_steps', self.worker.steps)
+        if self.worker.integrator is not None:
+            profiler.count(
+                'awake_polylines', int(self.worker.integrator.awake.sum())
+            )
+        for name, value in polyline_field.counters.items():
+            profiler.count(name, value)
+
+
+def replay(
+    recording: Recording,
+    profiler: Optional[FrameProfiler] = None
+) -> Board:
+    header = recording.header
+    board = Board(header.size, header.simplify_tolerance)
+    board.generate(header.nodes, header.radius, header.seed)
+    worker = RelaxationWorker(
+        board.vertex_field,
+        board.nodes_field,
+        board.polyline_field,
+        header.power,
+        header.step_ms,
+        header.cutoff,
+        header.adaptive
+    )
+    controller = GameController(board, worker, live=False, profiler=profiler)
+
+    for frame in recording.frames:
+        controller.profiler.begin_frame()
+        board.polyline_field.counters.clear()
+        controller.step(frame)
+        controller.count()
+        controller.profiler.end_frame()
+        if not controller.running:
+            break
+    return board
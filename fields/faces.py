@@ -0,0 +1,302 @@
+from __future__ import annotations
+import bisect
+import numpy as np
+import numpy.typing as npt
+from dataclasses import dataclass, field
+from typing import Dict, List, Set, Tuple
+
+from .geometry import points_in_polygon, signed_area
+from .nodes import NodesField
+from .polylines import PolylinesField
+from .vertexes import VertexField
+
+MAX_DEGREE = 3
+OUTER_FACE = 0
+
+
+@dataclass
+class Face:
+    boundaries: Set[int] = field(default_factory=set)
+    isolated: Set[int] = field(default_factory=set)
+    nodes: Set[int] = field(default_factory=set)
+    lives: int = 0
+
+
+class FaceTracker:
+
+    def __init__(
+        self,
+        vertex_field: VertexField,
+        nodes_field: NodesField,
+        polyline_field: PolylinesField
+    ) -> None:
+        self._vertex_field: VertexField = vertex_field
+        self._nodes_field: NodesField = nodes_field
+        self._polyline_field: PolylinesField = polyline_field
+        self.reset()
+
+    def reset(self) -> None:
+        self._origin: List[int] = []
+        self._angle: List[float] = []
+        self._face: List[int] = []
+        self._chains: List[List[int]] = []
+        self._rotation: Dict[int, List[int]] = {}
+        self._isolated: Dict[int, int] = {}
+        self._node_of: Dict[int, int] = {}
+        self.faces: Dict[int, Face] = {OUTER_FACE: Face()}
+        self.movable: Set[int] = set()
+        self._next_face: int = OUTER_FACE + 1
+        self._base: int = 0
+        self._moves: int = 0
+
+    def _finished(self) -> int:
+        polyline_field = self._polyline_field
+        return len(polyline_field.polylines) - int(polyline_field.drawing)
+
+    def sync(self) -> None:
+        finished = self._finished()
+        base = len(self._nodes_field) - finished
+        if finished < self._moves or base != self._base:
+            self.rebuild()
+            return
+        if finished == self._moves:
+            return
+
+        touched: Set[int] = set()
+        try:
+            for move in range(self._moves, finished):
+                touched |= self._add_move(move)
+                self._moves = move + 1
+        finally:
+            self._refresh(touched)
+
+    def rebuild(self) -> None:
+        self.reset()
+        finished = self._finished()
+        self._base = len(self._nodes_field) - finished
+        outer = self.faces[OUTER_FACE]
+        for node in range(self._base):
+            self._node_of[self._nodes_field.get_index(node)] = node
+            self._isolated[node] = OUTER_FACE
+            outer.isolated.add(node)
+            outer.nodes.add(node)
+
+        for move in range(finished):
+            self._add_move(move)
+        self._moves = finished
+        self._refresh(set(self.faces))
+
+    def _add_move(self, move: int) -> Set[int]:
+        indexes = self._polyline_field.get_polyline(move).indexes
+        if len(indexes) < 3:
+            raise ValueError(f'polyline {move} has no middle vertex')
+
+        middle = len(indexes) // 2
+        start = self._node_of[indexes[0]]
+        end = self._node_of[indexes[-1]]
+        node = self._base + move
+        if self._nodes_field.get_index(node) != indexes[middle]:
+            raise ValueError(f'node {node} is not the middle of move {move}')
+        first, second = indexes[:middle + 1], indexes[middle:]
+        face = self._corner_face(start, self._chain_angle(first))
+        if face != self._corner_face(end, self._chain_angle(second[::-1])):
+            raise ValueError(f'nodes {start} and {end} do not share a face')
+
+        self._node_of[indexes[middle]] = node
+        touched = self.faces_of(start) | self.faces_of(end)
+        self._isolated[node] = face
+        self.faces[face].isolated.add(node)
+
+        touched |= self._insert_edge(first)
+        touched |= self._insert_edge(second)
+        return touched
+
+    def _chain_angle(self, chain: List[int]) -> float:
+        points = self._vertex_field.get_vertexes_by_mask(chain)
+        offsets = points[1:] - points[0]
+        moved = np.flatnonzero(np.any(offsets != 0, axis=1))
+        if not moved.size:
+            raise ValueError('a move has no length')
+        dx, dy = offsets[moved[0]]
+        return float(np.arctan2(dy, dx))
+
+    def _corner(self, node: int, angle: float) -> Tuple[int, int]:
+        rotation = self._rotation.get(node, [])
+        position = bisect.bisect(
+            rotation, angle, key=lambda dart: self._angle[dart]
+        )
+        return position, rotation[position - 1] if rotation else -1
+
+    def _corner_face(self, node: int, angle: float) -> int:
+        _, previous = self._corner(node, angle)
+        if previous < 0:
+            return self._isolated[node]
+        return self._face[previous]
+
+    def _next(self, dart: int) -> int:
+        twin = dart ^ 1
+        rotation = self._rotation[self._origin[twin]]
+        return rotation[rotation.index(twin) - 1]
+
+    def _cycle(self, dart: int) -> List[int]:
+        cycle = [dart]
+        current = self._next(dart)
+        while current != dart:
+            cycle.append(current)
+            current = self._next(current)
+        return cycle
+
+    def _dart_chain(self, dart: int) -> List[int]:
+        chain = self._chains[dart >> 1]
+        return chain if not dart & 1 else chain[::-1]
+
+    def _polygon(self, cycle: List[int]) -> npt.NDArray:
+        indexes = [
+            index for dart in cycle for index in self._dart_chain(dart)[:-1]
+        ]
+        return self._vertex_field.get_vertexes_by_mask(indexes)
+
+    def _insert_edge(self, chain: List[int]) -> Set[int]:
+        start = self._node_of[chain[0]]
+        end = self._node_of[chain[-1]]
+        angles = (self._chain_angle(chain), self._chain_angle(chain[::-1]))
+        corners = (
+            self._corner(start, angles[0]), self._corner(end, angles[1])
+        )
+        faces = {
+            self._corner_face(node, angle)
+            for node, angle in zip((start, end), angles)
+        }
+        if len(faces) > 1:
+            raise ValueError(
+                f'nodes {start} and {end} do not share a face'
+            )
+        face_id = faces.pop()
+        face = self.faces[face_id]
+
+        dart = len(self._origin)
+        self._chains.append(chain)
+        for offset, node, angle, (position, _) in zip(
+            (0, 1), (start, end), angles, corners
+        ):
+            self._origin.append(node)
+            self._angle.append(angle)
+            self._face.append(face_id)
+            self._rotation.setdefault(node, []).insert(position, dart + offset)
+            self._isolated.pop(node, None)
+            face.isolated.discard(node)
+
+        cycle = self._cycle(dart)
+        darts = set(cycle)
+        if dart ^ 1 in darts:
+            face.boundaries -= darts
+            face.boundaries.add(dart)
+            face.nodes |= {start, end}
+            return {face_id}
+
+        other = self._cycle(dart ^ 1)
+        face.boundaries -= darts.union(other)
+        polygons = (self._polygon(cycle), self._polygon(other))
+        if signed_area(polygons[0]) < signed_area(polygons[1]):
+            cycle, other = other, cycle
+            polygons = polygons[::-1]
+
+        inner_id = self._next_face
+        self._next_face += 1
+        inner = self.faces[inner_id] = Face({cycle[0]})
+
+        boundaries = list(face.boundaries)
+        isolated = list(face.isolated)
+        face.boundaries.add(other[0])
+        representatives = [self._origin[dart] for dart in boundaries]
+        inside = points_in_polygon(
+            self._vertex_field.get_vertexes_by_mask(
+                [self._nodes_field.get_index(node)
+                 for node in representatives + isolated]
+            ),
+            polygons[0]
+        ).tolist()
+
+        moved = [cycle]
+        for boundary, enclosed in zip(boundaries, inside):
+            if enclosed:
+                face.boundaries.discard(boundary)
+                inner.boundaries.add(boundary)
+                moved.append(self._cycle(boundary))
+        for node, enclosed in zip(isolated, inside[len(boundaries):]):
+            if enclosed:
+                face.isolated.discard(node)
+                inner.isolated.add(node)
+                self._isolated[node] = inner_id
+
+        for darts_moved in moved:
+            for moved_dart in darts_moved:
+                self._face[moved_dart] = inner_id
+
+        for face_id_changed in (face_id, inner_id):
+            self._collect_nodes(face_id_changed)
+        return {face_id, inner_id}
+
+    def _collect_nodes(self, face_id: int) -> None:
+        face = self.faces[face_id]
+        face.nodes = set(face.isolated)
+        for boundary in face.boundaries:
+            face.nodes.update(
+                self._origin[dart] for dart in self._cycle(boundary)
+            )
+
+    def _refresh(self, face_ids: Set[int]) -> None:
+        for face_id in face_ids:
+            face = self.faces[face_id]
+            face.lives = sum(min(self.lives(node), 2) for node in face.nodes)
+            if face.lives >= 2:
+                self.movable.add(face_id)
+            else:
+                self.movable.discard(face_id)
+
+    def boundaries(self, face_id: int) -> List[List[int]]:
+        self.sync()
+        face = self.faces[face_id]
+        return [
+            [self._origin[dart] for dart in self._cycle(boundary)]
+            for boundary in sorted(face.boundaries)
+        ] + [[node] for node in sorted(face.isolated)]
+
+    def lives(self, node: int) -> int:
+        return MAX_DEGREE - self._nodes_field.get_degree(node)
+
+    def faces_of(self, node: int) -> Set[int]:
+        if node in self._isolated:
+            return {self._isolated[node]}
+        return {self._face[dart] for dart in self._rotation.get(node, [])}
+
+    @property
+    def game_over(self) -> bool:
+        self.sync()
+        return not self.movable
+
+    def can_connect(self, start: int, end: int) -> bool:
+        self.sync()
+        if start == end:
+            return self.lives(start) >= 2
+        return (
+            self.lives(start) > 0 and
+            self.lives(end) > 0 and
+            bool(self.faces_of(start) & self.faces_of(end))
+        )
+
+    def moves(self) -> List[Tuple[int, int, int]]:
+        self.sync()
+        moves: List[Tuple[int, int, int]] = []
+        for face_id in sorted(self.movable):
+            nodes = sorted(
+                node for node in self.faces[face_id].nodes
+                if self.lives(node) > 0
+            )
+            for number, start in enumerate(nodes):
+                if self.lives(start) >= 2:
+                    moves.append((face_id, start, start))
+                moves.extend(
+                    (face_id, start, end) for end in nodes[number + 1:]
+                )
+        return moves
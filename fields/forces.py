@@ -0,0 +1,263 @@
+import numpy as np
+import numpy.typing as npt
+from typing import Optional, Sequence, Tuple
+
+REPULSION = 50
+NODE_REPULSION = 2000
+SPRING = 0.002
+SPRING_LENGTH = 5
+
+CHUNK_ELEMENTS = 1 << 20
+
+
+def pack_indexes(
+    polylines: Sequence[Sequence[int]]
+) -> Tuple[npt.NDArray, npt.NDArray]:
+    lengths = np.fromiter(
+        (len(indexes) for indexes in polylines),
+        dtype=np.intp,
+        count=len(polylines)
+    )
+    offsets = np.zeros(len(polylines) + 1, dtype=np.intp)
+    np.cumsum(lengths, out=offsets[1:])
+
+    packed = np.fromiter(
+        (index for indexes in polylines for index in indexes),
+        dtype=np.intp,
+        count=int(offsets[-1])
+    )
+    return packed, offsets
+
+
+def owners(offsets: npt.NDArray) -> npt.NDArray:
+    return np.repeat(
+        np.arange(offsets.shape[0] - 1, dtype=np.intp),
+        np.diff(offsets)
+    )
+
+
+def repulsion(
+    positions: npt.NDArray,
+    sources: npt.NDArray,
+    strength: float,
+    excluded: Tuple[npt.NDArray, npt.NDArray] = (
+        np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    )
+) -> npt.NDArray:
+    result = np.zeros_like(positions)
+    if not sources.shape[0] or not positions.shape[0]:
+        return result
+
+    rows, columns = excluded
+    chunk = max(1, CHUNK_ELEMENTS // sources.shape[0])
+    bounds = np.searchsorted(rows, np.arange(0, positions.shape[0], chunk))
+
+    for number, start in enumerate(range(0, positions.shape[0], chunk)):
+        stop = min(start + chunk, positions.shape[0])
+        xs = positions[start:stop, 0:1]
+        ys = positions[start:stop, 1:2]
+
+        dx = xs - sources[:, 0]
+        dy = ys - sources[:, 1]
+        weights = dx * dx
+        weights += dy * dy
+        with np.errstate(divide='ignore'):
+            np.reciprocal(np.square(weights, out=weights), out=weights)
+
+        low = bounds[number]
+        high = bounds[number + 1] if number + 1 < bounds.shape[0] else None
+        weights[rows[low:high] - start, columns[low:high]] = 0
+
+        total = np.sum(weights, axis=1, keepdims=True)
+        result[start:stop, 0:1] = xs * total - weights @ sources[:, 0:1]
+        result[start:stop, 1:2] = ys * total - weights @ sources[:, 1:2]
+
+    return strength * result
+
+
+def repulsion_cutoff(
+    positions: npt.NDArray,
+    sources: npt.NDArray,
+    strength: float,
+    cutoff: float,
+    excluded: Tuple[npt.NDArray, npt.NDArray] = (
+        np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    )
+) -> npt.NDArray:
+    result = np.zeros_like(positions)
+    if not sources.shape[0] or not positions.shape[0]:
+        return result
+
+    source_cells = np.floor(sources / cutoff).astype(np.int64)
+    entry_cells = np.floor(positions / cutoff).astype(np.int64)
+    low = np.minimum(source_cells.min(axis=0), entry_cells.min(axis=0)) - 1
+    width = max(source_cells[:, 1].max(), entry_cells[:, 1].max()) - low[1] + 2
+
+    keys = (source_cells[:, 0] - low[0]) * width + source_cells[:, 1] - low[1]
+    order = np.argsort(keys, kind='stable')
+    cells, starts, counts = np.unique(
+        keys[order], return_index=True, return_counts=True
+    )
+
+    rows, columns = excluded
+    excluded_keys = np.sort(rows * sources.shape[0] + columns)
+    entry_keys = (
+        (entry_cells[:, 0] - low[0]) * width + entry_cells[:, 1] - low[1]
+    )
+    entries = np.arange(positions.shape[0], dtype=np.intp)
+
+    for offset_x in (-1, 0, 1):
+        for offset_y in (-1, 0, 1):
+            neighbours = entry_keys + offset_x * width + offset_y
+            found = np.searchsorted(cells, neighbours)
+            found = np.minimum(found, cells.shape[0] - 1)
+            hit = cells[found] == neighbours
+
+            first = starts[found[hit]]
+            number = counts[found[hit]]
+            pair_rows = np.repeat(entries[hit], number)
+            shift = np.repeat(np.cumsum(number) - number, number)
+            pair_columns = order[
+                np.repeat(first, number) +
+                np.arange(pair_rows.shape[0]) - shift
+            ]
+
+            if excluded_keys.shape[0]:
+                pair_keys = pair_rows * sources.shape[0] + pair_columns
+                place = np.minimum(
+                    np.searchsorted(excluded_keys, pair_keys),
+                    excluded_keys.shape[0] - 1
+                )
+                own = excluded_keys[place] == pair_keys
+                pair_rows = pair_rows[~own]
+                pair_columns = pair_columns[~own]
+
+            delta = positions[pair_rows] - sources[pair_columns]
+            squared = np.sum(delta * delta, axis=1)
+            near = squared < cutoff * cutoff
+            with np.errstate(divide='ignore', invalid='ignore'):
+                weights = 1 / (squared[near] * squared[near])
+
+            for axis in range(2):
+                result[:, axis] += np.bincount(
+                    pair_rows[near],
+                    weights=delta[near, axis] * weights,
+                    minlength=positions.shape[0]
+                )
+
+    return strength * result
+
+
+def cutoff_error_bound(
+    sources: int,
+    free_nodes: int,
+    cutoff: float
+) -> float:
+    """Upper bound on the per-vertex force error of the cutoff mode.
+
+    Every dropped source lies at least ``cutoff`` away and contributes a
+    force of magnitude ``strength / r**3``, so the error on any vertex is
+    at most ``(REPULSION * sources + NODE_REPULSION * free_nodes) /
+    cutoff**3``.
+    """
+    return (
+        REPULSION * sources + NODE_REPULSION * free_nodes
+    ) / cutoff ** 3
+
+
+def own_pairs(
+    packed: npt.NDArray,
+    offsets: npt.NDArray,
+    columns: npt.NDArray
+) -> Tuple[npt.NDArray, npt.NDArray]:
+    lengths = np.diff(offsets)
+    repeats = lengths[owners(offsets)]
+    rows = np.repeat(np.arange(packed.shape[0], dtype=np.intp), repeats)
+
+    starts = np.repeat(offsets[:-1], lengths)
+    block_starts = np.repeat(np.cumsum(repeats) - repeats, repeats)
+    entries = np.repeat(starts, repeats) + (
+        np.arange(rows.shape[0], dtype=np.intp) - block_starts
+    )
+
+    own_columns = columns[entries]
+    keep = own_columns >= 0
+    return rows[keep], own_columns[keep]
+
+
+def springs(positions: npt.NDArray, offsets: npt.NDArray) -> npt.NDArray:
+    result = np.zeros_like(positions)
+    if positions.shape[0] < 2:
+        return result
+
+    delta = np.diff(positions, axis=0)
+    length = np.hypot(delta[:, 0], delta[:, 1])
+    force = SPRING * delta * np.abs(SPRING_LENGTH - length)[:, None]
+
+    first = np.zeros(positions.shape[0], dtype=bool)
+    first[offsets[:-1][np.diff(offsets) > 0]] = True
+    within = ~first[1:]
+
+    second = np.zeros(positions.shape[0], dtype=bool)
+    starts = offsets[:-1][np.diff(offsets) > 1]
+    second[starts + 1] = True
+
+    result[:-1][within] += force[within]
+    pulled = within & ~second[1:]
+    result[1:][pulled] -= force[pulled]
+    return result
+
+
+def relaxation_forces(
+    vertexes: npt.NDArray,
+    packed: npt.NDArray,
+    offsets: npt.NDArray,
+    sources: npt.NDArray,
+    free_nodes: npt.NDArray,
+    cutoff: Optional[float] = None
+) -> npt.NDArray:
+    positions = vertexes[packed]
+
+    columns = np.full(vertexes.shape[0], -1, dtype=np.intp)
+    columns[sources] = np.arange(sources.shape[0], dtype=np.intp)
+    excluded = own_pairs(packed, offsets, columns[packed])
+
+    if cutoff is None:
+        forces = repulsion(
+            positions, vertexes[sources], REPULSION, excluded
+        )
+        forces += repulsion(
+            positions, vertexes[free_nodes], NODE_REPULSION
+        )
+    else:
+        forces = repulsion_cutoff(
+            positions, vertexes[sources], REPULSION, cutoff, excluded
+        )
+        forces += repulsion_cutoff(
+            positions, vertexes[free_nodes], NODE_REPULSION, cutoff
+        )
+
+    forces += springs(positions, offsets)
+    return forces
+
+
+def relax(
+    vertexes: npt.NDArray,
+    packed: npt.NDArray,
+    offsets: npt.NDArray,
+    sources: npt.NDArray,
+    free_nodes: npt.NDArray,
+    step: float,
+    cutoff: Optional[float] = None
+) -> None:
+    forces = relaxation_forces(
+        vertexes, packed, offsets, sources, free_nodes, cutoff
+    )
+    np.add.at(vertexes, packed, step * forces)
+
+
+def sources_for(
+    alive: npt.NDArray,
+    free_nodes: npt.NDArray
+) -> npt.NDArray:
+    return np.setdiff1d(alive, free_nodes, assume_unique=True)
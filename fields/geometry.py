@@ -0,0 +1,125 @@
+import numpy as np
+import numpy.typing as npt
+
+
+def as_segments(segments: npt.ArrayLike) -> npt.NDArray:
+    segments = np.asarray(segments, dtype=float)
+    return segments.reshape(-1, 2, 2)
+
+
+def segments_from_vertexes(vertexes: npt.NDArray) -> npt.NDArray:
+    if len(vertexes) < 2:
+        return np.empty((0, 2, 2), float)
+    return np.stack((vertexes[:-1], vertexes[1:]), axis=1)
+
+
+def orientated_areas(
+    a: npt.NDArray,
+    b: npt.NDArray,
+    c: npt.NDArray
+) -> npt.NDArray:
+    return (
+        (b[..., 0] - a[..., 0]) * (c[..., 1] - a[..., 1]) -
+        (b[..., 1] - a[..., 1]) * (c[..., 0] - a[..., 0])
+    )
+
+
+def paired_segments_intersect(
+    queries: npt.NDArray,
+    segments: npt.NDArray
+) -> npt.NDArray:
+    a, b = queries[..., 0, :], queries[..., 1, :]
+    c, d = segments[..., 0, :], segments[..., 1, :]
+
+    qmin = np.minimum(a, b)
+    qmax = np.maximum(a, b)
+    smin = np.minimum(c, d)
+    smax = np.maximum(c, d)
+
+    overlap = np.all(
+        np.maximum(qmin, smin) <= np.minimum(qmax, smax),
+        axis=-1
+    )
+
+    return (
+        overlap &
+        (orientated_areas(a, b, c) * orientated_areas(a, b, d) <= 0) &
+        (orientated_areas(c, d, a) * orientated_areas(c, d, b) <= 0)
+    )
+
+
+def segments_intersect(
+    queries: npt.ArrayLike,
+    segments: npt.ArrayLike
+) -> npt.NDArray:
+    return paired_segments_intersect(
+        as_segments(queries)[:, None],
+        as_segments(segments)[None, :]
+    )
+
+
+def any_segments_intersect(
+    queries: npt.ArrayLike,
+    segments: npt.ArrayLike
+) -> bool:
+    segments = as_segments(segments)
+    if not segments.shape[0]:
+        return False
+    return bool(np.any(segments_intersect(queries, segments)))
+
+
+def signed_area(polygon: npt.NDArray) -> float:
+    x, y = polygon[:, 0], polygon[:, 1]
+    return float(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y)) / 2
+
+
+def points_in_polygon(
+    points: npt.ArrayLike,
+    polygon: npt.NDArray
+) -> npt.NDArray:
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    a, b = polygon, np.roll(polygon, -1, axis=0)
+    x, y = points[:, None, 0], points[:, None, 1]
+
+    straddles = (a[:, 1] > y) != (b[:, 1] > y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        crossing = a[:, 0] + (y - a[:, 1]) * (
+            (b[:, 0] - a[:, 0]) / (b[:, 1] - a[:, 1])
+        )
+    return np.count_nonzero(straddles & (x < crossing), axis=1) % 2 == 1
+
+
+def point_segment_distances(
+    points: npt.NDArray,
+    a: npt.NDArray,
+    b: npt.NDArray
+) -> npt.NDArray:
+    direction = b - a
+    squared = np.einsum('...i,...i->...', direction, direction)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.einsum('...i,...i->...', points - a, direction) / squared
+    t = np.clip(np.nan_to_num(t), 0, 1)
+    closest = a + t[..., None] * direction
+    return np.hypot(*np.moveaxis(points - closest, -1, 0))
+
+
+def simplify_mask(points: npt.NDArray, tolerance: float) -> npt.NDArray:
+    keep = np.zeros(points.shape[0], bool)
+    if not points.shape[0]:
+        return keep
+    keep[[0, -1]] = True
+
+    stack = [(0, points.shape[0] - 1)]
+    while stack:
+        start, stop = stack.pop()
+        if stop - start < 2:
+            continue
+        distances = point_segment_distances(
+            points[start + 1:stop], points[start], points[stop]
+        )
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = start + 1 + farthest
+            keep[split] = True
+            stack += [(start, split), (split, stop)]
+    return keep
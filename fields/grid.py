@@ -0,0 +1,186 @@
+import math
+import numpy as np
+import numpy.typing as npt
+from typing import Dict, List, Tuple
+
+KEY_OFFSET = 1 << 30
+CORNER = 1e-9
+
+
+class PointGrid:
+
+    def __init__(self, cell: float) -> None:
+        self.cell: float = cell
+        self._keys: npt.NDArray = np.empty(0, dtype=np.int64)
+        self._ids: npt.NDArray = np.empty(0, dtype=np.intp)
+        self._pending_keys: npt.NDArray = np.empty(16, dtype=np.int64)
+        self._pending_ids: npt.NDArray = np.empty(16, dtype=np.intp)
+        self._pending: int = 0
+
+    def __len__(self) -> int:
+        return self._ids.shape[0] + self._pending
+
+    def cells(self, points: npt.ArrayLike) -> npt.NDArray:
+        points = np.asarray(points, dtype=float)
+        return np.floor(points / self.cell).astype(np.int64)
+
+    @staticmethod
+    def keys(cells: npt.NDArray) -> npt.NDArray:
+        return (
+            ((cells[..., 0] + KEY_OFFSET) << 32) |
+            (cells[..., 1] + KEY_OFFSET)
+        )
+
+    def rebuild(self, points: npt.NDArray, ids: npt.NDArray) -> None:
+        keys = self.keys(self.cells(points).reshape(-1, 2))
+        order = np.argsort(keys, kind='stable')
+        self._keys = keys[order]
+        self._ids = np.asarray(ids, dtype=np.intp)[order]
+        self._pending = 0
+
+    def insert(self, id: int, point: Tuple[float, float]) -> None:
+        if self._pending == self._pending_keys.shape[0]:
+            capacity = 2 * self._pending_keys.shape[0]
+            self._pending_keys = np.resize(self._pending_keys, capacity)
+            self._pending_ids = np.resize(self._pending_ids, capacity)
+        self._pending_keys[self._pending] = self.keys(self.cells(point))
+        self._pending_ids[self._pending] = id
+        self._pending += 1
+
+    def _merge(self) -> None:
+        if not self._pending:
+            return
+        keys = self._pending_keys[:self._pending]
+        order = np.argsort(keys, kind='stable')
+        places = np.searchsorted(self._keys, keys[order], side='right')
+        self._keys = np.insert(self._keys, places, keys[order])
+        self._ids = np.insert(
+            self._ids, places, self._pending_ids[:self._pending][order]
+        )
+        self._pending = 0
+
+    def _lookup(self, keys: npt.NDArray) -> npt.NDArray:
+        starts = np.searchsorted(self._keys, keys, side='left')
+        stops = np.searchsorted(self._keys, keys, side='right')
+        counts = stops - starts
+        if not counts.sum():
+            return np.empty(0, dtype=np.intp)
+        shift = np.repeat(np.cumsum(counts) - counts, counts)
+        return self._ids[
+            np.repeat(starts, counts) + np.arange(counts.sum()) - shift
+        ]
+
+    def query_rect(
+        self,
+        vmin: Tuple[float, float],
+        vmax: Tuple[float, float]
+    ) -> npt.NDArray:
+        self._merge()
+        low = self.cells(vmin)
+        high = self.cells(vmax)
+        extent = np.maximum(high - low + 1, 0)
+
+        if extent[0] * extent[1] > self._keys.shape[0]:
+            xs = (self._keys >> 32) - KEY_OFFSET
+            ys = (self._keys & 0xFFFFFFFF) - KEY_OFFSET
+            inside = (
+                (xs >= low[0]) & (xs <= high[0]) &
+                (ys >= low[1]) & (ys <= high[1])
+            )
+            return self._ids[inside]
+
+        xs, ys = np.meshgrid(
+            np.arange(low[0], high[0] + 1),
+            np.arange(low[1], high[1] + 1),
+            indexing='ij'
+        )
+        return self._lookup(
+            self.keys(np.stack((xs.ravel(), ys.ravel()), axis=1))
+        )
+
+    def query_radius(
+        self,
+        point: Tuple[float, float],
+        radius: float
+    ) -> npt.NDArray:
+        return self.query_rect(
+            (point[0] - radius, point[1] - radius),
+            (point[0] + radius, point[1] + radius)
+        )
+
+
+class SegmentGrid:
+
+    def __init__(self, cell: float, capacity: int = 64) -> None:
+        self.cell: float = cell
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+        self._segments: npt.NDArray = np.empty((capacity, 2, 2), float)
+        self._count: int = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def segments(self) -> npt.NDArray:
+        return self._segments[:self._count]
+
+    def clear(self) -> None:
+        self._cells.clear()
+        self._count = 0
+
+    def _span(
+        self,
+        a: Tuple[float, float],
+        b: Tuple[float, float]
+    ) -> List[Tuple[int, int]]:
+        cell = self.cell
+        x, y = math.floor(a[0] / cell), math.floor(a[1] / cell)
+        end_x, end_y = math.floor(b[0] / cell), math.floor(b[1] / cell)
+        dx, dy = b[0] - a[0], b[1] - a[1]
+        step_x, step_y = (1 if dx > 0 else -1), (1 if dy > 0 else -1)
+        delta_x = abs(cell / dx) if dx else math.inf
+        delta_y = abs(cell / dy) if dy else math.inf
+        next_x = ((x + (step_x > 0)) * cell - a[0]) / dx if dx else math.inf
+        next_y = ((y + (step_y > 0)) * cell - a[1]) / dy if dy else math.inf
+
+        cells = [(x, y)]
+        while x != end_x or y != end_y:
+            if y == end_y or (x != end_x and next_x < next_y - CORNER):
+                x += step_x
+                next_x += delta_x
+            elif x == end_x or next_y < next_x - CORNER:
+                y += step_y
+                next_y += delta_y
+            else:
+                cells += [(x + step_x, y), (x, y + step_y)]
+                x += step_x
+                y += step_y
+                next_x += delta_x
+                next_y += delta_y
+            cells.append((x, y))
+        return cells
+
+    def append(self, a: Tuple[float, float], b: Tuple[float, float]) -> int:
+        id = self._count
+        if id == self._segments.shape[0]:
+            self._segments = np.concatenate(
+                (self._segments, np.empty_like(self._segments))
+            )
+        self._segments[id] = (a, b)
+        self._count += 1
+        for key in self._span(a, b):
+            self._cells.setdefault(key, []).append(id)
+        return id
+
+    def query_segment(
+        self,
+        a: Tuple[float, float],
+        b: Tuple[float, float],
+        before: int
+    ) -> npt.NDArray:
+        found = {
+            id for key in self._span(a, b)
+            for id in self._cells.get(key, ())
+            if id < before
+        }
+        return np.fromiter(sorted(found), dtype=np.intp, count=len(found))
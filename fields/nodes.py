@@ -1,36 +1,153 @@
 from __future__ import annotations
-from dataclasses import dataclass
-import pygame as pg
 import numpy as np
-from typing import Any, Optional, List, Tuple
-from .vertexes import VertexField
+import numpy.typing as npt
+from typing import Optional, List, Tuple
+from .grid import PointGrid
+from .vertexes import VertexField, INITIAL_CAPACITY
 
 DOTS_RADIUS = 8
 
-pg.font.init()
-node_font = pg.font.SysFont('arial', 10)
+GENERATION_ATTEMPTS = 5
+POISSON_CANDIDATES = 30
+POISSON_ROUNDS = 3
+POISSON_BATCH = 256
 
 
-@dataclass
-class Node:
-    index: int
-    degree: int
+def poisson_disk(
+    vmin: Tuple[float, float],
+    vmax: Tuple[float, float],
+    radius: float,
+    rng: np.random.Generator
+) -> npt.NDArray:
+    low = np.asarray(vmin, dtype=float)
+    size = np.asarray(vmax, dtype=float) - low
+    if np.any(size < 0):
+        return np.empty((0, 2), float)
 
+    cell = radius / np.sqrt(2)
+    shape = (np.ceil(size / cell).astype(int) + 1)[::-1]
+    grid = np.full(shape + 4, -1, dtype=np.intp)
+    window = np.arange(5)
 
-class NodesField:
+    points = np.empty((grid.size, 2), float)
+    points[0] = low + rng.uniform(0, 1, 2) * size
+    grid[tuple(((points[0] - low) // cell).astype(int)[::-1] + 2)] = 0
+    count = 1
+    active = np.array([0], dtype=np.intp)
+    misses = np.zeros(1, dtype=np.intp)
+
+    while active.size:
+        batch = rng.permutation(active.size)[:POISSON_BATCH]
+        origins = points[active[batch]]
 
-    _instance: Optional[NodesField] = None
+        angles = rng.uniform(0, 2 * np.pi, (batch.size, POISSON_CANDIDATES))
+        lengths = rng.uniform(
+            radius, 2 * radius, (batch.size, POISSON_CANDIDATES)
+        )
+        candidates = origins[:, None] + np.stack(
+            (np.cos(angles), np.sin(angles)), axis=-1
+        ) * lengths[..., None]
+
+        inside = np.all(
+            (candidates >= low) & (candidates <= low + size), axis=-1
+        )
+        cells = np.where(
+            inside[..., None], (candidates - low) // cell, 0
+        ).astype(int)
 
-    @classmethod
-    def __new__(cls, *args: Any, **kwargs: Any):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-        return cls._instance
+        neighbours = grid[
+            cells[..., 1, None, None] + window[:, None],
+            cells[..., 0, None, None] + window[None, :]
+        ].reshape(batch.size, POISSON_CANDIDATES, -1)
+        offsets = points[np.maximum(neighbours, 0)] - candidates[..., None, :]
+        distances = np.einsum('...i,...i->...', offsets, offsets)
+        free = inside & np.all(
+            (neighbours < 0) | (distances >= radius * radius), axis=-1
+        )
+
+        found = np.any(free, axis=1)
+        misses[batch[~found]] += 1
+        retired = misses >= POISSON_ROUNDS
+
+        chosen = candidates[found, np.argmax(free[found], axis=1)]
+        gaps = np.hypot(
+            chosen[:, None, 0] - chosen[None, :, 0],
+            chosen[:, None, 1] - chosen[None, :, 1]
+        )
+        accepted = chosen[~np.any(np.tril(gaps < radius, -1), axis=1)]
 
-    def __init__(self, vertex_field: VertexField, screen: pg.Surface):
+        new = np.arange(count, count + accepted.shape[0])
+        accepted_cells = ((accepted - low) // cell).astype(int)
+        grid[accepted_cells[:, 1] + 2, accepted_cells[:, 0] + 2] = new
+        points[new] = accepted
+        count += accepted.shape[0]
+        active = np.concatenate((active[~retired], new))
+        misses = np.concatenate((misses[~retired], np.zeros_like(new)))
+
+    return points[:count]
+
+
+def lattice_fill(
+    vmin: Tuple[float, float],
+    vmax: Tuple[float, float],
+    radius: float,
+    count: int,
+    rng: np.random.Generator
+) -> npt.NDArray:
+    low = np.asarray(vmin, dtype=float)
+    size = np.asarray(vmax, dtype=float) - low
+    if np.any(size < 0):
+        return np.empty((0, 2), float)
+
+    sites = np.floor(size / radius).astype(int) + 1
+    if sites[0] * sites[1] < count:
+        return np.empty((0, 2), float)
+
+    spacing = np.where(sites > 1, size / np.maximum(sites - 1, 1), 0)
+    jitter = np.where(sites > 1, (spacing - radius) / 2, size / 2)
+    chosen = rng.choice(sites[0] * sites[1], count, replace=False)
+    cells = np.stack((chosen % sites[0], chosen // sites[0]), axis=1)
+    points = low + cells * spacing + np.where(sites > 1, 0, size / 2)
+    return points + rng.uniform(-1, 1, (count, 2)) * jitter
+
+
+class NodesField:
+
+    def __init__(
+        self,
+        vertex_field: VertexField,
+        size: Tuple[float, float]
+    ) -> None:
         self._vertex_field: VertexField = vertex_field
-        self._nodes: List[Node] = []
-        self._screen = screen
+        self._indexes: npt.NDArray = np.zeros(INITIAL_CAPACITY, np.intp)
+        self._degrees: npt.NDArray = np.zeros(INITIAL_CAPACITY, np.int8)
+        self._count: int = 0
+        self._grid: PointGrid = PointGrid(2 * DOTS_RADIUS)
+        self._grid_valid: bool = True
+        self.version: int = 0
+        self.size: Tuple[float, float] = size
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def degrees(self) -> npt.NDArray:
+        return self._degrees[:self._count]
+
+    def _append(self, index: int, degree: int) -> None:
+        if self._count == self._indexes.shape[0]:
+            capacity = max(2 * self._indexes.shape[0], INITIAL_CAPACITY)
+            self._indexes = np.resize(self._indexes, capacity)
+            self._degrees = np.resize(self._degrees, capacity)
+
+        self._indexes[self._count] = index
+        self._degrees[self._count] = degree
+        self.version += 1
+        if self._grid_valid:
+            vertex = self._vertex_field.get_vertex(index)
+            if vertex is not None:
+                self._grid.insert(self._count, vertex)
+        self._count += 1
 
     def push_node(self, x: float, y: float, degree: int = 0) -> None:
         index: int = self._vertex_field.push_vertex(x, y)
@@ -39,91 +156,121 @@ class NodesField:
             degree_to_set = 0
         elif degree_to_set > 3:
             degree_to_set = 3
-        self._nodes.append(Node(index, degree_to_set))
+        self._append(index, degree_to_set)
 
     def push_node_by_index(self, index: int) -> None:
-        self._nodes.append(Node(index, 2))
+        self._append(index, 2)
+
+    def pop_node(self) -> None:
+        if not self._count:
+            return
+        self._count -= 1
+        self._grid_valid = False
+        self.version += 1
+
+    def load(
+        self,
+        indexes: npt.NDArray,
+        degrees: npt.NDArray,
+        copy: bool = True
+    ) -> None:
+        count = indexes.shape[0]
+        if copy:
+            capacity = max(INITIAL_CAPACITY, count)
+            self._indexes = np.zeros(capacity, np.intp)
+            self._indexes[:count] = indexes
+            self._degrees = np.zeros(capacity, np.int8)
+            self._degrees[:count] = degrees
+        else:
+            self._indexes = indexes
+            self._degrees = degrees
+        self._count = count
+        self._grid_valid = False
+        self.version += 1
+
+    def invalidate_positions(self) -> None:
+        self._grid_valid = False
 
     def rise_degree(self, index):
-        if 0 <= index < len(self._nodes) and (self._nodes[index].degree < 3):
-            self._nodes[index].degree += 1
+        if 0 <= index < self._count and (self._degrees[index] < 3):
+            self._degrees[index] += 1
+            self.version += 1
 
     def lower_degree(self, index):
-        if 0 <= index < len(self._nodes) and (self._nodes[index].degree > 0):
-            self._nodes[index].degree -= 1
+        if 0 <= index < self._count and (self._degrees[index] > 0):
+            self._degrees[index] -= 1
+            self.version += 1
 
     def get_degree(self, index) -> int:
-        if 0 <= index < len(self._nodes):
-            return self._nodes[index].degree
+        if 0 <= index < self._count:
+            return int(self._degrees[index])
         return 0
 
     def get_index(self, index) -> int:
-        if 0 <= index < len(self._nodes):
-            return self._nodes[index].index
+        if 0 <= index < self._count:
+            return int(self._indexes[index])
         return 0
 
-    def get_indexes_by_degree(self, degrees: List[int]) -> List[int]:
-        result: List[int] = []
-
-        for node in self._nodes:
-            if node.degree in degrees:
-                result.append(node.index)
-        return result
-
-    def generate_field(self, number_of_nodes: int = 10, radius: int = 50):
-        w, h = self._screen.get_size()
-        dots: List[Tuple[float, float]] = []
-        for _ in range(number_of_nodes):
-            while True:
-                too_close: bool = False
-                x: float = np.random.randint(radius, w - radius)
-                y: float = np.random.randint(radius, h - radius)
-                for dot in dots:
-                    if np.sqrt(
-                        np.power(dot[0] - x, 2) + np.power(dot[1] - y, 2)
-                    ) < radius:
-                        too_close = True
-                        break
-                if too_close:
-                    continue
-                dots.append((x, y))
+    def get_indexes_by_degree(self, degrees: List[int]) -> npt.NDArray:
+        return self.vertexes_indexes[np.isin(self.degrees, degrees)]
+
+    def generate_field(
+        self,
+        number_of_nodes: int = 10,
+        radius: int = 50,
+        seed: Optional[int] = None
+    ):
+        w, h = self.size
+        rng = np.random.default_rng(seed)
+
+        vmin, vmax = (radius, radius), (w - radius, h - radius)
+        for _ in range(GENERATION_ATTEMPTS):
+            dots = poisson_disk(vmin, vmax, radius, rng)
+            if dots.shape[0] >= number_of_nodes:
                 break
+        else:
+            dots = lattice_fill(vmin, vmax, radius, number_of_nodes, rng)
+        if dots.shape[0] < number_of_nodes:
+            raise ValueError(
+                f'cannot place {number_of_nodes} nodes at least {radius} px '
+                f'apart on a {w}x{h} board'
+            )
+
+        chosen = rng.choice(dots.shape[0], number_of_nodes, replace=False)
+        for x, y in dots[np.sort(chosen)].tolist():
             self.push_node(x, y)
 
     @property
-    def vertexes_indexes(self) -> List[int]:
-        return [node.index for node in self._nodes]
+    def vertexes_indexes(self) -> npt.NDArray:
+        return self._indexes[:self._count]
+
+    def _ensure_grid(self) -> None:
+        if not self._grid_valid:
+            self._grid.rebuild(
+                self._vertex_field.get_vertexes_by_mask(self.vertexes_indexes),
+                np.arange(self._count)
+            )
+            self._grid_valid = True
+
+    def nodes_in_rect(
+        self,
+        vmin: Tuple[float, float],
+        vmax: Tuple[float, float]
+    ) -> npt.NDArray:
+        self._ensure_grid()
+        return np.sort(self._grid.query_rect(vmin, vmax))
 
     def over_node(self, pos: Tuple[float, float]) -> int:
-        indexes = self.vertexes_indexes
-        vertexes = self._vertex_field.get_vertexes_by_mask(indexes)
-        ord_indexes = np.arange(len(indexes))
-        nd_indexes = np.reshape(np.array(ord_indexes), (vertexes.shape[0], 1))
-        vxs = vertexes[:, :1]
-        vys = vertexes[:, 1:]
-        distances = np.sqrt(
-            np.power(vxs - pos[0], 2) +
-            np.power(vys - pos[1], 2)
+        self._ensure_grid()
+        candidates = np.sort(self._grid.query_radius(pos, DOTS_RADIUS))
+        if not candidates.size:
+            return -1
+
+        vertexes = self._vertex_field.get_vertexes_by_mask(
+            self._indexes[candidates]
         )
-        distances_and_indexes = np.concatenate((distances, nd_indexes), axis=1)
-        result = distances_and_indexes[
-            distances_and_indexes[:, 0] < DOTS_RADIUS
-        ]
+        distances = np.hypot(vertexes[:, 0] - pos[0], vertexes[:, 1] - pos[1])
+        result = candidates[distances < DOTS_RADIUS]
         if not result.size:
             return -1
-        return int(result[0][1])
-
-    def draw(self, select: int):
-        for index, node in enumerate(self._nodes):
-            coordinates = self._vertex_field.get_vertex(node.index)
-            if coordinates is None:
-                continue
-            text_surface = node_font.render(str(index), False, (255, 255, 255))
-            place = text_surface.get_rect(center=coordinates)
-            node_color = (0, 0, 0)
-            if node.degree == 3:
-                node_color = (100, 100, 100)
-            elif index == select:
-                node_color = (255, 0, 0)
-            pg.draw.circle(self._screen, node_color, coordinates, DOTS_RADIUS)
-            self._screen.blit(text_surface, place)
+        return int(result[0])
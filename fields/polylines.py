@@ -1,134 +1,33 @@
 from __future__ import annotations
-from collections import deque
 import numpy as np
-from numpy.lib.stride_tricks import sliding_window_view
 import numpy.typing as npt
-import pygame as pg
+from collections import Counter
 from dataclasses import dataclass, field
-from typing import List, Optional, Self, Tuple, Deque, Set
+from typing import List, Optional, Sequence, Tuple, Set
 
-from .nodes import NodesField
+from .nodes import DOTS_RADIUS, NodesField
 from .vertexes import VertexField
+from .geometry import (
+    any_segments_intersect, paired_segments_intersect,
+    point_segment_distances, segments_from_vertexes, segments_intersect,
+    simplify_mask
+)
+from .bvh import BVH, morton_codes
+from .forces import pack_indexes, relax, sources_for
+from .grid import SegmentGrid
 
-CODE_INSIDE = 0
-CODE_LEFT = 1
-CODE_RIGHT = 2
-CODE_BOTTOM = 4
-CODE_TOP = 8
+STROKE_CELL = 16.0
 
 
-def projections_intersects(a: float, b: float, c: float, d: float):
-    if (a > b):
-        b, a = a, b
-
-    if (c > d):
-        d, c = c, d
-
-    return np.max([a, c]) <= np.min([b, d])
-
-
-def orientated_area(a: Tuple[float, float],
-                    b: Tuple[float, float],
-                    c: Tuple[float, float]):
-    return (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
-
-
-def intersection(a: Tuple[float, float], b: Tuple[float, float],
-                 c: Tuple[float, float], d: Tuple[float, float]):
-    return (
-        projections_intersects(a[0], b[0], c[0], d[0]) and
-        projections_intersects(a[1], b[1], c[1], d[1]) and
-        (orientated_area(a, b, c) * orientated_area(a, b, d) <= 0) and
-        (orientated_area(c, d, a) * orientated_area(c, d, b) <= 0)
-    )
-
-
-def cohen_sutherland_code(
-    vmin: Tuple[float, float],
-    vmax: Tuple[float, float],
-    v: Tuple[float, float]
-) -> int:
-
-    result_code: int = CODE_INSIDE
-
-    if v[0] < vmin[0]:
-        result_code |= CODE_LEFT
-    elif v[0] > vmax[0]:
-        result_code |= CODE_RIGHT
-
-    if v[1] < vmin[1]:
-        result_code |= CODE_BOTTOM
-    elif v[1] > vmax[1]:
-        result_code |= CODE_TOP
-
-    return result_code
-
-
-@dataclass
-class TreeNode:
-    vmin: Tuple[float, float] = field(default=(0, 0))
-    vmax: Tuple[float, float] = field(default=(0, 0))
-    right: Optional[Self] = field(default=None, repr=False)
-    left: Optional[Self] = field(default=None, repr=False)
-
-    def check_intersection(
-        self: Self,
-        v1: Tuple[float, float],
-        v2: Tuple[float, float]
-    ) -> bool:
-        vmin = self.vmin
-        vmax = self.vmax
-
-        code_point1: int = cohen_sutherland_code(vmin, vmax, v1)
-        code_point2: int = cohen_sutherland_code(vmin, vmax, v2)
-
-        final_code: int = code_point1 & code_point2
-
-        return not final_code
-
-    def draw(self, screen, color=(0, 0, 0)):
-        rect = (
-            self.vmin[0], self.vmin[1],
-            self.vmax[0] - self.vmin[0],
-            self.vmax[1] - self.vmin[1]
-        )
-        pg.draw.rect(screen, color, rect, 1)
-
-    @staticmethod
-    def combine_nodes(tree_left: TreeNode, tree_right: TreeNode):
-        xs = np.array(
-            [
-                tree_right.vmin[0],
-                tree_right.vmax[0],
-                tree_left.vmin[0],
-                tree_left.vmax[0]
-            ]
-        )
-
-        ys = np.array(
-            [
-                tree_right.vmin[1],
-                tree_right.vmax[1],
-                tree_left.vmin[1],
-                tree_left.vmax[1]
-            ]
-        )
-
-        x_max: float = np.max(xs)
-        y_max: float = np.max(ys)
-        x_min: float = np.min(xs)
-        y_min: float = np.min(ys)
-
-        vmax = (x_max, y_max)
-        vmin = (x_min, y_min)
-
-        return vmax, vmin
+def subdivide(pieces: npt.NDArray, lengths: npt.NDArray, extra: int) -> None:
+    for _ in range(max(0, int(extra))):
+        pieces[np.argmax(lengths / pieces)] += 1
 
 
 @dataclass
 class PolyLine:
     indexes: List[int] = field(default_factory=lambda: [])
-    tree: Optional[TreeNode] = field(default=None)
+    tree: Optional[BVH] = field(default=None)
 
     @property
     def middle_point(self):
@@ -137,39 +36,43 @@ class PolyLine:
 
 class PolylinesField:
 
-    _instance: Optional[Self] = None
-
-    @classmethod
-    def __new__(cls, *args, **kwargs) -> PolylinesField:
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-        return cls._instance
-
     def __init__(self,
-                 screen: pg.Surface,
                  vertex_field: VertexField,
                  nodes_field: NodesField) -> None:
         self._polylines: List[PolyLine] = []
         self._vertex_field: VertexField = vertex_field
         self._nodes_field: NodesField = nodes_field
         self._indexes: Set[int] = set()
-        self._screen = screen
+        self._broad_phase: Optional[BVH] = None
+        self._broad_phase_ids: npt.NDArray = np.empty(0, dtype=np.intp)
+        self.counters: Counter[str] = Counter()
+        self._drawing: bool = False
+        self._stroke: SegmentGrid = SegmentGrid(STROKE_CELL)
+        self._stroke_version: int = -1
+        self.version: int = 0
+        self.geometry_version: int = 0
 
     def start_polyline(self, index: int):
         polyline = PolyLine()
         polyline.indexes.append(index)
         self._polylines.append(polyline)
         self._indexes.add(index)
+        self._drawing = True
+        self._stroke.clear()
+        self.version += 1
 
     def end_polyline(self, index: int):
         polyline = self._polylines[-1]
         polyline.indexes.append(index)
         self._indexes.add(index)
+        self._drawing = False
+        self.version += 1
+        self.invalidate()
 
     def check_intersection(
         self,
         pos: Tuple[float, float],
-        debug: bool = False
+        visited: Optional[List[Tuple[BVH, npt.NDArray]]] = None
     ):
         if not len(self._polylines):
             return False
@@ -179,79 +82,229 @@ class PolylinesField:
         if (len(last_polyline.indexes) < 2):
             return False
 
-        vertexes = self._vertex_field.get_vertexes_by_mask(
-            last_polyline.indexes
+        stroke = self.stroke_segments()
+        last = len(stroke) - 1
+        v1: Tuple[float, float] = (
+            float(stroke.segments[last, 1, 0]),
+            float(stroke.segments[last, 1, 1])
         )
+        v2 = pos
 
-        vertex_pairs = np.squeeze(
-            sliding_window_view(vertexes, window_shape=(2, 2))
-        )
+        if last > 1:
+            a, b = stroke.segments[last - 1].tolist()
+            candidates = stroke.query_segment(a, b, last - 2)
+            self.counters['intersection_tests'] += candidates.size
+            if any_segments_intersect((a, b), stroke.segments[candidates]):
+                return True
 
-        list_vertex = vertexes[-1]
+        for p in self.nearby_polylines(v1, v2):
 
-        v1: Tuple[float, float] = (
-            float(list_vertex[0]),
-            float(list_vertex[1])
+            if p.tree is None:
+                continue
+
+            nodes: Optional[List[npt.NDArray]] = (
+                None if visited is None else []
+            )
+
+            hit = p.tree.intersects_segment(v1, v2, nodes, self.counters)
+
+            if visited is not None and nodes:
+                visited.append((p.tree, np.concatenate(nodes)))
+
+            if hit:
+                return True
+
+        return False
+
+    def nearby_polylines(
+        self,
+        v1: Tuple[float, float],
+        v2: Tuple[float, float]
+    ) -> List[PolyLine]:
+        if self._broad_phase is None:
+            return []
+
+        leaves = self._broad_phase.query_segment(
+            v1, v2, counters=self.counters
         )
-        v2 = pos
+        return [
+            self._polylines[index]
+            for index in np.sort(self._broad_phase_ids[leaves]).tolist()
+        ]
 
-        if len(vertex_pairs) > 2:
-            last_two = vertex_pairs[-2: -1]
-            for segment in last_two:
+    def visible_segments(
+        self,
+        vmin: Tuple[float, float],
+        vmax: Tuple[float, float]
+    ) -> List[Tuple[PolyLine, npt.NDArray]]:
+        if self._broad_phase is None:
+            return []
+
+        broad_phase = self._broad_phase
+        leaves = broad_phase.query_rect(vmin, vmax, self.counters)
+        inside = np.all(
+            (broad_phase.vmin[leaves] >= vmin) &
+            (broad_phase.vmax[leaves] <= vmax),
+            axis=1
+        )
+        ids = self._broad_phase_ids[leaves]
+        order = np.argsort(ids)
 
-                a: Tuple[float, float] = (
-                    float(segment[0][0]),
-                    float(segment[0][1])
+        visible = []
+        for index, contained in zip(
+            ids[order].tolist(), inside[order].tolist()
+        ):
+            polyline = self._polylines[index]
+            if contained:
+                segments = np.arange(polyline.tree.leaves)
+            else:
+                segments = np.sort(
+                    polyline.tree.query_rect(vmin, vmax, self.counters)
                 )
+            if segments.size:
+                visible.append((polyline, segments))
+        return visible
 
-                b: Tuple[float, float] = (
-                    float(segment[1][0]),
-                    float(segment[1][1])
-                )
+    def crossing_polylines(
+        self,
+        v1: npt.ArrayLike,
+        v2: npt.ArrayLike
+    ) -> Tuple[npt.NDArray, npt.NDArray]:
+        v1 = np.asarray(v1, dtype=float).reshape(-1, 2)
+        v2 = np.asarray(v2, dtype=float).reshape(-1, 2)
+        segments: List[npt.NDArray] = [np.empty(0, dtype=np.intp)]
+        polylines: List[npt.NDArray] = [np.empty(0, dtype=np.intp)]
+        if self._broad_phase is None:
+            return segments[0], polylines[0]
+
+        queries, leaves = self._broad_phase.query_segments(
+            v1, v2, self.counters
+        )
+        owners = self._broad_phase_ids[leaves]
 
-                for vertex_pair in vertex_pairs[:-3]:
+        for index in np.unique(owners).tolist():
+            tree = self._polylines[index].tree
+            candidates = queries[owners == index]
+            found, _ = tree.query_segments(
+                v1[candidates], v2[candidates], self.counters
+            )
+            hit = np.unique(candidates[found])
+            segments.append(hit)
+            polylines.append(np.full(hit.size, index, dtype=np.intp))
 
-                    c: Tuple[float, float] = (
-                        float(vertex_pair[0][0]),
-                        float(vertex_pair[0][1])
-                    )
+        return np.concatenate(segments), np.concatenate(polylines)
 
-                    d: Tuple[float, float] = (
-                        float(vertex_pair[1][0]),
-                        float(vertex_pair[1][1])
-                    )
+    def segment_vertexes(
+        self,
+        polylines: npt.NDArray,
+        segments: npt.NDArray
+    ) -> npt.NDArray:
+        indexes = [
+            self._polylines[polyline].indexes[segment:segment + 2]
+            for polyline, segment in zip(polylines.tolist(), segments.tolist())
+        ]
+        return self._vertex_field.get_vertexes_by_mask(
+            np.asarray(indexes, dtype=np.intp).ravel()
+        ).reshape(-1, 2, 2)
 
-                    if intersection(a, b, c, d):
-                        return True
+    def crossing_segments(
+        self,
+        v1: npt.ArrayLike,
+        v2: npt.ArrayLike
+    ) -> Tuple[npt.NDArray, npt.NDArray, npt.NDArray]:
+        v1 = np.asarray(v1, dtype=float).reshape(-1, 2)
+        v2 = np.asarray(v2, dtype=float).reshape(-1, 2)
+        empty = np.empty(0, dtype=np.intp)
+        if self._broad_phase is None:
+            return empty, empty, empty
+
+        candidates, leaves = self._broad_phase.query_segments(
+            v1, v2, self.counters
+        )
+        owners = self._broad_phase_ids[leaves]
+
+        found: List[npt.NDArray] = [empty]
+        polylines: List[npt.NDArray] = [empty]
+        segments: List[npt.NDArray] = [empty]
+        for index in np.unique(owners).tolist():
+            owned = candidates[owners == index]
+            hits, hit_segments = self._polylines[index].tree.query_segments(
+                v1[owned], v2[owned], self.counters
+            )
+            found.append(owned[hits])
+            polylines.append(np.full(hits.size, index, dtype=np.intp))
+            segments.append(hit_segments.astype(np.intp))
+
+        queries = np.concatenate(found)
+        owners = np.concatenate(polylines)
+        numbers = np.concatenate(segments)
+        self.counters['intersection_tests'] += queries.size
+        crossing = paired_segments_intersect(
+            np.stack((v1[queries], v2[queries]), axis=1),
+            self.segment_vertexes(owners, numbers)
+        )
+        return queries[crossing], owners[crossing], numbers[crossing]
 
-        for p in self._polylines:
+    def _root_boxes(self, ids: npt.NDArray):
+        trees = [self._polylines[index].tree for index in ids.tolist()]
+        vmin = np.array([tree.vmin[tree.root] for tree in trees], float)
+        vmax = np.array([tree.vmax[tree.root] for tree in trees], float)
+        return vmin.reshape(-1, 2), vmax.reshape(-1, 2)
 
-            if p.tree is None:
-                continue
+    def update_broad_phase(self):
+        ids = np.array(
+            [
+                index for index, polyline in enumerate(self._polylines)
+                if polyline.tree is not None
+            ],
+            dtype=np.intp
+        )
 
-            tree = p.tree
+        if not ids.size:
+            self._broad_phase = None
+            self._broad_phase_ids = ids
+            return
+
+        vmin, vmax = self._root_boxes(ids)
+        order = np.argsort(morton_codes((vmin + vmax) / 2), kind='stable')
 
-            job: Deque[TreeNode] = deque()
-            job.appendleft(tree)
+        self._broad_phase_ids = ids[order]
+        self._broad_phase = BVH.from_boxes(vmin[order], vmax[order])
 
-            while job:
-                tree = job.pop()
+    def _place_in_broad_phase(self, index: int):
+        tree = self._polylines[index].tree
+        broad_phase = self._broad_phase
+        if broad_phase is None or tree is None:
+            self.update_broad_phase()
+            return
 
-                if not tree.check_intersection(v1, v2):
-                    continue
-                elif debug:
-                    tree.draw(self._screen, (0, 0, 255))
+        ids = self._broad_phase_ids
+        vmin, vmax = tree.vmin[tree.root], tree.vmax[tree.root]
+        leaf = np.flatnonzero(ids == index)
+        if leaf.size:
+            broad_phase.refit_leaf(int(leaf[0]), vmin, vmax)
+            return
 
-                if tree.right:
-                    job.appendleft(tree.right)
+        leaves = broad_phase.leaves
+        boxes_min = np.vstack((broad_phase.vmin[:leaves], vmin))
+        boxes_max = np.vstack((broad_phase.vmax[:leaves], vmax))
+        ids = np.append(ids, index)
+        order = np.argsort(
+            morton_codes((boxes_min + boxes_max) / 2), kind='stable'
+        )
 
-                if tree.left:
-                    job.appendleft(tree.left)
+        self._broad_phase_ids = ids[order]
+        self._broad_phase = BVH.from_boxes(boxes_min[order], boxes_max[order])
 
-                if tree.right is None and tree.left is None:
-                    return True
+    def refit_broad_phase(self):
+        ids = self._broad_phase_ids
+        if self._broad_phase is None or any(
+            self._polylines[index].tree is None for index in ids.tolist()
+        ):
+            self.update_broad_phase()
+            return
 
-        return False
+        self._broad_phase.refit(*self._root_boxes(ids))
 
     def push_vertex(self, pos: Tuple[float, float], distance: float) -> None:
         last_polyline: PolyLine = self._polylines[-1]
@@ -269,220 +322,266 @@ class PolylinesField:
             index = self._vertex_field.push_vertex(*pos)
             last_polyline.indexes.append(index)
             self._indexes.add(index)
+            self.version += 1
+            if self._drawing:
+                self.stroke_segments()
         return None
 
+    def stroke_segments(self) -> SegmentGrid:
+        stroke = self._stroke
+        indexes = self._polylines[-1].indexes
+        if (
+            self._stroke_version != self.geometry_version or
+            len(stroke) >= len(indexes)
+        ):
+            stroke.clear()
+            self._stroke_version = self.geometry_version
+
+        if len(stroke) < len(indexes) - 1:
+            vertexes = self._vertex_field.get_vertexes_by_mask(
+                indexes[len(stroke):]
+            ).tolist()
+            for a, b in zip(vertexes[:-1], vertexes[1:]):
+                stroke.append(a, b)
+        return stroke
+
     def pop(self):
         last_polyline: PolyLine = self._polylines[-1]
-        indexes_to_remove: List[int] = last_polyline.indexes
+        indexes_to_remove: List[int] = last_polyline.indexes[
+            1:None if self._drawing else -1
+        ]
         self._polylines.pop()
-        self._vertex_field.delete_vertexes(indexes_to_remove[1:])
-
-    def get_polyline(self, index):
-        return self._polylines[index]
-
-    def build_tree(self, index: int):
-        if not self._polylines or not (-1 <= index <= len(self._polylines)):
-            return
+        self._vertex_field.delete_vertexes(indexes_to_remove)
+        self._drawing = False
+        self._stroke.clear()
+        self.version += 1
+        if last_polyline.tree is not None:
+            self.update_broad_phase()
+
+    def _shortcuts(self, index: int, points: npt.NDArray) -> npt.NDArray:
+        segments = segments_from_vertexes(points)
+        ends = segments.copy()
+        ends[0, 0] += (ends[0, 1] - ends[0, 0]) * 1e-6
+        ends[-1, 1] += (ends[-1, 0] - ends[-1, 1]) * 1e-6
+
+        hits, owners = self.crossing_polylines(ends[:, 0], ends[:, 1])
+        blocked = np.zeros(segments.shape[0], bool)
+        blocked[hits[owners != index % len(self._polylines)]] = True
+
+        crossing = segments_intersect(ends, ends)
+        numbers = np.arange(segments.shape[0])
+        crossing &= np.abs(numbers[:, None] - numbers[None, :]) > 1
+        blocked |= crossing.any(axis=1)
+
+        polyline = self._polylines[index]
+        nodes = [
+            vertex for vertex in self._nodes_field.vertexes_indexes.tolist()
+            if vertex not in (polyline.indexes[0], polyline.indexes[-1])
+        ]
+        if nodes:
+            centers = self._vertex_field.get_vertexes_by_mask(nodes)
+            distances = point_segment_distances(
+                centers[:, None], segments[:, 0], segments[:, 1]
+            )
+            blocked |= (distances < DOTS_RADIUS).any(axis=0)
+        return blocked
 
-        polyline: PolyLine = self._polylines[index]
-        mask: List[int] = polyline.indexes
-        vertexes: npt.NDArray = self._vertex_field.get_vertexes_by_mask(mask)
-        vertex_pairs = np.squeeze(
-            sliding_window_view(vertexes, window_shape=(2, 2))
+    def simplify_polyline(
+        self,
+        index: int,
+        tolerance: float,
+        step: float
+    ) -> int:
+        polyline = self._polylines[index]
+        indexes = polyline.indexes
+        if len(indexes) < 4:
+            return 0
+
+        points = self._vertex_field.get_vertexes_by_mask(indexes)
+        middle = len(indexes) // 2
+        keep = np.zeros(len(indexes), bool)
+        keep[:middle + 1] |= simplify_mask(points[:middle + 1], tolerance)
+        keep[middle:] |= simplify_mask(points[middle:], tolerance)
+
+        while True:
+            kept = np.flatnonzero(keep)
+            blocked = np.flatnonzero(
+                self._shortcuts(index, points[kept]) &
+                (np.diff(kept) > 1)
+            )
+            if not blocked.size:
+                break
+            for segment in blocked.tolist():
+                start, stop = kept[segment], kept[segment + 1]
+                distances = point_segment_distances(
+                    points[start + 1:stop], points[start], points[stop]
+                )
+                keep[start + 1 + int(np.argmax(distances))] = True
+
+        kept = np.flatnonzero(keep)
+        lengths = np.hypot(*np.diff(points[kept], axis=0).T)
+        pieces = np.maximum(np.ceil(lengths / step), 1).astype(int)
+        halves = int(np.searchsorted(kept, middle))
+        left, right = pieces[:halves], pieces[halves:]
+        subdivide(right, lengths[halves:], left.sum() - right.sum())
+        subdivide(left, lengths[:halves], right.sum() - left.sum())
+
+        removed = [indexes[number] for number in np.flatnonzero(~keep)]
+        if not removed and pieces.sum() == len(kept) - 1:
+            return 0
+        self._vertex_field.delete_vertexes(removed)
+
+        def resample(numbers: range) -> List[int]:
+            resampled: List[int] = []
+            for number in numbers:
+                start, stop = points[kept[number]], points[kept[number + 1]]
+                count = int(pieces[number])
+                resampled.append(indexes[kept[number]])
+                for piece in range(1, count):
+                    x, y = start + (stop - start) * piece / count
+                    resampled.append(self._vertex_field.push_vertex(x, y))
+            return resampled
+
+        simplified = (
+            resample(range(halves)) +
+            resample(range(halves, len(pieces))) +
+            [indexes[kept[-1]]]
         )
 
-        job_a: Deque[TreeNode] = deque()
-        job_b: Deque[TreeNode] = deque()
-
-        for vertex_pair in vertex_pairs:
-            xs, ys = np.hsplit(vertex_pair, 2)
-
-            x_max: float = np.max(xs)
-            y_max: float = np.max(ys)
-            x_min: float = np.min(xs)
-            y_min: float = np.min(ys)
-
-            if np.abs(x_max - x_min) < 5:
-                x_max += 2.5
-                x_min -= 2.5
-
-            if np.abs(y_max - y_min) < 5:
-                y_max += 2.5
-                y_min -= 2.5
-
-            vmax = (x_max, y_max)
-            vmin = (x_min, y_min)
-
-            job_a.appendleft(TreeNode(vmin, vmax))
+        self._indexes.difference_update(removed)
+        self._indexes.update(simplified)
+        polyline.indexes = simplified
+        self.version += 1
+        self.invalidate()
+        return len(indexes) - len(simplified)
 
-        while len(job_a) > 1:
+    def load(
+        self,
+        polylines: Sequence[Sequence[int]],
+        drawing: bool,
+        trees: Optional[Sequence[Optional[BVH]]] = None,
+        broad_phase: Optional[Tuple[BVH, npt.NDArray]] = None
+    ):
+        self._polylines = [PolyLine(list(indexes)) for indexes in polylines]
+        self._indexes = {
+            index for polyline in self._polylines for index in polyline.indexes
+        }
+        self._drawing = drawing and bool(self._polylines)
+        self._stroke.clear()
+
+        if trees is not None:
+            for polyline, tree in zip(self._polylines, trees):
+                polyline.tree = tree
+        else:
+            finished = len(self._polylines) - int(self._drawing)
+            for index in range(finished):
+                self._build_tree(index)
+
+        if broad_phase is not None:
+            self._broad_phase, self._broad_phase_ids = broad_phase
+        else:
+            self.update_broad_phase()
+        self.version += 1
+        self.invalidate()
 
-            last_tree: Optional[TreeNode] = None
+    @property
+    def broad_phase(self) -> Tuple[Optional[BVH], npt.NDArray]:
+        return self._broad_phase, self._broad_phase_ids
 
-            while len(job_a) > 1:
-                tree_right = job_a.pop()
-                tree_left = job_a.pop()
+    def packed_indexes(self) -> Tuple[npt.NDArray, npt.NDArray]:
+        return pack_indexes([p.indexes for p in self._polylines])
 
-                vmax, vmin = TreeNode.combine_nodes(tree_left, tree_right)
+    def get_polyline(self, index):
+        return self._polylines[index]
 
-                last_tree = TreeNode(vmin, vmax, tree_right, tree_left)
+    def _build_tree(self, index: int):
+        polyline: PolyLine = self._polylines[index]
+        mask: List[int] = polyline.indexes
+        vertexes: npt.NDArray = self._vertex_field.get_vertexes_by_mask(mask)
+        segments = segments_from_vertexes(vertexes)
 
-                job_b.appendleft(last_tree)
+        if not segments.shape[0]:
+            polyline.tree = None
+            return
 
-            if job_a:
-                job_b.appendleft(job_a.pop())
+        polyline.tree = BVH.from_segments(segments)
 
-            job_a = job_b
-            job_b = deque()
+    def build_tree(self, index: int):
+        if index < 0:
+            index += len(self._polylines)
+        if not 0 <= index < len(self._polylines):
+            return
 
-        polyline.tree = job_a.pop()
+        self._build_tree(index)
+        self._place_in_broad_phase(index)
 
     def rebuild_trees(self):
         for index in range(len(self._polylines)):
-            self.build_tree(index)
-
-    def draw(self, debug: bool = False):
-
-        colors: List[Tuple[int, int, int]] = [
-            (70, 200, 70),
-            (30, 150, 20)
-        ]
-
-        for polyline in self._polylines:
-            if len(polyline.indexes) < 2:
-                continue
-
-            previous_index: int = polyline.indexes[0]
-
-            counter: int = 0
-
-            for index in polyline.indexes[1:]:
-                previous_vertex = self._vertex_field.get_vertex(previous_index)
-                vertex = self._vertex_field.get_vertex(index)
-
-                if (previous_vertex is not None) and (vertex is not None):
-                    pg.draw.line(
-                        self._screen,
-                        colors[counter % 2],
-                        previous_vertex,
-                        vertex,
-                        3
-                    )
-                counter += 1
-                previous_index = index
-
-            if not debug or polyline.tree is None:
-                continue
-
-            job: Deque[TreeNode] = deque()
-            job.appendleft(polyline.tree)
-
-            while job:
-                tree = job.pop()
-
-                tree.draw(self._screen)
-
-                if tree.right:
-                    job.appendleft(tree.right)
-
-                if tree.left:
-                    job.appendleft(tree.left)
-
-    def force_update(self, power: float, ms: int):
-        indexes_set: Set[int] = set(self._vertex_field.indexes)
-        for p in self._polylines:
-            polyline_indexes_set: Set[int] = set(p.indexes)
-            indexes_set: Set[int] = set(self._vertex_field.indexes)
-            nodes_indexes = self._nodes_field.get_indexes_by_degree([0])
-            nodes_indexes_set = set(nodes_indexes)
-            other_indexes_set = (
-                indexes_set -
-                polyline_indexes_set -
-                nodes_indexes_set
-            )
-            other_indexes = list(other_indexes_set)
-            nodes_vertexes = self._vertex_field._vertexes[nodes_indexes]
-
-            v_update = self._vertex_field._vertexes
-            f_vertexes = self._vertex_field.get_vertexes_by_mask(other_indexes)
-
-            for i, index in enumerate(p.indexes):
-                xs, ys = np.hsplit(f_vertexes, 2)
-
-                dx = -xs + v_update[index][0]
-                dy = -ys + v_update[index][1]
-
-                length = np.power(np.power(dx, 2) + np.power(dy, 2), 2)
+            self._build_tree(index)
+        self.update_broad_phase()
+        self.invalidate()
 
-                repulsive_forcex = dx * 50 / length
-                repulsive_forcey = dy * 50 / length
+    def refit_tree(self, index: int):
+        polyline: PolyLine = self._polylines[index]
+        if polyline.tree is None:
+            return
 
-                repulsive_force_vectors = np.concatenate(
-                    [repulsive_forcex, repulsive_forcey],
-                    axis=1
-                )
+        vertexes = self._vertex_field.get_vertexes_by_mask(polyline.indexes)
+        segments = segments_from_vertexes(vertexes)
 
-                xs, ys = np.hsplit(nodes_vertexes, 2)
+        if segments.shape[0] != polyline.tree.leaves:
+            self._build_tree(index)
+            return
 
-                dx = -xs + v_update[index][0]
-                dy = -ys + v_update[index][1]
+        polyline.tree.refit_segments(segments)
 
-                length = np.power(np.power(dx, 2) + np.power(dy, 2), 2)
+    def refit_trees(self):
+        for index in range(len(self._polylines)):
+            self.refit_tree(index)
+        self.refit_broad_phase()
 
-                nodes_repulsive_forcex = dx * 2000 / length
-                nodes_repulsive_forcey = dy * 2000 / length
+    @property
+    def drawing(self) -> bool:
+        return self._drawing
 
-                nodes_repulsive_force_vectors = np.concatenate(
-                    [nodes_repulsive_forcex, nodes_repulsive_forcey],
-                    axis=1
-                )
+    @property
+    def polylines(self) -> List[PolyLine]:
+        return self._polylines
+
+    def invalidate(self):
+        self.geometry_version += 1
+
+    def relaxation_inputs(
+        self
+    ) -> Tuple[npt.NDArray, npt.NDArray, npt.NDArray, npt.NDArray]:
+        packed, offsets = self.packed_indexes()
+        free_nodes = np.asarray(
+            self._nodes_field.get_indexes_by_degree([0]), dtype=np.intp
+        )
+        sources = sources_for(self._vertex_field.indexes, free_nodes)
+        return packed, offsets, sources, free_nodes
 
-                repulsive_force_vectors = np.concatenate(
-                    [
-                        repulsive_force_vectors,
-                        nodes_repulsive_force_vectors
-                    ],
-                    axis=0
-                )
+    def moved(self):
+        self.refit_trees()
+        self._nodes_field.invalidate_positions()
+        self.invalidate()
 
-                if i - 1 > 0:
-                    prev_index = p.indexes[i - 1]
-                    prev_neighbour = self._vertex_field.get_vertex(prev_index)
-                    if prev_neighbour:
-                        force_v = v_update[index] - prev_neighbour
-                        dx = prev_neighbour[0] - v_update[index][0]
-                        dy = prev_neighbour[1] - v_update[index][1]
-                        length = np.sqrt(np.power(dx, 2) + np.power(dy, 2))
-                        grav_force = -0.002 * force_v * abs(5-length)
-                        repulsive_force_vectors = np.concatenate(
-                            [
-                                repulsive_force_vectors,
-                                [grav_force]
-                            ],
-                            axis=0
-                        )
-
-                if i + 1 < len(p.indexes):
-                    next_index = p.indexes[i + 1]
-                    next_neighbour = self._vertex_field.get_vertex(next_index)
-                    if next_neighbour:
-                        force_v = v_update[index] - next_neighbour
-                        dx = next_neighbour[0] - v_update[index][0]
-                        dy = next_neighbour[1] - v_update[index][1]
-                        length = np.sqrt(np.power(dx, 2) + np.power(dy, 2))
-                        grav_force = -0.002 * force_v * abs(5-length)
-
-                        repulsive_force_vectors = np.concatenate(
-                            [
-                                repulsive_force_vectors,
-                                [grav_force],
-                            ],
-                            axis=0
-                        )
-
-                repulsive_force_vector = np.sum(
-                    repulsive_force_vectors,
-                    axis=0
-                )
+    def force_update(
+        self,
+        power: float,
+        ms: int,
+        cutoff: Optional[float] = None
+    ):
+        packed, offsets, sources, free_nodes = self.relaxation_inputs()
+
+        relax(
+            self._vertex_field._vertexes,
+            packed,
+            offsets,
+            sources,
+            free_nodes,
+            ms * power,
+            cutoff
+        )
 
-                v_update[index] += ms * power * repulsive_force_vector
+        self.moved()
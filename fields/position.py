@@ -0,0 +1,198 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+
+from .board import Board
+from .faces import MAX_DEGREE
+
+PARTITION_LIMIT = 5
+
+Boundary = Tuple[int, ...]
+Region = Tuple[Boundary, ...]
+Position = Tuple[Tuple[int, ...], Tuple[Region, ...]]
+
+
+@dataclass(frozen=True)
+class AbstractMove:
+    region: int
+    boundary: int
+    corner: int
+    other_boundary: int
+    other_corner: int
+    inside: int = 0
+
+
+def position_from_board(board: Board) -> Position:
+    faces = board.faces
+    faces.sync()
+    lives = tuple(
+        MAX_DEGREE - int(degree) for degree in board.nodes_field.degrees
+    )
+    regions = tuple(
+        tuple(tuple(boundary) for boundary in faces.boundaries(face_id))
+        for face_id in sorted(faces.movable)
+    )
+    return lives, regions
+
+
+def _usable(lives: Sequence[int], region: Sequence[Boundary]) -> int:
+    nodes = {node for boundary in region for node in boundary}
+    return sum(min(lives[node], 2) for node in nodes)
+
+
+def _smallest_rotation(values: Boundary) -> Tuple[Boundary, int]:
+    rotations = [
+        (values[shift:] + values[:shift], shift)
+        for shift in range(len(values))
+    ]
+    return min(rotations)
+
+
+def canonical(lives: Sequence[int], regions: Sequence[Region]) -> Position:
+    pruned: List[List[Tuple[Boundary, Boundary]]] = []
+    for region in regions:
+        boundaries = [
+            tuple(node for node in boundary if lives[node] > 0)
+            for boundary in region
+        ]
+        boundaries = [boundary for boundary in boundaries if boundary]
+        if _usable(lives, boundaries) < 2:
+            continue
+
+        rotated: List[Tuple[Boundary, Boundary]] = []
+        for boundary in boundaries:
+            signature, shift = _smallest_rotation(
+                tuple(lives[node] for node in boundary)
+            )
+            rotated.append((signature, boundary[shift:] + boundary[:shift]))
+        rotated.sort(key=lambda item: item[0])
+        pruned.append(rotated)
+    pruned.sort(key=lambda region: [signature for signature, _ in region])
+
+    labels: Dict[int, int] = {}
+    for region in pruned:
+        for _, boundary in region:
+            for node in boundary:
+                labels.setdefault(node, len(labels))
+
+    relabelled = [0] * len(labels)
+    for node, label in labels.items():
+        relabelled[label] = lives[node]
+    return tuple(relabelled), tuple(
+        tuple(
+            tuple(labels[node] for node in boundary)
+            for _, boundary in region
+        )
+        for region in pruned
+    )
+
+
+def is_terminal(position: Position) -> bool:
+    return not position[1]
+
+
+def _isolated(lives: Sequence[int], boundary: Boundary) -> bool:
+    return len(boundary) == 1 and lives[boundary[0]] == MAX_DEGREE
+
+
+def _partitions(others: int) -> List[int]:
+    if others <= PARTITION_LIMIT:
+        return list(range(1 << others))
+    every = (1 << others) - 1
+    return [0, every] + [
+        mask for bit in range(others) for mask in (1 << bit, every ^ 1 << bit)
+    ]
+
+
+def abstract_moves(position: Position) -> List[AbstractMove]:
+    lives, regions = position
+    moves: List[AbstractMove] = []
+    for number, region in enumerate(regions):
+        partitions = _partitions(len(region) - 1)
+        for first, boundary in enumerate(region):
+            for corner, start in enumerate(boundary):
+                if not lives[start]:
+                    continue
+
+                for other_corner in range(corner, len(boundary)):
+                    end = boundary[other_corner]
+                    if lives[end] < (2 if start == end else 1):
+                        continue
+                    moves.extend(
+                        AbstractMove(
+                            number, first, corner, first, other_corner, inside
+                        )
+                        for inside in partitions
+                    )
+
+                for second in range(first + 1, len(region)):
+                    moves.extend(
+                        AbstractMove(number, first, corner, second, other)
+                        for other, end in enumerate(region[second])
+                        if lives[end]
+                    )
+    return moves
+
+
+def move_nodes(position: Position, move: AbstractMove) -> Tuple[int, int]:
+    region = position[1][move.region]
+    return (
+        region[move.boundary][move.corner],
+        region[move.other_boundary][move.other_corner]
+    )
+
+
+def play(position: Position, move: AbstractMove) -> Position:
+    lives, regions = position
+    region = regions[move.region]
+    boundary = region[move.boundary]
+    start, end = move_nodes(position, move)
+    middle = len(lives)
+
+    rotated = boundary[move.corner:] + boundary[:move.corner]
+    isolated = _isolated(lives, boundary)
+    if move.boundary == move.other_boundary:
+        corner = (move.other_corner - move.corner) % len(boundary)
+        if isolated:
+            inner: Boundary = (start, middle)
+            outer: Boundary = (start, middle)
+        else:
+            inner = rotated[:corner + 1] + (middle,)
+            outer = rotated[corner:] + (start, middle)
+
+        others = [
+            other for number, other in enumerate(region)
+            if number != move.boundary
+        ]
+        inside = tuple(
+            other for number, other in enumerate(others)
+            if move.inside >> number & 1
+        )
+        outside = tuple(
+            other for number, other in enumerate(others)
+            if not move.inside >> number & 1
+        )
+        replaced: Tuple[Region, ...] = ((inner,) + inside, (outer,) + outside)
+    else:
+        other = region[move.other_boundary]
+        other_rotated = (
+            other[move.other_corner:] + other[:move.other_corner]
+        )
+        merged = (
+            ((start,) if isolated else rotated + (start,)) +
+            (middle,) +
+            ((end,) if _isolated(lives, other) else other_rotated + (end,)) +
+            (middle,)
+        )
+        replaced = ((merged,) + tuple(
+            boundary for number, boundary in enumerate(region)
+            if number not in (move.boundary, move.other_boundary)
+        ),)
+
+    changed = list(lives) + [1]
+    changed[start] -= 1
+    changed[end] -= 1
+    return canonical(
+        changed,
+        regions[:move.region] + replaced + regions[move.region + 1:]
+    )
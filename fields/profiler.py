@@ -0,0 +1,104 @@
+from __future__ import annotations
+import json
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from typing import Any, ContextManager, Deque, Dict, Iterator, List, Optional
+
+
+class FrameProfiler:
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        window: int = 120,
+        output: Optional[str] = None
+    ) -> None:
+        self.enabled: bool = enabled
+        self._frames: Deque[Dict[str, Any]] = deque(maxlen=window)
+        self._phases: Dict[str, float] = {}
+        self._counters: Dict[str, int] = {}
+        self._frame: int = 0
+        self._started: float = 0.0
+        self._output = open(output, 'w') if enabled and output else None
+
+    def begin_frame(self) -> None:
+        if not self.enabled:
+            return
+        self._phases = {}
+        self._counters = {}
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def _measure(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._phases[name] = (
+                self._phases.get(name, 0.0) + time.perf_counter() - start
+            )
+
+    def phase(self, name: str) -> ContextManager[None]:
+        if not self.enabled:
+            return nullcontext()
+        return self._measure(name)
+
+    def count(self, name: str, value: int) -> None:
+        if self.enabled:
+            self._counters[name] = self._counters.get(name, 0) + int(value)
+
+    def end_frame(self) -> None:
+        if not self.enabled:
+            return
+
+        record = {
+            'frame': self._frame,
+            'total': time.perf_counter() - self._started,
+            'phases': self._phases,
+            'counters': self._counters,
+        }
+        self._frames.append(record)
+        self._frame += 1
+
+        if self._output is not None:
+            self._output.write(json.dumps(record) + '\n')
+
+    def averages(self) -> Dict[str, float]:
+        if not self._frames:
+            return {}
+
+        totals: Dict[str, float] = {}
+        for record in self._frames:
+            for name, value in record['phases'].items():
+                totals[name] = totals.get(name, 0.0) + value
+            totals['total'] = totals.get('total', 0.0) + record['total']
+        return {
+            name: value / len(self._frames) for name, value in totals.items()
+        }
+
+    def lines(self) -> List[str]:
+        if not self._frames:
+            return []
+
+        averages = self.averages()
+        lines = [
+            f'frame {averages.pop("total") * 1e3:7.2f} ms '
+            f'({len(self._frames)} frame avg)'
+        ]
+        lines += [
+            f'{name:>18} {value * 1e3:7.2f} ms'
+            for name, value in sorted(
+                averages.items(), key=lambda item: -item[1]
+            )
+        ]
+        lines += [
+            f'{name:>18} {value:7d}'
+            for name, value in self._frames[-1]['counters'].items()
+        ]
+        return lines
+
+    def close(self) -> None:
+        if self._output is not None:
+            self._output.close()
+            self._output = None
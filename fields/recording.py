@@ -0,0 +1,115 @@
+from __future__ import annotations
+import json
+import os
+import numpy as np
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional, Tuple, Union
+
+RECORDING_VERSION = 1
+
+EVENT_QUIT = 0
+EVENT_BUTTON_DOWN = 1
+EVENT_BUTTON_UP = 2
+EVENT_OTHER = 3
+
+
+@dataclass
+class FrameInput:
+    pos: Tuple[float, float]
+    buttons: Tuple[bool, bool, bool] = (False, False, False)
+    events: List[Tuple[int, int]] = field(default_factory=lambda: [])
+    ms: int = 0
+    relax_steps: int = 0
+
+
+@dataclass
+class RecordingHeader:
+    seed: int
+    size: Tuple[float, float]
+    nodes: int
+    radius: int
+    step_ms: int
+    power: float
+    cutoff: Optional[float] = None
+    simplify_tolerance: Optional[float] = None
+    adaptive: bool = False
+    version: int = RECORDING_VERSION
+
+
+class Recording:
+
+    def __init__(self, header: RecordingHeader) -> None:
+        self.header: RecordingHeader = header
+        self.frames: List[FrameInput] = []
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def append(self, frame: FrameInput) -> None:
+        self.frames.append(frame)
+
+    def save(self, path: Union[str, os.PathLike]) -> None:
+        frames = self.frames
+        buttons = np.array(
+            [
+                int(left) | int(middle) << 1 | int(right) << 2
+                for left, middle, right in (frame.buttons for frame in frames)
+            ],
+            dtype=np.uint8
+        )
+        events = np.array(
+            [
+                (number, kind, button)
+                for number, frame in enumerate(frames)
+                for kind, button in frame.events
+            ],
+            dtype=np.int32
+        ).reshape(-1, 3)
+
+        with open(path, 'wb') as output:
+            np.savez_compressed(
+                output,
+                header=np.array(json.dumps(asdict(self.header))),
+                pos=np.array(
+                    [frame.pos for frame in frames], dtype=float
+                ).reshape(-1, 2),
+                buttons=buttons,
+                ms=np.array([frame.ms for frame in frames], dtype=np.int32),
+                relax_steps=np.array(
+                    [frame.relax_steps for frame in frames], dtype=np.int32
+                ),
+                events=events,
+            )
+
+    @classmethod
+    def load(cls, path: Union[str, os.PathLike]) -> Recording:
+        with np.load(path) as data:
+            header = json.loads(str(data['header']))
+            if header.get('version') != RECORDING_VERSION:
+                raise ValueError(
+                    f'unsupported recording version {header.get("version")}'
+                )
+            header['size'] = tuple(header['size'])
+            recording = cls(RecordingHeader(**header))
+
+            events: List[List[Tuple[int, int]]] = [
+                [] for _ in range(data['pos'].shape[0])
+            ]
+            for number, kind, button in data['events'].tolist():
+                events[number].append((kind, button))
+
+            for pos, buttons, ms, steps, frame_events in zip(
+                data['pos'].tolist(),
+                data['buttons'].tolist(),
+                data['ms'].tolist(),
+                data['relax_steps'].tolist(),
+                events
+            ):
+                recording.append(FrameInput(
+                    (pos[0], pos[1]),
+                    (bool(buttons & 1), bool(buttons & 2), bool(buttons & 4)),
+                    frame_events,
+                    ms,
+                    steps
+                ))
+        return recording
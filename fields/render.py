@@ -0,0 +1,312 @@
+from __future__ import annotations
+import numpy as np
+import numpy.typing as npt
+import pygame as pg
+from typing import Any, Dict, List, Optional, Tuple
+
+from .bvh import BVH
+from .camera import Camera
+from .nodes import DOTS_RADIUS, NodesField
+from .polylines import PolyLine, PolylinesField
+from .profiler import FrameProfiler
+from .vertexes import VertexField
+
+BACKGROUND_COLOR = (255, 255, 255)
+POLYLINE_COLORS: List[Tuple[int, int, int]] = [
+    (70, 200, 70),
+    (30, 150, 20)
+]
+POLYLINE_WIDTH = 3
+CULL_MARGIN = 8
+
+LOD_ZOOM = 0.5
+LOD_PIXELS = 2
+LABEL_ZOOM = 0.75
+
+NODE_NORMAL = 0
+NODE_SELECTED = 1
+NODE_SATURATED = 2
+
+NODE_COLORS: Dict[int, Tuple[int, int, int]] = {
+    NODE_NORMAL: (0, 0, 0),
+    NODE_SELECTED: (255, 0, 0),
+    NODE_SATURATED: (100, 100, 100),
+}
+LABEL_COLOR = (255, 255, 255)
+
+OVERLAY_COLOR = (0, 0, 0)
+OVERLAY_BACKGROUND = (255, 255, 255, 200)
+
+
+class PolylinesRenderer:
+
+    def __init__(self,
+                 screen: pg.Surface,
+                 vertex_field: VertexField,
+                 polyline_field: PolylinesField,
+                 camera: Optional[Camera] = None) -> None:
+        self._screen = screen
+        self._vertex_field: VertexField = vertex_field
+        self._polyline_field: PolylinesField = polyline_field
+        self._camera: Camera = camera or Camera(screen.get_size())
+        self._layer: Optional[pg.Surface] = None
+        self._layer_version: Tuple[int, int] = (-1, -1)
+        self._dirty: List[pg.Rect] = []
+
+    def mark_dirty(self, rect: Optional[pg.Rect]):
+        if rect is not None:
+            self._dirty.append(pg.Rect(rect))
+
+    @property
+    def _width(self) -> int:
+        return max(1, round(POLYLINE_WIDTH * self._camera.zoom))
+
+    def _draw_runs(
+        self,
+        surface: pg.Surface,
+        runs: List[Tuple[List[int], int]]
+    ) -> Optional[pg.Rect]:
+        runs = [run for run in runs if len(run[0]) > 1]
+        if not runs:
+            return None
+
+        camera = self._camera
+        offsets = np.zeros(len(runs) + 1, dtype=np.intp)
+        np.cumsum([len(indexes) for indexes, _ in runs], out=offsets[1:])
+        points = camera.to_screen(self._vertex_field.get_vertexes_by_mask(
+            [index for indexes, _ in runs for index in indexes]
+        ))
+        width = self._width
+
+        lod = camera.zoom < LOD_ZOOM
+        if lod:
+            cells = np.floor(points / LOD_PIXELS)
+            keep = np.ones(points.shape[0], dtype=bool)
+            keep[1:] = np.any(cells[1:] != cells[:-1], axis=1)
+            keep[offsets[:-1]] = True
+            keep[offsets[1:] - 1] = True
+            offsets[1:] = np.cumsum(keep)[offsets[1:] - 1]
+            points = points[keep]
+
+        points = points.tolist()
+        rects = []
+        for (_, first), start, stop in zip(
+            runs, offsets[:-1].tolist(), offsets[1:].tolist()
+        ):
+            run = points[start:stop]
+            if len(run) < 2:
+                continue
+            rects.append(pg.draw.lines(
+                surface, POLYLINE_COLORS[0], False, run, width
+            ))
+            if lod:
+                continue
+            odd = (first + 1) % 2
+            for a, b in zip(run[odd::2], run[odd + 1::2]):
+                pg.draw.line(surface, POLYLINE_COLORS[1], a, b, width)
+        return rects[0].unionall(rects[1:]) if rects else None
+
+    def _draw_polyline(self, surface: pg.Surface, polyline: PolyLine):
+        return self._draw_runs(surface, [(polyline.indexes, 0)])
+
+    def _render_layer(self):
+        size = self._screen.get_size()
+        if self._layer is None or self._layer.get_size() != size:
+            self._layer = pg.Surface(size).convert(self._screen)
+
+        field = self._polyline_field
+        camera = self._camera
+        self._layer.fill(BACKGROUND_COLOR)
+        drawing = field.polylines[-1] if field.drawing else None
+        vmin, vmax = camera.visible(CULL_MARGIN / camera.zoom)
+
+        runs: List[Tuple[List[int], int]] = []
+        for polyline, segments in field.visible_segments(vmin, vmax):
+            if polyline is drawing:
+                continue
+            if segments.size == segments[-1] - segments[0] + 1:
+                first, last = int(segments[0]), int(segments[-1])
+                runs.append((polyline.indexes[first:last + 2], first))
+                continue
+            breaks = np.flatnonzero(np.diff(segments) > 1) + 1
+            for run in np.split(segments, breaks):
+                first, last = int(run[0]), int(run[-1])
+                runs.append((polyline.indexes[first:last + 2], first))
+        self._draw_runs(self._layer, runs)
+        self._layer_version = (field.geometry_version, camera.version)
+
+    def draw(self, debug: bool = False) -> List[pg.Rect]:
+        field = self._polyline_field
+        if (
+            self._layer is None or
+            self._layer_version != (
+                field.geometry_version, self._camera.version
+            ) or
+            debug
+        ):
+            self._render_layer()
+            self._dirty = [self._screen.get_rect()]
+
+        dirty = self._dirty
+        for rect in dirty:
+            self._screen.blit(self._layer, rect, rect)
+
+        self._dirty = []
+        if field.drawing:
+            rect = self._draw_polyline(self._screen, field.polylines[-1])
+            if rect is not None:
+                rect = rect.inflate(self._width, self._width)
+                self._dirty.append(rect)
+                dirty = dirty + [rect]
+
+        if debug:
+            for polyline in field.polylines:
+                if polyline.tree is not None:
+                    self.draw_tree(polyline.tree)
+
+        return dirty
+
+    def draw_tree(
+        self,
+        tree: BVH,
+        nodes: Optional[npt.NDArray] = None,
+        color: Tuple[int, int, int] = (0, 0, 0)
+    ):
+        if nodes is None:
+            nodes = np.arange(tree.vmin.shape[0])
+
+        corners = self._camera.to_screen(tree.vmin[nodes])
+        sizes = (tree.vmax[nodes] - tree.vmin[nodes]) * self._camera.zoom
+        for (x, y), (w, h) in zip(corners.tolist(), sizes.tolist()):
+            pg.draw.rect(self._screen, color, (x, y, w, h), 1)
+
+    def draw_visited(self, visited: List[Tuple[BVH, npt.NDArray]]):
+        for tree, nodes in visited:
+            self.draw_tree(tree, nodes, (0, 0, 255))
+
+
+class NodesRenderer:
+
+    def __init__(self,
+                 screen: pg.Surface,
+                 vertex_field: VertexField,
+                 nodes_field: NodesField,
+                 camera: Optional[Camera] = None) -> None:
+        if not pg.font.get_init():
+            pg.font.init()
+        self._font = pg.font.SysFont('arial', 10)
+        self._screen = screen
+        self._vertex_field: VertexField = vertex_field
+        self._nodes_field: NodesField = nodes_field
+        self._camera: Camera = camera or Camera(screen.get_size())
+        self._style: Tuple[int, bool] = (DOTS_RADIUS, True)
+        self._count: int = 0
+        self._drawn: Dict[int, Tuple[Any, ...]] = {}
+        self._labels: Dict[int, pg.Surface] = {}
+        self._sprites: Dict[Tuple[int, int], pg.Surface] = {}
+
+    def evict(self, index: int) -> None:
+        self._labels.pop(index, None)
+        self._drawn.pop(index, None)
+        for state in NODE_COLORS:
+            self._sprites.pop((index, state), None)
+
+    def label(self, index: int) -> pg.Surface:
+        label = self._labels.get(index)
+        if label is None:
+            label = self._font.render(str(index), False, LABEL_COLOR)
+            self._labels[index] = label
+        return label
+
+    def sprite(self, index: int, state: int) -> pg.Surface:
+        sprite = self._sprites.get((index, state))
+        if sprite is None:
+            radius, labelled = self._style
+            sprite = pg.Surface((2 * radius, 2 * radius), pg.SRCALPHA)
+            pg.draw.circle(
+                sprite, NODE_COLORS[state], (radius, radius), radius
+            )
+            if labelled:
+                label = self.label(index)
+                sprite.blit(label, label.get_rect(center=(radius, radius)))
+            self._sprites[(index, state)] = sprite
+        return sprite
+
+    def draw(self, select: int) -> List[pg.Rect]:
+        nodes_field = self._nodes_field
+        blits: List[Tuple[pg.Surface, List[float]]] = []
+        states: List[Tuple[int, Tuple[int, float, float]]] = []
+
+        count = len(nodes_field)
+        for index in range(count, self._count):
+            self.evict(index)
+        self._count = count
+
+        camera = self._camera
+        radius = max(1, round(DOTS_RADIUS * camera.zoom))
+        style = (radius, camera.zoom >= LABEL_ZOOM)
+        if style != self._style:
+            self._style = style
+            self._sprites.clear()
+
+        vmin, vmax = camera.visible(DOTS_RADIUS)
+        visible = nodes_field.nodes_in_rect(vmin, vmax)
+        corners = (
+            camera.to_screen(self._vertex_field.get_vertexes_by_mask(
+                nodes_field.vertexes_indexes[visible]
+            )) - radius
+        ).tolist()
+
+        degrees = nodes_field.degrees[visible].tolist()
+        for index, degree, corner in zip(
+            visible.tolist(), degrees, corners
+        ):
+            state = NODE_NORMAL
+            if degree == 3:
+                state = NODE_SATURATED
+            elif index == select:
+                state = NODE_SELECTED
+            blits.append((self.sprite(index, state), corner))
+            states.append((index, (state, *corner)))
+
+        rects = self._screen.blits(blits, doreturn=True) or []
+
+        dirty: List[pg.Rect] = []
+        for (index, state), rect in zip(states, rects):
+            if self._drawn.get(index) != state:
+                self._drawn[index] = state
+                dirty.append(rect)
+        return dirty
+
+
+class ProfilerOverlay:
+
+    def __init__(self, profiler: FrameProfiler) -> None:
+        self._profiler: FrameProfiler = profiler
+        self._font: Optional[pg.font.Font] = None
+
+    def draw(self, screen: pg.Surface) -> Optional[pg.Rect]:
+        if not self._profiler.enabled:
+            return None
+
+        lines = self._profiler.lines()
+        if not lines:
+            return None
+
+        if self._font is None:
+            self._font = pg.font.SysFont('monospace', 12)
+
+        surfaces = [
+            self._font.render(line, True, OVERLAY_COLOR) for line in lines
+        ]
+        width = max(surface.get_width() for surface in surfaces) + 8
+        height = sum(surface.get_height() for surface in surfaces) + 8
+
+        overlay = pg.Surface((width, height), pg.SRCALPHA)
+        overlay.fill(OVERLAY_BACKGROUND)
+        y = 4
+        for surface in surfaces:
+            overlay.blit(surface, (4, y))
+            y += surface.get_height()
+
+        return screen.blit(overlay, (0, 0))
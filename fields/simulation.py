@@ -0,0 +1,478 @@
+from __future__ import annotations
+import threading
+import time
+import numpy as np
+import numpy.typing as npt
+from typing import Optional, Tuple
+
+from .forces import owners, relax, relaxation_forces
+from .geometry import paired_segments_intersect, point_segment_distances
+from .nodes import NodesField
+from .polylines import PolylinesField
+from .vertexes import VertexField
+
+FIXED_STEP_MS = 4
+MAX_DISPLACEMENT = 1.0
+SLEEP_DISPLACEMENT = 0.05
+SLEEP_STEPS = 25
+WAKE_RADIUS = 50.0
+
+
+def crossing_segments(
+    segments: npt.NDArray,
+    ends: npt.NDArray,
+    moved: npt.NDArray
+) -> npt.NDArray:
+    crossing = np.zeros(segments.shape[0], bool)
+    if not moved.size:
+        return crossing
+
+    vmin = segments.min(axis=1)
+    vmax = segments.max(axis=1)
+    order = np.argsort(vmin[:, 0], kind='stable')
+    width = float((vmax[:, 0] - vmin[:, 0]).max())
+    starts = np.searchsorted(
+        vmin[order, 0], vmin[moved, 0] - width, side='left'
+    )
+    counts = np.searchsorted(
+        vmin[order, 0], vmax[moved, 0], side='right'
+    ) - starts
+    shift = np.repeat(np.cumsum(counts) - counts, counts)
+    queries = np.repeat(moved, counts)
+    leaves = order[
+        np.repeat(starts, counts) + np.arange(counts.sum()) - shift
+    ]
+
+    pairs = (queries != leaves) & np.all(
+        (vmin[queries] <= vmax[leaves]) & (vmin[leaves] <= vmax[queries]),
+        axis=1
+    )
+    queries, leaves = queries[pairs], leaves[pairs]
+    shared = np.any(
+        ends[queries][:, :, None] == ends[leaves][:, None, :], axis=(1, 2)
+    )
+    queries, leaves = queries[~shared], leaves[~shared]
+
+    hit = paired_segments_intersect(segments[queries], segments[leaves])
+    crossing[queries[hit]] = True
+    crossing[leaves[hit]] = True
+    return crossing
+
+
+def anchored(
+    packed: npt.NDArray,
+    offsets: npt.NDArray,
+    nodes: npt.NDArray
+) -> npt.NDArray:
+    at_nodes = np.flatnonzero(np.isin(packed, nodes))
+    own = owners(offsets)[at_nodes]
+    before = at_nodes[at_nodes > offsets[own]] - 1
+    after = at_nodes[at_nodes + 1 < offsets[own + 1]] + 1
+    return np.unique(packed[np.concatenate((at_nodes, before, after))])
+
+
+class Integrator:
+
+    def __init__(
+        self,
+        max_step: float,
+        cutoff: Optional[float] = None,
+        max_displacement: float = MAX_DISPLACEMENT,
+        sleep_displacement: float = SLEEP_DISPLACEMENT,
+        sleep_steps: int = SLEEP_STEPS,
+        wake_radius: float = WAKE_RADIUS
+    ) -> None:
+        self.max_step: float = max_step
+        self.cutoff: Optional[float] = cutoff
+        self.max_displacement: float = max_displacement
+        self.sleep_displacement: float = sleep_displacement
+        self.sleep_steps: int = sleep_steps
+        self.wake_radius: float = wake_radius
+        self.awake: npt.NDArray = np.empty(0, bool)
+        self.quiet: npt.NDArray = np.empty(0, np.intp)
+        self.energy: npt.NDArray = np.empty(0, float)
+        self.last_step: float = 0.0
+        self._offsets: npt.NDArray = np.empty(0, np.intp)
+
+    @property
+    def settled(self) -> bool:
+        return bool(self._offsets.size) and not self.awake.any()
+
+    def wake(self) -> None:
+        self.awake[:] = True
+        self.quiet[:] = 0
+
+    def save(self) -> Tuple[npt.NDArray, ...]:
+        return (
+            self.awake.copy(), self.quiet.copy(), self.energy.copy(),
+            self._offsets
+        )
+
+    def restore(self, state: Tuple[npt.NDArray, ...]) -> None:
+        awake, quiet, energy, self._offsets = state
+        self.awake, self.quiet, self.energy = (
+            awake.copy(), quiet.copy(), energy.copy()
+        )
+
+    def _boxes(
+        self,
+        vertexes: npt.NDArray,
+        packed: npt.NDArray,
+        offsets: npt.NDArray
+    ) -> Tuple[npt.NDArray, npt.NDArray]:
+        positions = vertexes[packed]
+        return (
+            np.minimum.reduceat(positions, offsets[:-1]),
+            np.maximum.reduceat(positions, offsets[:-1])
+        )
+
+    def _wake_near(
+        self,
+        vertexes: npt.NDArray,
+        packed: npt.NDArray,
+        offsets: npt.NDArray,
+        moving: npt.NDArray
+    ) -> None:
+        sleeping = np.flatnonzero(~self.awake)
+        if not moving.any() or not sleeping.size:
+            return
+
+        vmin, vmax = self._boxes(vertexes, packed, offsets)
+        low = vmin[moving] - self.wake_radius
+        high = vmax[moving] + self.wake_radius
+        near = np.all(
+            (vmin[sleeping, None] <= high[None]) &
+            (vmax[sleeping, None] >= low[None]),
+            axis=2
+        ).any(axis=1)
+        self.awake[sleeping[near]] = True
+        self.quiet[sleeping[near]] = 0
+
+    def _track(
+        self,
+        vertexes: npt.NDArray,
+        packed: npt.NDArray,
+        offsets: npt.NDArray
+    ) -> None:
+        if np.array_equal(offsets, self._offsets):
+            return
+
+        count = offsets.shape[0] - 1
+        known = max(self._offsets.shape[0] - 1, 0)
+        previous = np.diff(self._offsets)
+        self._offsets = offsets.copy()
+        if count < known:
+            self.awake = np.ones(count, bool)
+            self.quiet = np.zeros(count, np.intp)
+            self.energy = np.zeros(count, float)
+            return
+
+        extra = count - known
+        self.awake = np.concatenate((self.awake, np.ones(extra, bool)))
+        self.quiet = np.concatenate((self.quiet, np.zeros(extra, np.intp)))
+        self.energy = np.concatenate((self.energy, np.zeros(extra, float)))
+
+        lengths = np.diff(offsets)
+        changed = np.ones(count, bool)
+        changed[:known] = lengths[:known] != previous
+        self.awake[changed] = True
+        self.quiet[changed] = 0
+        self._wake_near(vertexes, packed, offsets, changed)
+
+    def _untangle(
+        self,
+        before: npt.NDArray,
+        vertexes: npt.NDArray,
+        packed: npt.NDArray,
+        offsets: npt.NDArray,
+        free_nodes: npt.NDArray
+    ) -> None:
+        within = np.ones(max(packed.shape[0] - 1, 0), bool)
+        within[offsets[1:-1] - 1] = False
+        ends = np.stack((packed[:-1], packed[1:]), axis=1)[within]
+
+        while True:
+            segments = vertexes[ends]
+            moved = np.flatnonzero(
+                np.any(segments != before[ends], axis=(1, 2))
+            )
+            blocked = crossing_segments(segments, ends, moved)
+            if free_nodes.size and moved.size:
+                blocked[moved] |= (point_segment_distances(
+                    vertexes[free_nodes][:, None],
+                    segments[moved, 0],
+                    segments[moved, 1]
+                ) < self.max_displacement).any(axis=0)
+
+            reverted = np.unique(ends[blocked])
+            reverted = reverted[
+                np.any(vertexes[reverted] != before[reverted], axis=1)
+            ]
+            if not reverted.size:
+                return
+            vertexes[reverted] = before[reverted]
+
+    def step(
+        self,
+        vertexes: npt.NDArray,
+        packed: npt.NDArray,
+        offsets: npt.NDArray,
+        sources: npt.NDArray,
+        free_nodes: npt.NDArray,
+        pinned: npt.NDArray
+    ) -> bool:
+        self._track(vertexes, packed, offsets)
+        awake = np.flatnonzero(self.awake)
+        if not awake.size:
+            return False
+
+        lengths = np.diff(offsets)
+        selected = packed[np.repeat(self.awake, lengths)]
+        starts = np.zeros(awake.size + 1, np.intp)
+        np.cumsum(lengths[awake], out=starts[1:])
+
+        forces = relaxation_forces(
+            vertexes, selected, starts, sources, free_nodes, self.cutoff
+        )
+        forces[np.isin(selected, anchored(packed, offsets, pinned))] = 0
+        speeds = np.hypot(forces[:, 0], forces[:, 1])
+        step = self.max_step
+        peak = float(speeds.max()) if speeds.size else 0.0
+        if peak * step > self.max_displacement:
+            step = self.max_displacement / peak
+
+        before = vertexes.copy()
+        np.add.at(vertexes, selected, step * forces)
+        self._untangle(before, vertexes, packed, offsets, free_nodes)
+        speeds = np.hypot(*(vertexes[selected] - before[selected]).T) / step
+        self.last_step = step
+
+        self.energy[awake] = np.add.reduceat(speeds * speeds, starts[:-1]) / 2
+        moving = np.maximum.reduceat(speeds, starts[:-1]) * step > (
+            self.sleep_displacement
+        )
+        self.quiet[awake] = np.where(moving, 0, self.quiet[awake] + 1)
+        self.awake[awake] = self.quiet[awake] < self.sleep_steps
+
+        moved = np.zeros(self.awake.shape[0], bool)
+        moved[awake[moving]] = True
+        self._wake_near(vertexes, packed, offsets, moved)
+        return True
+
+
+class RelaxationWorker:
+
+    def __init__(
+        self,
+        vertex_field: VertexField,
+        nodes_field: NodesField,
+        polyline_field: PolylinesField,
+        power: float = 1,
+        step_ms: int = FIXED_STEP_MS,
+        cutoff: Optional[float] = None,
+        adaptive: bool = False
+    ) -> None:
+        self._vertex_field = vertex_field
+        self._nodes_field = nodes_field
+        self._polyline_field = polyline_field
+        self.power: float = power
+        self.step_ms: int = step_ms
+        self.cutoff: Optional[float] = cutoff
+        self.steps: int = 0
+        self.integrator: Optional[Integrator] = None
+        if adaptive:
+            self.integrator = Integrator(step_ms * power, cutoff)
+
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._changed = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._front: npt.NDArray = np.empty((0, 2))
+        self._back: npt.NDArray = np.empty((0, 2))
+        self._inputs: Tuple[npt.NDArray, ...] = ()
+        self._pinned: npt.NDArray = np.empty(0, np.intp)
+        self._waking: bool = False
+        self._generation: int = 0
+        self._versions: Tuple[int, int, int] = (-1, -1, -1)
+        self._pending: int = 0
+        self._stepped: Tuple[npt.NDArray, ...] = ()
+        self._published: Tuple[npt.NDArray, ...] = ()
+        self._rollback: Optional[Tuple[npt.NDArray, ...]] = None
+        self._woken: bool = False
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    @property
+    def adaptive(self) -> bool:
+        return self.integrator is not None
+
+    @property
+    def settled(self) -> bool:
+        return self.integrator is not None and self.integrator.settled
+
+    def wake(self) -> None:
+        if self.integrator is None:
+            return
+        if self._thread is None:
+            self.integrator.wake()
+            self._woken = True
+            return
+        with self._lock:
+            self._waking = True
+            self._woken = True
+            if self._pending and self._versions == self._current_versions():
+                np.copyto(self._front, self._vertex_field._vertexes)
+                np.copyto(self._back, self._front)
+                self._rollback = self._published
+                self._pending = 0
+        self._changed.set()
+
+    def _current_versions(self) -> Tuple[int, int, int]:
+        return (
+            self._polyline_field.version,
+            self._nodes_field.version,
+            self._vertex_field._vertexes.shape[0]
+        )
+
+    def _reload(self) -> None:
+        inputs = self._polyline_field.relaxation_inputs()
+        pinned = self._nodes_field.vertexes_indexes.copy()
+        front = self._vertex_field._vertexes.copy()
+        with self._lock:
+            self._inputs = inputs
+            self._pinned = pinned
+            self._front = front
+            self._back = front.copy()
+            self._generation += 1
+            if self._pending:
+                self._rollback = self._published
+                self._waking |= self._woken
+            self._pending = 0
+        self._versions = self._current_versions()
+        self._changed.set()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        if self.integrator is not None:
+            self._published = self._stepped = self.integrator.save()
+        self._rollback = None
+        self._woken = False
+        self._reload()
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run, name='relaxation', daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> int:
+        if self._thread is None:
+            return 0
+        self._stopping.set()
+        self._changed.set()
+        self._thread.join()
+        self._thread = None
+        if self._rollback is not None and self.integrator is not None:
+            self.integrator.restore(self._rollback)
+        self._rollback = None
+        published = self.publish()
+        if self._waking and self.integrator is not None:
+            self.integrator.wake()
+        self._waking = False
+        return published
+
+    def _step(
+        self,
+        vertexes: npt.NDArray,
+        inputs: Tuple[npt.NDArray, ...],
+        pinned: npt.NDArray
+    ) -> bool:
+        if self.integrator is None:
+            relax(vertexes, *inputs, self.step_ms * self.power, self.cutoff)
+            return True
+        return self.integrator.step(vertexes, *inputs, pinned)
+
+    def _run(self) -> None:
+        interval = self.step_ms / 1000
+        deadline = time.perf_counter()
+        integrator = self.integrator
+        settled = -1
+        while not self._stopping.is_set():
+            self._changed.clear()
+            with self._lock:
+                generation = self._generation
+                inputs = self._inputs
+                pinned = self._pinned
+                back = self._back
+                waking = self._waking
+                rollback = self._rollback
+                self._waking = False
+                self._rollback = None
+
+            if rollback is not None and integrator is not None:
+                integrator.restore(rollback)
+            if not waking and generation == settled:
+                self._changed.wait()
+                deadline = time.perf_counter()
+                continue
+
+            if waking and integrator is not None:
+                integrator.wake()
+            state = integrator.save() if integrator is not None else ()
+            stepped = self._step(back, inputs, pinned)
+
+            with self._lock:
+                if generation != self._generation or self._waking:
+                    if integrator is not None:
+                        integrator.restore(state)
+                    if generation == self._generation:
+                        np.copyto(self._back, self._front)
+                elif not stepped:
+                    settled = generation
+                else:
+                    self._front, self._back = back, self._front
+                    np.copyto(self._back, self._front)
+                    if integrator is not None:
+                        self._stepped = integrator.save()
+                    self._pending += 1
+                    self.steps += 1
+
+            deadline = max(deadline + interval, time.perf_counter() - interval)
+            self._stopping.wait(max(0.0, deadline - time.perf_counter()))
+
+    def publish(self) -> int:
+        if self._versions != self._current_versions():
+            if self._thread is not None:
+                self._reload()
+            elif self._pending and self.integrator is not None:
+                self.integrator.restore(self._published)
+                if self._woken:
+                    self.integrator.wake()
+                self._pending = 0
+            return 0
+
+        with self._lock:
+            published = self._pending
+            if not published:
+                return 0
+            np.copyto(self._vertex_field._vertexes, self._front)
+            self._published = self._stepped
+            self._woken = False
+            self._pending = 0
+
+        self._polyline_field.moved()
+        return published
+
+    def advance(self, steps: int) -> None:
+        if steps <= 0:
+            return
+
+        inputs = self._polyline_field.relaxation_inputs()
+        pinned = self._nodes_field.vertexes_indexes
+        vertexes = self._vertex_field._vertexes
+        for _ in range(steps):
+            self._step(vertexes, inputs, pinned)
+        self.steps += steps
+        self._polyline_field.moved()
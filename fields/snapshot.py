@@ -0,0 +1,248 @@
+from __future__ import annotations
+import io
+import os
+import struct
+import numpy as np
+import numpy.typing as npt
+from typing import BinaryIO, Dict, List, Optional, Sequence, Tuple, Union
+
+from .board import Board
+from .bvh import BVH
+
+MAGIC = b'SPRT'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+FLAG_DRAWING = 1
+FLAG_TREES = 2
+
+HEADER = struct.Struct('<4sHHddI')
+ENTRY = struct.Struct('<16s8sQQQ')
+
+EXTRA_PREFIX = 'x.'
+
+
+def _pack_trees(
+    prefix: str,
+    trees: Sequence[Optional[BVH]]
+) -> Dict[str, npt.NDArray]:
+    present = [tree for tree in trees if tree is not None]
+    nodes = np.zeros(len(trees) + 1, np.int64)
+    nodes[1:] = np.cumsum(
+        [0 if tree is None else tree.vmin.shape[0] for tree in trees]
+    )
+    levels = np.zeros(len(trees) + 1, np.int64)
+    levels[1:] = np.cumsum(
+        [0 if tree is None else tree.level_offsets.shape[0] for tree in trees]
+    )
+
+    def joined(name: str, empty: npt.NDArray) -> npt.NDArray:
+        if not present:
+            return empty
+        return np.concatenate([getattr(tree, name) for tree in present])
+
+    return {
+        prefix + 'vmin': joined('vmin', np.empty((0, 2), float)),
+        prefix + 'vmax': joined('vmax', np.empty((0, 2), float)),
+        prefix + 'left': joined('left', np.empty(0, np.int32)),
+        prefix + 'right': joined('right', np.empty(0, np.int32)),
+        prefix + 'levels': joined('level_offsets', np.empty(0, np.int64)),
+        prefix + 'nodes': nodes,
+        prefix + 'level_starts': levels,
+    }
+
+
+def _unpack_trees(
+    prefix: str,
+    arrays: Dict[str, npt.NDArray],
+    copy: bool = False
+) -> List[Optional[BVH]]:
+    if copy:
+        arrays = {
+            name: array.copy() for name, array in arrays.items()
+            if name.startswith(prefix)
+        }
+    nodes = arrays[prefix + 'nodes'].tolist()
+    levels = arrays[prefix + 'level_starts'].tolist()
+    trees: List[Optional[BVH]] = []
+    for number in range(len(nodes) - 1):
+        start, stop = nodes[number], nodes[number + 1]
+        if start == stop:
+            trees.append(None)
+            continue
+        trees.append(BVH(
+            arrays[prefix + 'vmin'][start:stop],
+            arrays[prefix + 'vmax'][start:stop],
+            arrays[prefix + 'left'][start:stop],
+            arrays[prefix + 'right'][start:stop],
+            arrays[prefix + 'levels'][levels[number]:levels[number + 1]]
+        ))
+    return trees
+
+
+def board_arrays(
+    board: Board,
+    trees: bool = True
+) -> Dict[str, npt.NDArray]:
+    polyline_field = board.polyline_field
+    packed, offsets = polyline_field.packed_indexes()
+    arrays = {
+        'vertexes': board.vertex_field._vertexes,
+        'alive': board.vertex_field.alive,
+        'packed': packed.astype(np.int64),
+        'offsets': offsets.astype(np.int64),
+        'nodes': board.nodes_field.vertexes_indexes.astype(np.int64),
+        'degrees': board.nodes_field.degrees,
+    }
+
+    if trees:
+        arrays.update(_pack_trees(
+            't.', [polyline.tree for polyline in polyline_field.polylines]
+        ))
+        broad_phase, ids = polyline_field.broad_phase
+        arrays.update(_pack_trees('b.', [broad_phase]))
+        arrays['b.ids'] = ids.astype(np.int64)
+    return arrays
+
+
+def write_snapshot(
+    board: Board,
+    output: BinaryIO,
+    trees: bool = True,
+    extra: Optional[Dict[str, npt.NDArray]] = None
+) -> int:
+    arrays = board_arrays(board, trees)
+    for name, array in (extra or {}).items():
+        arrays[EXTRA_PREFIX + name] = np.asarray(array)
+
+    flags = FLAG_TREES if trees else 0
+    if board.polyline_field.drawing:
+        flags |= FLAG_DRAWING
+
+    offset = HEADER.size + ENTRY.size * len(arrays)
+    entries: List[bytes] = []
+    layout: List[Tuple[int, npt.NDArray]] = []
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        offset += -offset % ALIGNMENT
+        rows = array.shape[0] if array.ndim else 1
+        columns = array.shape[1] if array.ndim > 1 else 0
+        entries.append(ENTRY.pack(
+            name.encode(), array.dtype.str.encode(), rows, columns, offset
+        ))
+        layout.append((offset, array))
+        offset += array.nbytes
+
+    output.write(HEADER.pack(
+        MAGIC, FORMAT_VERSION, flags, *board.size, len(arrays)
+    ))
+    output.write(b''.join(entries))
+    position = HEADER.size + ENTRY.size * len(arrays)
+    for start, array in layout:
+        output.write(b'\0' * (start - position))
+        output.write(array.tobytes())
+        position = start + array.nbytes
+    return position
+
+
+def snapshot_bytes(
+    board: Board,
+    trees: bool = True,
+    extra: Optional[Dict[str, npt.NDArray]] = None
+) -> bytes:
+    output = io.BytesIO()
+    write_snapshot(board, output, trees, extra)
+    return output.getvalue()
+
+
+def save_snapshot(
+    board: Board,
+    path: Union[str, os.PathLike],
+    trees: bool = True,
+    extra: Optional[Dict[str, npt.NDArray]] = None
+) -> int:
+    temporary = f'{os.fspath(path)}.tmp'
+    with open(temporary, 'wb') as output:
+        size = write_snapshot(board, output, trees, extra)
+    os.replace(temporary, path)
+    return size
+
+
+def read_arrays(
+    buffer: Union[bytes, bytearray, memoryview, np.ndarray]
+) -> Tuple[int, Tuple[float, float], Dict[str, npt.NDArray]]:
+    raw = np.frombuffer(buffer, dtype=np.uint8)
+    if raw.shape[0] < HEADER.size:
+        raise ValueError('snapshot is truncated')
+
+    magic, version, flags, width, height, count = HEADER.unpack_from(raw)
+    if magic != MAGIC:
+        raise ValueError('not a board snapshot')
+    if version != FORMAT_VERSION:
+        raise ValueError(f'unsupported snapshot version {version}')
+    if HEADER.size + count * ENTRY.size > raw.shape[0]:
+        raise ValueError('snapshot is truncated')
+
+    arrays: Dict[str, npt.NDArray] = {}
+    for number in range(count):
+        name, dtype, rows, columns, offset = ENTRY.unpack_from(
+            raw, HEADER.size + number * ENTRY.size
+        )
+        try:
+            dtype = np.dtype(dtype.rstrip(b'\0').decode())
+            name = name.rstrip(b'\0').decode()
+        except (TypeError, ValueError):
+            dtype = None
+        if dtype is None or dtype.hasobject:
+            raise ValueError('snapshot has a corrupt entry table')
+        shape = (rows, columns) if columns else (rows,)
+        if offset + dtype.itemsize * rows * max(columns, 1) > raw.shape[0]:
+            raise ValueError('snapshot is truncated')
+        arrays[name] = np.ndarray(shape, dtype, buffer=raw, offset=offset)
+    return flags, (width, height), arrays
+
+
+def board_from_arrays(
+    flags: int,
+    size: Tuple[float, float],
+    arrays: Dict[str, npt.NDArray]
+) -> Tuple[Board, Dict[str, npt.NDArray]]:
+    board = Board(size)
+    copy = not arrays['vertexes'].flags.writeable
+    board.vertex_field.load(arrays['vertexes'], arrays['alive'], copy=copy)
+    board.nodes_field.load(arrays['nodes'], arrays['degrees'], copy=copy)
+
+    offsets = arrays['offsets'].tolist()
+    packed = arrays['packed']
+    polylines = [
+        packed[start:stop].tolist()
+        for start, stop in zip(offsets[:-1], offsets[1:])
+    ]
+
+    trees: Optional[List[Optional[BVH]]] = None
+    broad_phase: Optional[Tuple[BVH, npt.NDArray]] = None
+    if flags & FLAG_TREES:
+        trees = _unpack_trees('t.', arrays, copy)
+        root, = _unpack_trees('b.', arrays, copy)
+        if root is not None:
+            broad_phase = (root, arrays['b.ids'])
+
+    board.polyline_field.load(
+        polylines, bool(flags & FLAG_DRAWING), trees, broad_phase
+    )
+    extra = {
+        name[len(EXTRA_PREFIX):]: array
+        for name, array in arrays.items()
+        if name.startswith(EXTRA_PREFIX)
+    }
+    return board, extra
+
+
+def load_snapshot(
+    source: Union[str, os.PathLike, bytes, bytearray]
+) -> Tuple[Board, Dict[str, npt.NDArray]]:
+    if isinstance(source, (bytes, bytearray)):
+        buffer: Union[memoryview, np.memmap] = memoryview(source).toreadonly()
+    else:
+        buffer = np.memmap(source, dtype=np.uint8, mode='c')
+    return board_from_arrays(*read_arrays(buffer))
@@ -0,0 +1,193 @@
+from __future__ import annotations
+import numpy as np
+import numpy.typing as npt
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from .bvh import BVH
+from .geometry import (
+    orientated_areas, paired_segments_intersect, segments_from_vertexes
+)
+from .nodes import DOTS_RADIUS, NodesField
+from .polylines import PolylinesField
+from .vertexes import VertexField
+
+UNKNOWN_NODE = 'unknown_node'
+MOVE_IN_PROGRESS = 'move_in_progress'
+SATURATED = 'saturated'
+TOO_SHORT = 'too_short'
+NEVER_LEFT_START = 'never_left_start'
+WRONG_END = 'wrong_end'
+SELF_INTERSECTION = 'self_intersection'
+CROSSES_POLYLINE = 'crosses_polyline'
+MIDDLE_OVERLAP = 'middle_overlap'
+NO_SHARED_FACE = 'no_shared_face'
+
+MIDDLE_CLEARANCE = 2 * DOTS_RADIUS
+
+
+@dataclass
+class Rejection:
+    code: str
+    message: str
+    segment: int = -1
+    other: int = -1
+
+
+def move_path(
+    vertex_field: VertexField,
+    nodes_field: NodesField,
+    points: npt.ArrayLike,
+    start_node: int,
+    end_node: int
+) -> npt.NDArray:
+    nodes = nodes_field.vertexes_indexes
+    start = vertex_field.get_vertexes_by_mask([nodes[start_node]])
+    end = vertex_field.get_vertexes_by_mask([nodes[end_node]])
+
+    path = np.concatenate(
+        (start, np.asarray(points, dtype=float).reshape(-1, 2))
+    )
+    distinct = np.ones(path.shape[0], bool)
+    distinct[1:] = np.any(path[1:] != path[:-1], axis=1)
+    return np.concatenate((path[distinct], end))
+
+
+def touching_only(
+    queries: npt.NDArray,
+    segments: npt.NDArray,
+    points: npt.NDArray
+) -> npt.NDArray:
+    touching = np.zeros(queries.shape[0], bool)
+    for end in (0, 1):
+        shared = queries[:, end]
+        at_point = np.any(
+            np.all(shared[:, None] == points[None], axis=2), axis=1
+        )
+        for other in (0, 1):
+            meets = at_point & np.all(shared == segments[:, other], axis=1)
+            away, along = queries[:, 1 - end], segments[:, 1 - other]
+            overlaps = (
+                (orientated_areas(shared, away, along) == 0) &
+                (np.einsum('ij,ij->i', away - shared, along - shared) > 0)
+            )
+            touching |= meets & ~overlaps
+    return touching
+
+
+def validate_move(
+    vertex_field: VertexField,
+    nodes_field: NodesField,
+    polyline_field: PolylinesField,
+    points: npt.ArrayLike,
+    start_node: int,
+    end_node: int
+) -> Optional[Rejection]:
+    for node in (start_node, end_node):
+        if not 0 <= node < len(nodes_field):
+            return Rejection(
+                UNKNOWN_NODE, f'node {node} does not exist', other=node
+            )
+
+    if polyline_field.drawing:
+        return Rejection(MOVE_IN_PROGRESS, 'another move is being drawn')
+
+    needed: Dict[int, int] = {start_node: 1}
+    needed[end_node] = needed.get(end_node, 0) + 1
+    for node, extra in needed.items():
+        degree = nodes_field.get_degree(node)
+        if degree + extra > 3:
+            return Rejection(
+                SATURATED,
+                f'node {node} has degree {degree} and cannot take '
+                f'{extra} more',
+                other=node
+            )
+
+    path = move_path(vertex_field, nodes_field, points, start_node, end_node)
+    if path.shape[0] < 3:
+        return Rejection(
+            TOO_SHORT, 'the move needs a vertex between its two nodes'
+        )
+
+    positions = vertex_field.get_vertexes_by_mask(
+        nodes_field.vertexes_indexes
+    )
+    offsets = path[:, None] - positions[None]
+    inside = np.einsum('ijk,ijk->ij', offsets, offsets) < DOTS_RADIUS ** 2
+    over = np.where(inside.any(axis=1), inside.argmax(axis=1), -1)
+
+    outside = np.flatnonzero(over < 0)
+    if not outside.size:
+        return Rejection(
+            NEVER_LEFT_START, f'the move never leaves node {start_node}'
+        )
+    left = int(outside[0])
+    enter = left + int(np.flatnonzero(over[left:] >= 0)[0])
+
+    if over[enter] != end_node:
+        return Rejection(
+            WRONG_END,
+            f'the move enters node {over[enter]} before node {end_node}',
+            segment=enter - 1,
+            other=int(over[enter])
+        )
+    if np.any(over[enter:] != end_node):
+        return Rejection(
+            WRONG_END,
+            f'the move leaves node {end_node} after entering it',
+            segment=enter - 1,
+            other=end_node
+        )
+
+    segments = segments_from_vertexes(path)
+    checked = np.arange(left - 1, enter - 1)
+
+    queries, earlier = BVH.from_segments(segments).query_segments(
+        segments[checked, 0], segments[checked, 1]
+    )
+    later = checked[queries]
+    apart = earlier <= later - 2
+    later, earlier = later[apart], earlier[apart]
+    crossing = paired_segments_intersect(segments[later], segments[earlier])
+    if crossing.any():
+        first = np.flatnonzero(crossing)[np.argmin(later[crossing])]
+        return Rejection(
+            SELF_INTERSECTION,
+            f'segment {later[first]} crosses segment {earlier[first]} '
+            f'of the same move',
+            segment=int(later[first]),
+            other=int(earlier[first])
+        )
+
+    queries, polylines, hits = polyline_field.crossing_segments(
+        segments[:, 0], segments[:, 1]
+    )
+    crossing = ~touching_only(
+        segments[queries],
+        polyline_field.segment_vertexes(polylines, hits),
+        positions[[start_node, end_node]]
+    )
+    if crossing.any():
+        first = np.flatnonzero(crossing)[np.argmin(queries[crossing])]
+        return Rejection(
+            CROSSES_POLYLINE,
+            f'segment {queries[first]} crosses polyline {polylines[first]}',
+            segment=int(queries[first]),
+            other=int(polylines[first])
+        )
+
+    middle = path[path.shape[0] // 2]
+    gaps = np.hypot(
+        positions[:, 0] - middle[0], positions[:, 1] - middle[1]
+    )
+    near = np.flatnonzero(gaps < MIDDLE_CLEARANCE)
+    if near.size:
+        return Rejection(
+            MIDDLE_OVERLAP,
+            f'the new middle node would overlap node {near[0]}',
+            segment=path.shape[0] // 2 - 1,
+            other=int(near[0])
+        )
+
+    return None
@@ -1,44 +1,127 @@
+import heapq
 import numpy as np
 import numpy.typing as npt
-from typing import Optional, Self, List, Tuple
+from typing import Optional, List, Tuple, Union
+
+INITIAL_CAPACITY = 64
 
 
 class VertexField:
 
-    _instance: Optional[Self] = None
+    def __init__(self) -> None:
+        self._buffer: npt.NDArray = np.zeros((INITIAL_CAPACITY, 2), float)
+        self._alive: npt.NDArray = np.zeros(INITIAL_CAPACITY, bool)
+        self._size: int = 0
+        self._free: List[int] = []
+        self._count: int = 0
 
-    @classmethod
-    def __new__(cls, *args, **kwargs) -> Self:
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-        return cls._instance
+    @property
+    def _vertexes(self) -> npt.NDArray:
+        return self._buffer[:self._size]
 
-    def __init__(self) -> None:
-        self._vertexes: npt.NDArray = np.array([])
+    @property
+    def capacity(self) -> int:
+        return self._buffer.shape[0]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _grow(self, capacity: int) -> None:
+        buffer = np.zeros((capacity, 2), float)
+        buffer[:self._size] = self._buffer[:self._size]
+        alive = np.zeros(capacity, bool)
+        alive[:self._size] = self._alive[:self._size]
+        self._buffer = buffer
+        self._alive = alive
+
+    def _take_free(self) -> int:
+        while self._free:
+            index = heapq.heappop(self._free)
+            if index < self._size:
+                return index
+        return -1
 
     def push_vertex(self, x, y) -> int:
-        if not len(self._vertexes):
-            self._vertexes = np.array([[x, y]], dtype=float)
-        else:
-            self._vertexes = np.append(self._vertexes, [[x, y]], axis=0)
-        return self._vertexes.shape[0] - 1
+        index = self._take_free()
+        if index < 0:
+            if self._size == self.capacity:
+                self._grow(max(2 * self.capacity, INITIAL_CAPACITY))
+            index = self._size
+            self._size += 1
+        self._buffer[index] = (x, y)
+        self._alive[index] = True
+        self._count += 1
+        return index
+
+    def is_alive(self, index) -> bool:
+        return -self._size <= index < self._size and self._alive[index]
 
     def get_vertex(self, index) -> Optional[Tuple[float, float]]:
-        if self._vertexes is None:
+        if not self.is_alive(index):
             return None
-        x = self._vertexes[index][0]
-        y = self._vertexes[index][1]
+        x = self._buffer[index][0]
+        y = self._buffer[index][1]
         return (x, y)
 
     @property
     def indexes(self) -> npt.NDArray:
-        return np.arange(len(self._vertexes))
+        return np.flatnonzero(self._alive[:self._size])
+
+    @property
+    def alive(self) -> npt.NDArray:
+        return self._alive[:self._size]
+
+    def load(
+        self,
+        vertexes: npt.NDArray,
+        alive: npt.NDArray,
+        copy: bool = True
+    ) -> None:
+        size = vertexes.shape[0]
+        if copy:
+            capacity = INITIAL_CAPACITY
+            while capacity < size:
+                capacity *= 2
+            self._buffer = np.zeros((capacity, 2), float)
+            self._buffer[:size] = vertexes
+            self._alive = np.zeros(capacity, bool)
+            self._alive[:size] = alive
+        else:
+            self._buffer = vertexes
+            self._alive = alive
+        self._size = size
+        self._free = np.flatnonzero(~self._alive[:size]).tolist()
+        self._count = int(np.count_nonzero(self._alive[:size]))
 
-    def get_vertexes_by_mask(self, mask: List[int]) -> npt.NDArray:
-        if self._vertexes is None:
-            return np.array([])
+    def get_vertexes_by_mask(
+        self,
+        mask: Union[List[int], npt.NDArray, slice]
+    ) -> npt.NDArray:
+        if isinstance(mask, slice):
+            return self._vertexes[mask]
+        mask = np.asarray(mask, dtype=np.intp)
+        if not mask.size:
+            return np.empty((0, 2), float)
+        start = int(mask[0])
+        stop = int(mask[-1]) + 1
+        if (
+            0 <= start < stop and
+            stop - start == mask.size and
+            np.all(np.diff(mask) == 1)
+        ):
+            return self._vertexes[start:stop]
         return self._vertexes[mask]
 
     def delete_vertexes(self, indexes: List[int]):
-        if self._vertexes is not None:
-            self._vertexes = np.delete(self._vertexes, indexes, axis=0)
+        indexes = np.unique(np.asarray(indexes, dtype=np.intp))
+        indexes = indexes[(indexes >= 0) & (indexes < self._size)]
+        indexes = indexes[self._alive[indexes]]
+        self._alive[indexes] = False
+        self._count -= indexes.size
+        for index in indexes:
+            heapq.heappush(self._free, int(index))
+        while self._size and not self._alive[self._size - 1]:
+            self._size -= 1
+        if len(self._free) > 2 * max(self._size, 1):
+            self._free = [i for i in self._free if i < self._size]
+            heapq.heapify(self._free)
@@ -1,99 +1,160 @@
+import argparse
+from typing import Optional
+
+import numpy as np
 import pygame as pg
-from fields.polylines import PolylinesField
-from fields.vertexes import VertexField
-from fields.nodes import NodesField
+from fields.board import SIMPLIFY_TOLERANCE, Board
+from fields.camera import ZOOM_STEP, Camera
+from fields.controller import GameController
+from fields.profiler import FrameProfiler
+from fields.recording import (
+    EVENT_BUTTON_DOWN, EVENT_BUTTON_UP, EVENT_OTHER, EVENT_QUIT, FrameInput,
+    Recording, RecordingHeader
+)
+from fields.render import NodesRenderer, PolylinesRenderer, ProfilerOverlay
+from fields.simulation import RelaxationWorker
 
 SCREEN_WIDTH = 1024
 SCREEN_HEIGHT = 768
-SEGMENT_STEP = 5
+BOARD_NODES = 16
+BOARD_RADIUS = 100
+PAN_BUTTON = 1
+VIEW_BUTTONS = (2, 4, 5)
+
+EVENTS = {
+    pg.QUIT: EVENT_QUIT,
+    pg.MOUSEBUTTONDOWN: EVENT_BUTTON_DOWN,
+    pg.MOUSEBUTTONUP: EVENT_BUTTON_UP,
+}
 
 if __name__ == "__main__":
 
+    parser = argparse.ArgumentParser(description='Epic Sprouts')
+    parser.add_argument(
+        '--profile', action='store_true',
+        help='show per-phase frame timings in an overlay'
+    )
+    parser.add_argument(
+        '--profile-output', default=None,
+        help='write per-frame timings to this file as JSON lines'
+    )
+    parser.add_argument(
+        '--seed', type=int, default=None,
+        help='seed for the generated board'
+    )
+    parser.add_argument(
+        '--record', default=None,
+        help='record the seed and per-frame input to this file'
+    )
+    parser.add_argument(
+        '--fixed-step', action='store_true',
+        help='relax only while the right button is held, with a fixed step'
+    )
+    parser.add_argument(
+        '--simplify', type=float, nargs='?', const=SIMPLIFY_TOLERANCE,
+        default=None, metavar='TOLERANCE',
+        help=(
+            'simplify and resample each committed move, with tolerance '
+            f'{SIMPLIFY_TOLERANCE} pixels unless given'
+        )
+    )
+    parser.add_argument(
+        '--size', type=int, nargs=2, default=None, metavar=('W', 'H'),
+        help='board size in pixels, defaults to the window size'
+    )
+    parser.add_argument(
+        '--nodes', type=int, default=BOARD_NODES,
+        help='number of nodes on the generated board'
+    )
+    args = parser.parse_args()
+
+    seed = args.seed
+    if seed is None:
+        seed = int(np.random.default_rng().integers(1 << 63))
+
     pg.init()
     pg.display.set_caption('Epic Sprouts')
     screen = pg.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
 
-    vertex_field = VertexField()
-    nodes_field = NodesField(vertex_field, screen)
-    polyline_field = PolylinesField(screen, vertex_field, nodes_field)
-
-    nodes_field.generate_field(16, 100)
+    size = tuple(args.size or (SCREEN_WIDTH, SCREEN_HEIGHT))
+    board = Board(size, args.simplify)
+    board.generate(args.nodes, BOARD_RADIUS, seed)
+
+    camera = Camera((SCREEN_WIDTH, SCREEN_HEIGHT))
+    camera.fit(board.size)
+
+    vertex_field = board.vertex_field
+    nodes_field = board.nodes_field
+    polyline_field = board.polyline_field
+
+    polylines_renderer = PolylinesRenderer(
+        screen, vertex_field, polyline_field, camera
+    )
+    nodes_renderer = NodesRenderer(
+        screen, vertex_field, nodes_field, camera
+    )
+
+    worker = RelaxationWorker(
+        vertex_field, nodes_field, polyline_field,
+        adaptive=not args.fixed_step
+    )
+    profiler = FrameProfiler(args.profile, output=args.profile_output)
+    overlay_renderer = ProfilerOverlay(profiler)
+
+    controller = GameController(board, worker, profiler=profiler)
+    recording: Optional[Recording] = None
+    if args.record:
+        recording = Recording(RecordingHeader(
+            seed, size, args.nodes, BOARD_RADIUS,
+            worker.step_ms, worker.power, worker.cutoff,
+            board.simplify_tolerance, worker.adaptive
+        ))
 
     clock = pg.time.Clock()
 
-    running = True
-    drawing = False
-    left_starting_node = False
-    intersection = False
-    force_move = False
-
-    start_node = 0
-
-    while running:
-        ms = clock.tick()
-        pos = pg.mouse.get_pos()
-        over_node = nodes_field.over_node(pos)
-        screen.fill((255, 255, 255))
-        polyline_field.draw()
-        nodes_field.draw(over_node)
-
-        pg.display.flip()
-
-        mouse = pg.mouse.get_pressed()
-
-        if mouse[2] and vertex_field._vertexes is not None:
-            force_move = True
-            polyline_field.force_update(1, ms)
-        elif force_move:
-            force_move = False
-            polyline_field.rebuild_trees()
-
+    while controller.running:
+        frame = FrameInput(
+            camera.to_world(pg.mouse.get_pos()), ms=clock.tick()
+        )
+        profiler.begin_frame()
+        polyline_field.counters.clear()
+        over_node = controller.hover(frame.pos)
+        with profiler.phase('polyline_field.draw'):
+            dirty = polylines_renderer.draw()
+        with profiler.phase('nodes_field.draw'):
+            dirty += nodes_renderer.draw(over_node)
+        overlay = overlay_renderer.draw(screen)
+        if overlay is not None:
+            dirty.append(overlay)
+            polylines_renderer.mark_dirty(overlay)
+
+        with profiler.phase('display.update'):
+            pg.display.update(dirty)
+
+        frame.buttons = pg.mouse.get_pressed()
+        frame.events = []
         for event in pg.event.get():
-            if event.type == pg.QUIT:
-                running = False
-            elif (
-                (event.type == pg.MOUSEBUTTONDOWN) and
-                (over_node > -1) and
-                (nodes_field.get_degree(over_node) < 3)
-            ):
-                index = nodes_field.get_index(over_node)
-                polyline_field.start_polyline(index)
-                start_node = over_node
-                nodes_field.rise_degree(start_node)
-                drawing = True
-                intersection = False
-                left_starting_node = False
-            elif (
-                intersection or
-                (left_starting_node and over_node > -1) or
-                (event.type == pg.MOUSEBUTTONUP)
-            ) and drawing:
-                if (
-                    intersection or
-                    not left_starting_node or
-                    (over_node < 0) or
-                    (nodes_field.get_degree(over_node) > 2)
-                ):
-                    polyline_field.pop()
-                    nodes_field.lower_degree(start_node)
-                else:
-                    index = nodes_field.get_index(over_node)
-                    polyline_field.end_polyline(index)
-                    polyline_field.build_tree(-1)
-                    nodes_field.rise_degree(over_node)
-                    last_polyline = polyline_field.get_polyline(-1)
-                    if last_polyline:
-                        index = last_polyline.middle_point
-                        nodes_field.push_node_by_index(index)
-                drawing = False
-                intersection = False
-
-        if not left_starting_node and (over_node < 0):
-            left_starting_node = True
-
-        if drawing:
-            if left_starting_node:
-                intersection = polyline_field.check_intersection(pos)
-            polyline_field.push_vertex(pos, SEGMENT_STEP)
-
+            if event.type == pg.MOUSEWHEEL:
+                camera.zoom_at(pg.mouse.get_pos(), ZOOM_STEP ** event.y)
+            elif event.type == pg.MOUSEMOTION and event.buttons[PAN_BUTTON]:
+                camera.pan(*event.rel)
+            elif event.type == pg.KEYDOWN and event.key == pg.K_HOME:
+                camera.fit(board.size)
+
+            button = getattr(event, 'button', 0)
+            kind = EVENTS.get(event.type, EVENT_OTHER)
+            if button in VIEW_BUTTONS:
+                kind = EVENT_OTHER
+            frame.events.append((kind, button))
+        controller.update(frame)
+        if recording is not None:
+            recording.append(frame)
+
+        controller.count()
+        profiler.end_frame()
+
+    worker.stop()
+    if recording is not None:
+        recording.save(args.record)
+    profiler.close()
     pg.quit()
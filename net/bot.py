@@ -0,0 +1,86 @@
+from __future__ import annotations
+import argparse
+import asyncio
+from typing import Optional
+
+from fields.ai import SEARCH_DEPTH, AIPlayer
+
+from .client import MatchClient
+
+
+async def play(
+    host: str,
+    port: int,
+    match: str,
+    depth: int = SEARCH_DEPTH,
+    workers: int = 0,
+    seed: Optional[int] = None
+) -> int:
+    client = MatchClient()
+    await client.connect(host, port, match)
+    player = AIPlayer(depth, workers, seed=seed)
+    runner = asyncio.ensure_future(client.run())
+    loop = asyncio.get_running_loop()
+
+    moves = 0
+    seen = -1
+    pending = False
+    rejections = 0
+    try:
+        while not runner.done():
+            await asyncio.sleep(1 / client.tick_rate)
+            if pending and len(client.rejections) > rejections:
+                pending = False
+                seen = -1
+            if client.replica.tick == seen:
+                continue
+            seen = client.replica.tick
+            if not client.replica.node_indexes.size:
+                continue
+
+            board = client.board()
+            if board.game_over:
+                break
+            if not client.my_turn:
+                pending = False
+                continue
+            if pending:
+                continue
+
+            choice = await loop.run_in_executor(None, player.choose, board)
+            if choice is None:
+                continue
+
+            start, end, points = choice
+            rejections = len(client.rejections)
+            client.move(start, end, [(x, y) for x, y in points.tolist()])
+            pending = True
+            moves += 1
+    finally:
+        runner.cancel()
+        player.close()
+        await client.close()
+    return moves
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Epic Sprouts practice bot')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7777)
+    parser.add_argument('--match', default='practice')
+    parser.add_argument('--depth', type=int, default=SEARCH_DEPTH)
+    parser.add_argument(
+        '--workers', type=int, default=0,
+        help=(
+            'search processes; 0 or 1 searches in this process, which is '
+            'faster at the default depth because one transposition table '
+            'is kept warm across turns instead of one cold table per worker'
+        )
+    )
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    print(asyncio.run(play(
+        args.host, args.port, args.match, args.depth, args.workers, args.seed
+    )))
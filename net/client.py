@@ -0,0 +1,131 @@
+from __future__ import annotations
+import asyncio
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from fields.board import Board
+
+from .protocol import (
+    BEGIN, CANCEL, COMMIT, EXTEND, FLAG, JOIN, MOVE, MOVE_HEADER, NODE, RELAX,
+    REJECT, UPDATE, WELCOME, WELCOME_HEADER, Replica, encode_points, frame,
+    read_frame
+)
+from .server import TICK_RATE
+
+
+class MatchClient:
+
+    def __init__(self, tick_rate: int = TICK_RATE) -> None:
+        self.tick_rate: int = tick_rate
+        self.player: int = -1
+        self.size: Tuple[float, float] = (0, 0)
+        self.replica: Replica = Replica()
+        self.rejections: List[str] = []
+        self.updated: asyncio.Event = asyncio.Event()
+        self.bytes_received: int = 0
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._outbox: List[bytes] = []
+        self._points: List[Tuple[float, float]] = []
+
+    async def connect(self, host: str, port: int, match: str) -> int:
+        self._reader, self._writer = await asyncio.open_connection(host, port)
+        self._writer.write(frame(JOIN, match.encode()))
+        await self._writer.drain()
+
+        kind, payload = await read_frame(self._reader)
+        if kind == REJECT:
+            raise ConnectionError(payload.decode())
+        if kind != WELCOME:
+            raise ConnectionError(f'unexpected message {kind}')
+        self.player, width, height = WELCOME_HEADER.unpack(payload)
+        self.size = (width, height)
+        return self.player
+
+    @property
+    def my_turn(self) -> bool:
+        return self.replica.turn == self.player
+
+    def _flush_points(self) -> None:
+        if self._points:
+            self._outbox.append(frame(EXTEND, encode_points(self._points)))
+            self._points = []
+
+    def begin(self, node: int) -> None:
+        self._flush_points()
+        self._outbox.append(frame(BEGIN, NODE.pack(node)))
+
+    def extend(self, pos: Tuple[float, float]) -> None:
+        self._points.append(pos)
+
+    def commit(self) -> None:
+        self._flush_points()
+        self._outbox.append(frame(COMMIT))
+
+    def cancel(self) -> None:
+        self._flush_points()
+        self._outbox.append(frame(CANCEL))
+
+    def move(
+        self,
+        start: int,
+        end: int,
+        points: List[Tuple[float, float]]
+    ) -> None:
+        self._flush_points()
+        self._outbox.append(frame(
+            MOVE, MOVE_HEADER.pack(start, end) + encode_points(points)
+        ))
+
+    def relax(self, on: bool) -> None:
+        self._flush_points()
+        self._outbox.append(frame(RELAX, FLAG.pack(int(on))))
+
+    async def flush(self) -> None:
+        self._flush_points()
+        if not self._outbox or self._writer is None:
+            return
+        data = b''.join(self._outbox)
+        self._outbox.clear()
+        self._writer.write(data)
+        await self._writer.drain()
+
+    async def receive(self) -> None:
+        if self._reader is None:
+            return
+        while True:
+            kind, payload = await read_frame(self._reader)
+            self.bytes_received += len(payload) + 5
+            if kind == UPDATE:
+                self.replica.apply(payload)
+                self.updated.set()
+            elif kind == REJECT:
+                self.rejections.append(payload.decode())
+
+    async def send(self) -> None:
+        while True:
+            await self.flush()
+            await asyncio.sleep(1 / self.tick_rate)
+
+    async def run(self) -> None:
+        await asyncio.gather(self.receive(), self.send())
+
+    def board(self) -> Board:
+        board = Board(self.size)
+        self.replica.load_into(board)
+        return board
+
+    def node_position(self, node: int) -> Tuple[float, float]:
+        index = int(self.replica.node_indexes[node])
+        x, y = self.replica.vertexes[index]
+        return float(x), float(y)
+
+    def free_nodes(self) -> List[int]:
+        return np.flatnonzero(self.replica.degrees < 3).tolist()
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+            self._writer = None
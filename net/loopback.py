@@ -0,0 +1,191 @@
+from __future__ import annotations
+import argparse
+import asyncio
+import sys
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from fields.ai import AIPlayer
+from fields.board import Board
+
+from .client import MatchClient
+from .protocol import (
+    BEGIN, EXTEND, JOIN, QUANTUM, Replica, encode_points, frame, read_frame
+)
+from .server import Match, MatchServer
+
+MATCH = 'loopback'
+MOVES = 4
+TIMEOUT = 10.0
+TOLERANCE = 0.5 / QUANTUM + 1e-3
+
+
+def replicas_equal(first: Replica, second: Replica) -> bool:
+    return (
+        first.tick == second.tick and
+        first.turn == second.turn and
+        first.drawing == second.drawing and
+        np.array_equal(first.vertexes, second.vertexes) and
+        np.array_equal(first.alive, second.alive) and
+        np.array_equal(first.node_indexes, second.node_indexes) and
+        np.array_equal(first.degrees, second.degrees) and
+        first.polylines == second.polylines
+    )
+
+
+def replica_matches(replica: Replica, board: Board) -> bool:
+    vertex_field = board.vertex_field
+    alive = vertex_field.alive
+    if not np.array_equal(replica.alive, alive):
+        return False
+
+    nodes_field = board.nodes_field
+    error = np.abs(replica.vertexes[alive] - vertex_field._vertexes[alive])
+    return (
+        (not error.size or float(error.max()) <= TOLERANCE) and
+        np.array_equal(replica.node_indexes, nodes_field.vertexes_indexes) and
+        np.array_equal(replica.degrees, nodes_field.degrees) and
+        replica.polylines == [
+            polyline.indexes for polyline in board.polyline_field.polylines
+        ]
+    )
+
+
+async def synced(
+    match: Match,
+    clients: List[MatchClient],
+    timeout: float = TIMEOUT
+) -> bool:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while loop.time() < deadline:
+        players = match.players
+        if all(
+            replicas_equal(client.replica, players[client.player].replica) and
+            replica_matches(client.replica, match.board)
+            for client in clients
+        ):
+            return True
+        await asyncio.sleep(0)
+    return False
+
+
+MALFORMED = (
+    frame(BEGIN, b'\0'),
+    frame(EXTEND, encode_points([(float('inf'), 0.0)])),
+    frame(EXTEND, encode_points([(1e30, 1e30)])),
+)
+
+
+async def malformed(port: int, payload: bytes) -> bool:
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(frame(JOIN, b'malformed') + payload)
+    await writer.drain()
+    try:
+        await asyncio.wait_for(read_frame(reader), TIMEOUT)
+        closed = not await asyncio.wait_for(reader.read(), TIMEOUT)
+    except asyncio.TimeoutError:
+        closed = False
+    finally:
+        writer.close()
+    return closed
+
+
+async def loopback(
+    moves: int = MOVES,
+    seed: Optional[int] = None,
+    depth: int = 1
+) -> Dict[str, Any]:
+    loop = asyncio.get_running_loop()
+    errors: List[Dict[str, Any]] = []
+    loop.set_exception_handler(lambda _, context: errors.append(context))
+
+    server = MatchServer()
+    port = await server.start()
+    server.matches[MATCH] = match = Match(MATCH, seed)
+    ticker = asyncio.ensure_future(server.run())
+
+    clients = [MatchClient(), MatchClient()]
+    for client in clients:
+        await client.connect('127.0.0.1', port, MATCH)
+    runners = [asyncio.ensure_future(client.run()) for client in clients]
+    player = AIPlayer(depth, seed=seed)
+
+    report: Dict[str, Any] = {'moves': 0, 'synced': []}
+    try:
+        report['malformed_dropped'] = all([
+            await malformed(port, payload) for payload in MALFORMED
+        ])
+        report['synced'].append(await synced(match, clients))
+
+        for number in range(moves):
+            client = clients[match.turn]
+            board = client.board()
+            if board.game_over:
+                break
+            choice = await loop.run_in_executor(None, player.choose, board)
+            if choice is None:
+                break
+
+            start, end, points = choice
+            turn = match.turn
+            rejections = len(client.rejections)
+            if number % 2:
+                client.move(start, end, [(x, y) for x, y in points.tolist()])
+            else:
+                client.begin(start)
+                for x, y in points[1:].tolist():
+                    client.extend((x, y))
+                client.commit()
+            await client.flush()
+
+            deadline = loop.time() + TIMEOUT
+            while (
+                match.turn == turn and
+                len(client.rejections) == rejections and
+                loop.time() < deadline
+            ):
+                await asyncio.sleep(0)
+            if match.turn == turn:
+                report['rejected'] = client.rejections[rejections:]
+                break
+            report['moves'] += 1
+            report['synced'].append(await synced(match, clients))
+
+        clients[0].relax(True)
+        await clients[0].flush()
+        await asyncio.sleep(0.5)
+        clients[0].relax(False)
+        await clients[0].flush()
+        report['synced'].append(await synced(match, clients))
+    finally:
+        for task in runners + [ticker]:
+            task.cancel()
+        for client in clients:
+            await client.close()
+        server.close()
+        player.close()
+
+    report['errors'] = [str(context.get('exception')) for context in errors]
+    report['ok'] = (
+        report['malformed_dropped'] and all(report['synced']) and
+        not report['errors'] and report['moves'] == moves
+    )
+    return report
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description='Play a match between two clients over loopback and '
+                    'compare their replicas with the server board'
+    )
+    parser.add_argument('--moves', type=int, default=MOVES)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--depth', type=int, default=1)
+    args = parser.parse_args()
+
+    report = asyncio.run(loopback(args.moves, args.seed, args.depth))
+    print(report)
+    sys.exit(0 if report['ok'] else 1)
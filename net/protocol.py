@@ -0,0 +1,262 @@
+from __future__ import annotations
+import asyncio
+import struct
+import numpy as np
+import numpy.typing as npt
+from typing import List, Optional, Tuple
+
+from fields.board import Board
+
+JOIN = 1
+WELCOME = 2
+BEGIN = 3
+EXTEND = 4
+COMMIT = 5
+CANCEL = 6
+RELAX = 7
+UPDATE = 8
+REJECT = 9
+MOVE = 10
+
+ABSOLUTE = 0
+DELTA = 1
+QUANTUM = 16
+DELTA_LIMIT = np.iinfo(np.int16).max
+MAX_FRAME = 1 << 24
+
+LENGTH = struct.Struct('<I')
+COUNT = struct.Struct('<I')
+NODE = struct.Struct('<i')
+FLAG = struct.Struct('<B')
+WELCOME_HEADER = struct.Struct('<Bff')
+UPDATE_HEADER = struct.Struct('<IBBIII')
+RUN_HEADER = struct.Struct('<IIB')
+POLYLINE_HEADER = struct.Struct('<III')
+MOVE_HEADER = struct.Struct('<ii')
+
+NODE_RECORD = np.dtype([('node', '<u4'), ('index', '<u4'), ('degree', 'i1')])
+
+
+def frame(kind: int, payload: bytes = b'') -> bytes:
+    return LENGTH.pack(len(payload) + 1) + bytes((kind,)) + payload
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    length, = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+    if not 0 < length <= MAX_FRAME:
+        raise ValueError(f'bad frame length {length}')
+    body = await reader.readexactly(length)
+    return body[0], body[1:]
+
+
+def encode_points(points: npt.ArrayLike) -> bytes:
+    return np.asarray(points, dtype='<f4').reshape(-1, 2).tobytes()
+
+
+def decode_points(payload: bytes) -> npt.NDArray:
+    return np.frombuffer(payload, dtype='<f4').reshape(-1, 2)
+
+
+class PayloadReader:
+
+    def __init__(self, payload: bytes) -> None:
+        self._payload = payload
+        self._offset = 0
+
+    def unpack(self, layout: struct.Struct) -> Tuple:
+        values = layout.unpack_from(self._payload, self._offset)
+        self._offset += layout.size
+        return values
+
+    def array(self, dtype: npt.DTypeLike, count: int) -> npt.NDArray:
+        dtype = np.dtype(dtype)
+        values = np.frombuffer(
+            self._payload, dtype=dtype, count=count, offset=self._offset
+        )
+        self._offset += dtype.itemsize * count
+        return values
+
+
+def _resized(array: npt.NDArray, size: int) -> npt.NDArray:
+    result = np.zeros((size,) + array.shape[1:], array.dtype)
+    known = min(size, array.shape[0])
+    result[:known] = array[:known]
+    return result
+
+
+class Replica:
+
+    def __init__(self) -> None:
+        self.tick: int = 0
+        self.turn: int = 0
+        self.drawing: bool = False
+        self.vertexes: npt.NDArray = np.zeros((0, 2), float)
+        self.alive: npt.NDArray = np.zeros(0, bool)
+        self.node_indexes: npt.NDArray = np.zeros(0, np.intp)
+        self.degrees: npt.NDArray = np.zeros(0, np.int8)
+        self.polylines: List[List[int]] = []
+        self._polylines_version: int = -1
+
+    def _vertex_section(self, board: Board) -> Tuple[int, bytes]:
+        vertex_field = board.vertex_field
+        vertexes = vertex_field._vertexes
+        alive = vertex_field.alive
+        size = vertexes.shape[0]
+
+        old = _resized(self.vertexes, size)
+        was_alive = _resized(self.alive, size)
+        steps = np.round((vertexes - old) * QUANTUM)
+        absolute = alive & (
+            ~was_alive | np.any(np.abs(steps) > DELTA_LIMIT, axis=1)
+        )
+        changed = absolute | (alive & np.any(steps != 0, axis=1))
+
+        indexes = np.flatnonzero(changed)
+        kinds = np.where(absolute[indexes], ABSOLUTE, DELTA)
+        breaks = np.flatnonzero(
+            (np.diff(indexes) != 1) | (np.diff(kinds) != 0)
+        ) + 1
+        bounds = np.concatenate(([0], breaks, [indexes.size])).tolist()
+
+        runs: List[bytes] = []
+        for first, last in zip(bounds[:-1], bounds[1:]):
+            if first == last:
+                continue
+            start = int(indexes[first])
+            stop = start + last - first
+            kind = int(kinds[first])
+            runs.append(RUN_HEADER.pack(start, stop - start, kind))
+            if kind == ABSOLUTE:
+                runs.append(vertexes[start:stop].astype('<f4').tobytes())
+            else:
+                runs.append(steps[start:stop].astype('<i2').tobytes())
+
+        still_alive = _resized(alive, self.alive.shape[0])
+        dead = np.flatnonzero(self.alive & ~still_alive)
+
+        return len(runs) // 2 + dead.size, b''.join((
+            COUNT.pack(len(runs) // 2), *runs,
+            COUNT.pack(dead.size), dead.astype('<u4').tobytes()
+        ))
+
+    def _node_section(self, board: Board) -> Tuple[int, bytes]:
+        nodes_field = board.nodes_field
+        indexes = nodes_field.vertexes_indexes
+        degrees = nodes_field.degrees
+        count = indexes.shape[0]
+
+        known = min(count, self.node_indexes.shape[0])
+        changed = np.ones(count, bool)
+        changed[:known] = (
+            (indexes[:known] != self.node_indexes[:known]) |
+            (degrees[:known] != self.degrees[:known])
+        )
+
+        nodes = np.flatnonzero(changed)
+        records = np.zeros(nodes.size, NODE_RECORD)
+        records['node'] = nodes
+        records['index'] = indexes[nodes]
+        records['degree'] = degrees[nodes]
+        return nodes.size, COUNT.pack(nodes.size) + records.tobytes()
+
+    def _polyline_section(self, board: Board) -> Tuple[int, bytes]:
+        polyline_field = board.polyline_field
+        if polyline_field.version == self._polylines_version:
+            return 0, COUNT.pack(0)
+
+        records: List[bytes] = []
+        for number, polyline in enumerate(polyline_field.polylines):
+            indexes = polyline.indexes
+            offset = 0
+            if number < len(self.polylines):
+                sent = self.polylines[number]
+                if indexes[:len(sent)] == sent:
+                    offset = len(sent)
+            if offset < len(indexes):
+                records.append(
+                    POLYLINE_HEADER.pack(
+                        number, offset, len(indexes) - offset
+                    )
+                )
+                records.append(
+                    np.asarray(indexes[offset:], '<u4').tobytes()
+                )
+
+        self._polylines_version = polyline_field.version
+        return len(records) // 2, (
+            COUNT.pack(len(records) // 2) + b''.join(records)
+        )
+
+    def encode(self, board: Board, tick: int, turn: int) -> Optional[bytes]:
+        header = (
+            turn,
+            int(board.polyline_field.drawing),
+            board.vertex_field._vertexes.shape[0],
+            len(board.nodes_field),
+            len(board.polyline_field.polylines)
+        )
+        counts, sections = zip(
+            self._vertex_section(board),
+            self._node_section(board),
+            self._polyline_section(board)
+        )
+
+        unchanged = header == (
+            self.turn,
+            int(self.drawing),
+            self.vertexes.shape[0],
+            self.node_indexes.shape[0],
+            len(self.polylines)
+        )
+        if unchanged and not any(counts):
+            return None
+
+        payload = UPDATE_HEADER.pack(tick, *header) + b''.join(sections)
+        self.apply(payload)
+        return payload
+
+    def apply(self, payload: bytes) -> None:
+        reader = PayloadReader(payload)
+        (
+            self.tick, self.turn, drawing, size, node_count, polyline_count
+        ) = reader.unpack(UPDATE_HEADER)
+        self.drawing = bool(drawing)
+
+        self.vertexes = _resized(self.vertexes, size)
+        self.alive = _resized(self.alive, size)
+        runs, = reader.unpack(COUNT)
+        for _ in range(runs):
+            start, count, kind = reader.unpack(RUN_HEADER)
+            stop = start + count
+            if kind == ABSOLUTE:
+                values = reader.array('<f4', 2 * count).reshape(-1, 2)
+                self.vertexes[start:stop] = values
+            else:
+                steps = reader.array('<i2', 2 * count).reshape(-1, 2)
+                self.vertexes[start:stop] += steps / QUANTUM
+            self.alive[start:stop] = True
+
+        dead_count, = reader.unpack(COUNT)
+        dead = reader.array('<u4', dead_count).astype(np.intp)
+        self.alive[dead[dead < size]] = False
+
+        self.node_indexes = _resized(self.node_indexes, node_count)
+        self.degrees = _resized(self.degrees, node_count)
+        node_records, = reader.unpack(COUNT)
+        records = reader.array(NODE_RECORD, node_records)
+        self.node_indexes[records['node']] = records['index']
+        self.degrees[records['node']] = records['degree']
+
+        del self.polylines[polyline_count:]
+        polyline_records, = reader.unpack(COUNT)
+        for _ in range(polyline_records):
+            number, offset, count = reader.unpack(POLYLINE_HEADER)
+            indexes = reader.array('<u4', count).tolist()
+            if number == len(self.polylines):
+                self.polylines.append([])
+            self.polylines[number][offset:] = indexes
+
+    def load_into(self, board: Board) -> None:
+        board.vertex_field.load(self.vertexes, self.alive)
+        board.nodes_field.load(self.node_indexes, self.degrees)
+        board.polyline_field.load(self.polylines, self.drawing)
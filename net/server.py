@@ -0,0 +1,361 @@
+from __future__ import annotations
+import argparse
+import asyncio
+import os
+import struct
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+from fields.board import SEGMENT_STEP, Board
+from fields.simulation import FIXED_STEP_MS, Integrator
+from fields.snapshot import load_snapshot, save_snapshot
+
+from .protocol import (
+    BEGIN, CANCEL, COMMIT, EXTEND, FLAG, JOIN, MOVE, MOVE_HEADER, NODE, RELAX,
+    REJECT, UPDATE, WELCOME, WELCOME_HEADER, Replica, decode_points, frame,
+    read_frame
+)
+
+TICK_RATE = 30
+PLAYERS = 2
+BOARD_SIZE = (1024, 768)
+BOARD_NODES = 16
+BOARD_RADIUS = 100
+CHECKPOINT_TICKS = 5 * TICK_RATE
+CHECKPOINT_SUFFIX = '.sprouts'
+
+
+def board_points(
+    payload: bytes,
+    size: Tuple[float, float]
+) -> npt.NDArray:
+    points = decode_points(payload)
+    width, height = size
+    if not (
+        np.isfinite(points).all() and
+        (points >= 0).all() and
+        (points[:, 0] <= width).all() and
+        (points[:, 1] <= height).all()
+    ):
+        raise ValueError('points outside the board')
+    return points
+
+
+@dataclass
+class Player:
+    number: int
+    writer: asyncio.StreamWriter
+    replica: Replica = field(default_factory=Replica)
+    relaxing: bool = False
+    outbox: List[bytes] = field(default_factory=list)
+
+
+class Match:
+
+    def __init__(
+        self,
+        name: str,
+        seed: Optional[int] = None,
+        board: Optional[Board] = None,
+        turn: int = 0,
+        tick: int = 0
+    ) -> None:
+        self.name: str = name
+        if board is None:
+            board = Board(BOARD_SIZE)
+            board.generate(BOARD_NODES, BOARD_RADIUS, seed)
+        self.board: Board = board
+        self.players: Dict[int, Player] = {}
+        self.turn: int = turn
+        self.tick: int = tick
+        self._mover: int = -1
+        self._left_start: bool = False
+        self.integrator: Integrator = Integrator(FIXED_STEP_MS)
+
+    @classmethod
+    def restore(cls, name: str, path: str) -> Match:
+        board, extra = load_snapshot(path)
+        turn, tick = extra['match'].tolist()
+        return cls(name, board=board, turn=turn, tick=tick)
+
+    def checkpoint(self, path: str) -> int:
+        return save_snapshot(
+            self.board,
+            path,
+            extra={'match': np.array([self.turn, self.tick], np.int64)}
+        )
+
+    @property
+    def moving(self) -> bool:
+        return self._mover > -1
+
+    def join(self, writer: asyncio.StreamWriter) -> Optional[Player]:
+        for number in range(PLAYERS):
+            if number not in self.players:
+                player = Player(number, writer)
+                self.players[number] = player
+                return player
+        return None
+
+    def leave(self, player: Player) -> None:
+        if self._mover == player.number:
+            self.cancel(player)
+        self.players.pop(player.number, None)
+
+    def reject(self, player: Player, reason: str) -> None:
+        player.outbox.append(frame(REJECT, reason.encode()))
+
+    def begin(self, player: Player, node: int) -> None:
+        if player.number != self.turn:
+            self.reject(player, 'not your turn')
+            return
+        if not self.board.begin_move(node):
+            self.reject(player, f'cannot start a move at node {node}')
+            return
+        self._mover = player.number
+        self._left_start = False
+
+    def extend(self, player: Player, points) -> None:
+        if player.number != self._mover:
+            return
+
+        board = self.board
+        for x, y in points.tolist():
+            over_node = board.nodes_field.over_node((x, y))
+            if self._left_start and over_node > -1:
+                self.commit(player, over_node)
+                return
+            if not self._left_start and over_node < 0:
+                self._left_start = True
+            if self._left_start and (
+                board.polyline_field.check_intersection((x, y))
+            ):
+                self.reject(player, 'the line crosses itself or another')
+                self.cancel(player)
+                return
+            board.extend_move((x, y), SEGMENT_STEP)
+
+    def commit(self, player: Player, node: Optional[int] = None) -> None:
+        if player.number != self._mover:
+            return
+
+        board = self.board
+        if node is None:
+            polyline = board.polyline_field.get_polyline(-1)
+            last = board.vertex_field.get_vertex(polyline.indexes[-1])
+            node = -1 if last is None else board.nodes_field.over_node(last)
+
+        self._mover = -1
+        if not self._left_start or not board.commit_move(node):
+            board.cancel_move()
+            self.reject(
+                player, 'the move does not end on a reachable free node'
+            )
+            return
+        self.turn = (self.turn + 1) % PLAYERS
+
+    def cancel(self, player: Player) -> None:
+        if player.number != self._mover:
+            return
+        self._mover = -1
+        self.board.cancel_move()
+
+    def move(self, player: Player, start: int, end: int, points) -> None:
+        if player.number != self.turn:
+            self.reject(player, 'not your turn')
+            return
+
+        rejection = self.board.play_move(points, start, end)
+        if rejection is not None:
+            self.reject(player, rejection.message)
+            return
+        self.turn = (self.turn + 1) % PLAYERS
+
+    def relax(self) -> None:
+        board = self.board
+        if any(player.relaxing for player in self.players.values()):
+            self.integrator.wake()
+        if self.integrator.step(
+            board.vertex_field._vertexes,
+            *board.polyline_field.relaxation_inputs(),
+            board.nodes_field.vertexes_indexes
+        ):
+            board.polyline_field.moved()
+
+    def step(self) -> None:
+        self.tick += 1
+        if not self.moving:
+            self.relax()
+
+        for player in self.players.values():
+            payload = player.replica.encode(self.board, self.tick, self.turn)
+            if payload is not None:
+                player.outbox.append(frame(UPDATE, payload))
+
+
+class MatchServer:
+
+    def __init__(
+        self,
+        tick_rate: int = TICK_RATE,
+        checkpoints: Optional[str] = None,
+        checkpoint_ticks: int = CHECKPOINT_TICKS
+    ) -> None:
+        self.tick_rate: int = tick_rate
+        self.checkpoints: Optional[str] = checkpoints
+        self.checkpoint_ticks: int = checkpoint_ticks
+        self.matches: Dict[str, Match] = {}
+        self.bytes_sent: int = 0
+        self._server: Optional[asyncio.Server] = None
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> int:
+        self._server = await asyncio.start_server(self._serve, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    def _checkpoint_path(self, name: str) -> Optional[str]:
+        if self.checkpoints is None:
+            return None
+        return os.path.join(
+            self.checkpoints, name.encode().hex() + CHECKPOINT_SUFFIX
+        )
+
+    def _open_match(self, name: str) -> Match:
+        path = self._checkpoint_path(name)
+        if path is not None and os.path.exists(path):
+            return Match.restore(name, path)
+        return Match(name)
+
+    def _checkpoint(self, match: Match) -> None:
+        path = self._checkpoint_path(match.name)
+        if path is not None and not match.moving:
+            match.checkpoint(path)
+
+    async def _serve(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter
+    ) -> None:
+        match: Optional[Match] = None
+        player: Optional[Player] = None
+        try:
+            kind, payload = await read_frame(reader)
+            if kind != JOIN:
+                return
+
+            name = payload.decode()
+            match = self.matches.get(name)
+            if match is None:
+                match = self.matches[name] = self._open_match(name)
+            player = match.join(writer)
+            if player is None:
+                writer.write(frame(REJECT, b'the match is full'))
+                return
+
+            writer.write(frame(
+                WELCOME,
+                WELCOME_HEADER.pack(player.number, *match.board.size)
+            ))
+
+            while True:
+                kind, payload = await read_frame(reader)
+                if kind == BEGIN:
+                    match.begin(player, NODE.unpack(payload)[0])
+                elif kind == EXTEND:
+                    match.extend(
+                        player, board_points(payload, match.board.size)
+                    )
+                elif kind == COMMIT:
+                    match.commit(player)
+                elif kind == CANCEL:
+                    match.cancel(player)
+                elif kind == MOVE:
+                    start, end = MOVE_HEADER.unpack_from(payload)
+                    match.move(
+                        player,
+                        start,
+                        end,
+                        board_points(
+                            payload[MOVE_HEADER.size:], match.board.size
+                        )
+                    )
+                elif kind == RELAX:
+                    player.relaxing = bool(FLAG.unpack(payload)[0])
+        except (
+            asyncio.IncompleteReadError, ConnectionError, ValueError,
+            struct.error
+        ):
+            pass
+        finally:
+            if match is not None and player is not None:
+                match.leave(player)
+                if not match.players:
+                    self._checkpoint(match)
+                    self.matches.pop(match.name, None)
+            writer.close()
+
+    async def _flush(self, player: Player) -> None:
+        data = b''.join(player.outbox)
+        player.outbox.clear()
+        self.bytes_sent += len(data)
+        player.writer.write(data)
+        try:
+            await player.writer.drain()
+        except ConnectionError:
+            pass
+
+    async def run(self) -> None:
+        interval = 1 / self.tick_rate
+        deadline = time.perf_counter()
+        while True:
+            for match in list(self.matches.values()):
+                match.step()
+                if not match.tick % self.checkpoint_ticks:
+                    self._checkpoint(match)
+
+            await asyncio.gather(*(
+                self._flush(player)
+                for match in self.matches.values()
+                for player in match.players.values()
+                if player.outbox
+            ))
+
+            deadline = max(deadline + interval, time.perf_counter())
+            await asyncio.sleep(deadline - time.perf_counter())
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+
+
+async def serve(
+    host: str,
+    port: int,
+    tick_rate: int,
+    checkpoints: Optional[str] = None
+) -> None:
+    server = MatchServer(tick_rate, checkpoints)
+    port = await server.start(host, port)
+    print(f'serving on {host}:{port}')
+    try:
+        await server.run()
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description='Epic Sprouts match server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7777)
+    parser.add_argument('--tick-rate', type=int, default=TICK_RATE)
+    parser.add_argument(
+        '--checkpoints', default=None,
+        help='directory to checkpoint matches to and restore them from'
+    )
+    args = parser.parse_args()
+
+    asyncio.run(serve(args.host, args.port, args.tick_rate, args.checkpoints))
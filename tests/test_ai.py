@@ -0,0 +1,31 @@
+from fields.ai import AIPlayer, negamax
+from fields.board import Board
+from fields.position import canonical, position_from_board
+
+
+def test_ai_plays_seeded_game_to_the_end() -> None:
+    board = Board((500, 400))
+    board.generate(4, 100, 3)
+    player = AIPlayer(1, seed=3)
+
+    while not board.game_over:
+        choice = player.choose(board)
+        assert choice is not None
+        start, end, points = choice
+        assert board.play_move(points, start, end) is None
+
+
+def test_chosen_paths_realize_the_best_ranked_value() -> None:
+    board = Board((500, 400))
+    board.generate(3, 100, 1)
+    player = AIPlayer(6, seed=1)
+
+    while not board.game_over:
+        best = player.rank(position_from_board(board))[0][0]
+        choice = player.choose(board)
+        assert choice is not None
+        start, end, points = choice
+        assert board.play_move(points, start, end) is None
+
+        child = canonical(*position_from_board(board))
+        assert -negamax(child, player.depth - 1, player.table) == best
@@ -0,0 +1,61 @@
+from fields.board import Board
+
+
+def test_unembeddable_commit_leaves_board_untouched() -> None:
+    board = Board((240, 240), None)
+    for x, y in ((60, 60), (180, 60), (60, 180)):
+        board.nodes_field.push_node(x, y)
+    board.faces.rebuild()
+    loop = [(20, 100), (20, 220), (100, 220), (100, 100)]
+    assert board.play_move(loop, 0, 0) is None
+
+    vertexes = len(board.vertex_field)
+    degrees = board.nodes_field.degrees.tolist()
+    moves = board.faces.moves()
+
+    assert board.begin_move(1)
+    for point in ((180, 120), (140, 180)):
+        board.extend_move(point, 0)
+    assert not board.commit_move(2)
+
+    assert not board.moving
+    assert len(board.polyline_field.polylines) == 1
+    assert len(board.vertex_field) == vertexes
+    assert board.nodes_field.degrees.tolist() == degrees
+    assert board.faces.moves() == moves
+    assert not board.game_over
+    assert board.play_move([(120, 40)], 0, 1) is None
+
+
+def test_undo_move_restores_previous_position() -> None:
+    board = Board((240, 240), None)
+    for x, y in ((60, 60), (180, 60), (60, 180)):
+        board.nodes_field.push_node(x, y)
+    board.faces.rebuild()
+    assert board.play_move([(120, 40)], 0, 1) is None
+
+    vertexes = len(board.vertex_field)
+    degrees = board.nodes_field.degrees.tolist()
+    moves = board.faces.moves()
+    assert board.play_move([(40, 120)], 0, 2) is None
+    assert board.undo_move()
+
+    assert len(board.polyline_field.polylines) == 1
+    assert len(board.vertex_field) == vertexes
+    assert board.nodes_field.degrees.tolist() == degrees
+    assert board.faces.moves() == moves
+
+
+def test_moves_are_stored_as_drawn_unless_simplification_is_enabled() -> None:
+    points = [(70 + 2 * step, 40 + step % 2 * 0.1) for step in range(50)]
+    stored = []
+    for tolerance in (None, 1.0):
+        board = Board((240, 240), tolerance)
+        for x, y in ((60, 60), (180, 60)):
+            board.nodes_field.push_node(x, y)
+        board.faces.rebuild()
+        assert board.play_move(points, 0, 1) is None
+        stored.append(len(board.polyline_field.get_polyline(-1).indexes))
+
+    assert stored[0] == len(points) + 2
+    assert stored[1] < stored[0]
@@ -0,0 +1,67 @@
+import numpy as np
+
+from fields.board import Board
+
+
+def broad_phase_boxes(board: Board) -> dict:
+    broad_phase, ids = board.polyline_field.broad_phase
+    leaves = broad_phase.leaves
+    return {
+        index: (tuple(low), tuple(high))
+        for index, low, high in zip(
+            ids.tolist(),
+            broad_phase.vmin[:leaves].tolist(),
+            broad_phase.vmax[:leaves].tolist()
+        )
+    }
+
+
+def test_build_tree_places_boxes_like_a_full_rebuild() -> None:
+    board = Board((400, 400))
+    for x, y in ((60, 60), (340, 60), (60, 340), (340, 340)):
+        board.nodes_field.push_node(x, y)
+    board.faces.rebuild()
+    moves = (
+        ([(200, 30)], 0, 1), ([(30, 200)], 0, 2),
+        ([(370, 200)], 1, 3), ([(200, 370)], 2, 3)
+    )
+    for points, start, end in moves:
+        assert board.play_move(points, start, end) is None
+
+    polyline_field = board.polyline_field
+    indexes = polyline_field.get_polyline(1).indexes
+    board.vertex_field._vertexes[indexes[1]] += (-10, 5)
+    polyline_field.build_tree(1)
+
+    broad_phase, _ = polyline_field.broad_phase
+    for level in range(1, broad_phase.levels):
+        start, stop = broad_phase.level_offsets[level:level + 2]
+        for node in range(start, stop):
+            children = [
+                child for child in (broad_phase.left[node],
+                                    broad_phase.right[node])
+                if child >= 0
+            ]
+            assert np.all(
+                broad_phase.vmin[node] == broad_phase.vmin[children].min(0)
+            )
+            assert np.all(
+                broad_phase.vmax[node] == broad_phase.vmax[children].max(0)
+            )
+
+    incremental = broad_phase_boxes(board)
+    polyline_field.update_broad_phase()
+    assert incremental == broad_phase_boxes(board)
+
+
+def test_build_tree_ignores_out_of_range_indexes() -> None:
+    board = Board((400, 400))
+    for x, y in ((60, 60), (340, 60)):
+        board.nodes_field.push_node(x, y)
+    board.faces.rebuild()
+    assert board.play_move([(200, 30)], 0, 1) is None
+
+    polyline_field = board.polyline_field
+    polyline_field.build_tree(len(polyline_field.polylines))
+    polyline_field.build_tree(-len(polyline_field.polylines) - 1)
+    assert polyline_field.broad_phase[1].tolist() == [0]
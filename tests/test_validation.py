@@ -0,0 +1,49 @@
+import numpy as np
+
+from fields.board import Board
+from fields.validation import CROSSES_POLYLINE
+
+
+def corner_board() -> Board:
+    board = Board((240, 240), None)
+    for x, y in ((60, 60), (180, 60), (60, 180)):
+        board.nodes_field.push_node(x, y)
+    board.faces.rebuild()
+    return board
+
+
+def test_moves_next_to_incident_polylines_are_legal() -> None:
+    board = corner_board()
+    assert board.play_move([(90, 42), (150, 42)], 0, 1) is None
+
+    assert board.validate_move([(78, 90), (72, 150)], 0, 2) is None
+    assert board.validate_move([(90, 84), (156, 84)], 0, 1) is None
+
+
+def test_move_within_leaf_padding_of_polyline_is_legal() -> None:
+    board = corner_board()
+    assert board.play_move([(90, 20), (120, 20), (150, 20)], 0, 1) is None
+
+    points = [(90, 23), (105, 23), (130, 45), (150, 50)]
+    assert board.validate_move(points, 0, 1) is None
+
+
+def test_move_along_incident_polyline_inside_disc_is_rejected() -> None:
+    board = corner_board()
+    assert board.play_move([(90, 20), (120, 20), (150, 20)], 0, 1) is None
+
+    rejection = board.validate_move([(63, 56), (40, 120)], 0, 2)
+    assert rejection is not None
+    assert rejection.code == CROSSES_POLYLINE
+    assert rejection.segment == 0
+
+
+def test_move_crossing_polyline_is_rejected() -> None:
+    board = corner_board()
+    assert board.play_move([(90, 20), (120, 20), (150, 20)], 0, 1) is None
+
+    rejection = board.validate_move(
+        np.array([(100, 60), (120, -10), (140, 60)]), 0, 1
+    )
+    assert rejection is not None
+    assert rejection.code == CROSSES_POLYLINE